@@ -0,0 +1,119 @@
+"""慢速用戶端併發下載測試
+
+同時開啟大量連線下載同一個檔案，每條連線都刻意讀得很慢，模擬行動網路上的
+用戶端，統計在時限內有多少連線真的開始收到資料。用來比較 WSGI 與 ASGI
+部署能同時服務多少慢速下載。
+
+範例（先登入取得 sessionid，並準備一個較大的影片檔）:
+
+    # WSGI：8 條執行緒
+    gunicorn local_storage.wsgi -b 127.0.0.1:8000 --threads 8
+    # ASGI：單一行程，開啟非同步下載
+    ASYNC_DOWNLOADS=True uvicorn local_storage.asgi:application --port 8001
+
+    python benchmarks/concurrent_downloads.py \\
+        --target wsgi=http://127.0.0.1:8000/file/1/preview/ \\
+        --target asgi=http://127.0.0.1:8001/file/1/preview/ \\
+        --cookie sessionid=xxxx --connections 500 --duration 30
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def slow_client(url, cookie, read_size, read_delay, deadline, first_byte_timeout):
+    """單一慢速連線，回傳 (首位元組時間或 None, 收到的位元組數)"""
+    parts = urlsplit(url)
+    host = parts.hostname
+    port = parts.port or 80
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+
+    started = time.monotonic()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), first_byte_timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None, 0
+
+    request = (
+        f'GET {path} HTTP/1.1\r\n'
+        f'Host: {parts.netloc}\r\n'
+        f'Cookie: {cookie}\r\n'
+        f'Connection: close\r\n\r\n'
+    )
+    writer.write(request.encode())
+
+    first_byte = None
+    received = 0
+    try:
+        await writer.drain()
+        chunk = await asyncio.wait_for(reader.read(read_size), first_byte_timeout)
+        if chunk:
+            first_byte = time.monotonic() - started
+            received += len(chunk)
+        while chunk and time.monotonic() < deadline:
+            await asyncio.sleep(read_delay)
+            chunk = await reader.read(read_size)
+            received += len(chunk)
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+
+    return first_byte, received
+
+
+async def run_target(url, args):
+    deadline = time.monotonic() + args.duration
+    tasks = [
+        slow_client(url, args.cookie, args.read_size, args.read_delay, deadline, args.first_byte_timeout)
+        for _ in range(args.connections)
+    ]
+    results = await asyncio.gather(*tasks)
+
+    ttfb = sorted(r[0] for r in results if r[0] is not None)
+    total_bytes = sum(r[1] for r in results)
+    return {
+        'served': len(ttfb),
+        'ttfb_median': statistics.median(ttfb) if ttfb else None,
+        'ttfb_p99': ttfb[int(len(ttfb) * 0.99) - 1] if ttfb else None,
+        'mbytes': total_bytes / 1024 / 1024,
+    }
+
+
+def format_seconds(value):
+    return f'{value:.3f}s' if value is not None else '-'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比較 WSGI 與 ASGI 能同時服務多少慢速下載')
+    parser.add_argument('--target', action='append', required=True,
+                        help='名稱=網址，可指定多次，例如 wsgi=http://127.0.0.1:8000/file/1/preview/')
+    parser.add_argument('--cookie', default='', help='登入後的 Cookie，例如 sessionid=xxxx')
+    parser.add_argument('--connections', type=int, default=200, help='同時連線數（預設 200）')
+    parser.add_argument('--duration', type=float, default=20, help='每個目標測試秒數（預設 20）')
+    parser.add_argument('--read-size', type=int, default=16384, help='每次讀取位元組數（預設 16 KB）')
+    parser.add_argument('--read-delay', type=float, default=0.5, help='每次讀取間隔秒數（預設 0.5）')
+    parser.add_argument('--first-byte-timeout', type=float, default=10,
+                        help='超過幾秒沒收到第一個位元組視為未被服務（預設 10）')
+    args = parser.parse_args()
+
+    print(f'{args.connections} 條慢速連線，每條每 {args.read_delay}s 讀取 {args.read_size} bytes\n')
+    print(f'{"目標":<10}{"被服務連線":>12}{"首位元組中位數":>16}{"首位元組 p99":>14}{"總傳輸 MB":>12}')
+    for target in args.target:
+        label, _, url = target.partition('=')
+        result = asyncio.run(run_target(url, args))
+        print(
+            f'{label:<10}'
+            f'{result["served"]:>8}/{args.connections:<5}'
+            f'{format_seconds(result["ttfb_median"]):>14}'
+            f'{format_seconds(result["ttfb_p99"]):>14}'
+            f'{result["mbytes"]:>12.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""資料庫後端吞吐量測試（SQLite WAL 與 MySQL 比較）
+
+在設定的資料庫中建立一個測試使用者與指定數量的檔案紀錄（只有資料列，
+不寫實體檔案），再以多條執行緒同時送出請求，量測首頁（單一資料夾）、
+上傳與搜尋的每秒請求數與延遲。上傳會寫入暫存目錄，結束後刪除。
+
+同一份資料可重複使用：已經有足夠的檔案就不會重新建立，--reset 則先清除。
+分別以兩種資料庫設定執行，再比較輸出的表格：
+
+    # SQLite（WAL）
+    DB_ENGINE=django.db.backends.sqlite3 DB_NAME=/tmp/bench.sqlite3 python manage.py migrate
+    DB_ENGINE=django.db.backends.sqlite3 DB_NAME=/tmp/bench.sqlite3 \\
+        python benchmarks/database_backends.py --files 100000 --threads 8
+
+    # MySQL
+    DB_NAME=bench_db python manage.py migrate
+    DB_NAME=bench_db python benchmarks/database_backends.py --files 100000 --threads 8
+
+    # 1M 筆
+    ... python benchmarks/database_backends.py --files 1000000 --threads 8
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'local_storage.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from storage.models import File, Folder  # noqa: E402
+
+USERNAME = 'benchmark'
+WORDS = ['photo', 'report', 'invoice', 'holiday', 'meeting', 'draft', 'scan', 'backup', 'video', 'notes']
+EXTENSIONS = [
+    ('.jpg', File.CATEGORY_IMAGE),
+    ('.pdf', File.CATEGORY_DOCUMENT),
+    ('.mp4', File.CATEGORY_VIDEO),
+    ('.txt', File.CATEGORY_DOCUMENT),
+    ('.zip', File.CATEGORY_OTHER),
+]
+
+
+def random_token(length=8):
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
+
+
+def seed(total, per_folder, batch_size):
+    """建立測試使用者與檔案紀錄，回傳 (使用者, 資料夾 id 列表)"""
+    user, _ = User.objects.get_or_create(username=USERNAME)
+    existing = File.objects.filter(owner=user).count()
+    folders = list(Folder.objects.filter(owner=user).values_list('pk', flat=True))
+    if existing >= total:
+        return user, folders
+
+    print(f'建立 {total - existing} 筆檔案紀錄...')
+    started = time.monotonic()
+    now = timezone.now()
+    created = existing
+    while created < total:
+        count = min(batch_size, total - created)
+        needed = (created + count + per_folder - 1) // per_folder
+        while len(folders) < needed:
+            folders.append(Folder.objects.create(owner=user, name=f'folder-{len(folders)}').pk)
+
+        rows = []
+        for i in range(created, created + count):
+            extension, category = random.choice(EXTENSIONS)
+            name = f'{random.choice(WORDS)}-{random_token()}{extension}'
+            rows.append(File(
+                owner=user,
+                folder_id=folders[i // per_folder],
+                name=name,
+                file=f'benchmark/{name}',
+                file_size=random.randint(1024, 50 * 1024 * 1024),
+                file_type='application/octet-stream',
+                extension=extension,
+                category=category,
+                tags=','.join(random.sample(WORDS, 2)),
+                created_at=now - timedelta(seconds=i),
+            ))
+        File.objects.bulk_create(rows, batch_size=batch_size)
+        created += count
+        print(f'  {created}/{total}', end='\r')
+
+    print(f'\n完成，耗時 {time.monotonic() - started:.1f} 秒')
+    return user, folders
+
+
+def responded(response):
+    return response.status_code < 400
+
+
+def run(name, user, threads, requests, make_request, succeeded=responded):
+    """多條執行緒同時送出請求，回傳統計結果；succeeded 判斷請求是否成功（不計入延遲）"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = Client()
+        client.force_login(user)
+        local = []
+        for n in range(requests):
+            started = time.monotonic()
+            try:
+                response = make_request(client, index, n)
+            except Exception as e:
+                response = None
+                with lock:
+                    errors.append(repr(e))
+            local.append(time.monotonic() - started)
+            ok = response is not None and succeeded(response)
+            if not ok:
+                with lock:
+                    errors.append(name)
+        with lock:
+            latencies.extend(local)
+        connections.close_all()
+
+    started = time.monotonic()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed if elapsed else 0,
+        'p50': statistics.median(latencies) * 1000,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='資料庫後端吞吐量測試')
+    parser.add_argument('--files', type=int, default=100000, help='測試使用者的檔案數（預設 100000）')
+    parser.add_argument('--per-folder', type=int, default=1000, help='每個資料夾的檔案數（預設 1000）')
+    parser.add_argument('--threads', type=int, default=8, help='同時送出請求的執行緒數（預設 8）')
+    parser.add_argument('--requests', type=int, default=50, help='每條執行緒的請求數（預設 50）')
+    parser.add_argument('--batch-size', type=int, default=10000, help='建立資料時每批筆數（預設 10000）')
+    parser.add_argument('--reset', action='store_true', help='先刪除之前建立的測試資料')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    if args.reset:
+        User.objects.filter(username=USERNAME).delete()
+    user, folders = seed(args.files, args.per_folder, args.batch_size)
+
+    # 搜尋只會命中少數檔案的字串（檔名中的隨機片段）
+    samples = list(File.objects.filter(owner=user).order_by('?').values_list('name', flat=True)[:200])
+    terms = [name.split('-', 1)[1][:6] for name in samples]
+
+    def uploaded(response):
+        # 上傳失敗（例如空間不足）同樣是轉址回首頁，以是否建立檔案紀錄判斷
+        name = response.wsgi_request.FILES['file'].name
+        return File.objects.filter(owner=user, name=name).exists()
+
+    scenarios = [
+        ('首頁（資料夾）', lambda client, i, n: client.get('/', {'folder': random.choice(folders)}), responded),
+        ('搜尋', lambda client, i, n: client.get('/', {'search': random.choice(terms)}), responded),
+        ('搜尋建議', lambda client, i, n: client.get('/api/search-suggestions/', {'q': random.choice(terms)}), responded),
+        ('上傳', lambda client, i, n: client.post('/upload/', {
+            'file': SimpleUploadedFile(f'upload-{i}-{n}-{random_token()}.txt', os.urandom(4096)),
+        }), uploaded),
+    ]
+
+    print(f'\n資料庫: {connection.vendor} ({connection.settings_dict["NAME"]}), '
+          f'檔案: {File.objects.filter(owner=user).count()}, 執行緒: {args.threads}')
+    print(f'{"情境":<12}{"請求數":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"錯誤":>6}')
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        for name, make_request, succeeded in scenarios:
+            result = run(name, user, args.threads, args.requests, make_request, succeeded)
+            print(f'{result["name"]:<12}{result["requests"]:>8}{result["rps"]:>10.1f}'
+                  f'{result["p50"]:>10.1f}{result["p95"]:>10.1f}{result["errors"]:>6}')
+
+        # 上傳的檔案紀錄不留在測試資料中
+        File.objects.filter(owner=user, name__startswith='upload-').delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ Django settings for local_storage project.
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +35,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'storage.db_router.ReplicaPinMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -68,9 +70,42 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '3306'),
+        # 保留連線重複使用，每個請求開始時先確認連線仍可用
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# 單機 SQLite（DB_ENGINE=django.db.backends.sqlite3，DB_NAME 為資料庫檔案路徑）
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['default']['OPTIONS'] = {
+        # 同時寫入時最多等待幾秒（busy_timeout），寫入交易一開始就取得鎖
+        'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+        'transaction_mode': 'IMMEDIATE',
+    }
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),  # WAL 下 NORMAL 不會損毀資料，只可能遺失最後幾筆交易
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 268435456)),
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 65536)),  # 負數單位為 KB
+    'temp_store': 'MEMORY',
+}
+
+# 唯讀副本（逗號分隔；MySQL 為 host:port，SQLite 為資料庫檔案路徑），帳號密碼與主資料庫相同
+for index, replica in enumerate([r.strip() for r in os.getenv('DB_REPLICAS', '').split(',') if r.strip()], 1):
+    replica_config = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica_config['ENGINE'].endswith('sqlite3'):
+        replica_config['NAME'] = replica
+    else:
+        host, _, port = replica.partition(':')
+        replica_config.update(HOST=host, PORT=port or replica_config['PORT'])
+    DATABASES[f'replica_{index}'] = replica_config
+
+DATABASE_ROUTERS = ['storage.db_router.ReplicaRouter']
+DB_REPLICA_MAX_LAG = int(os.getenv('DB_REPLICA_MAX_LAG', 5))  # 副本落後超過幾秒就暫時不讀
+DB_REPLICA_CHECK_INTERVAL = int(os.getenv('DB_REPLICA_CHECK_INTERVAL', 5))  # 每隔幾秒檢查一次副本延遲
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))  # 寫入後幾秒內讀取留在主資料庫
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,6 +142,71 @@ MEDIA_URL = '/media/'
 
 DEFAULT_STORAGE_LOCATION = os.getenv('DEFAULT_STORAGE_LOCATION', 'disk1')
 
+# 冷熱分層儲存
+COLD_STORAGE_ROOT = os.getenv('COLD_STORAGE_ROOT', os.path.join(BASE_DIR, 'media_cold'))
+TIER_DEMOTE_AFTER_DAYS = int(os.getenv('TIER_DEMOTE_AFTER_DAYS', 30))
+TIER_COLD_COMPRESS = os.getenv('TIER_COLD_COMPRESS', 'False') == 'True'
+TIER_ACCESS_FLUSH_SIZE = int(os.getenv('TIER_ACCESS_FLUSH_SIZE', 200))  # 累積幾筆存取後寫回
+TIER_ACCESS_FLUSH_INTERVAL = int(os.getenv('TIER_ACCESS_FLUSH_INTERVAL', 60))  # 最長幾秒寫回一次
+
+# 靜態壓縮（文字類檔案上傳後壓縮存放）
+COMPRESS_AT_REST = os.getenv('COMPRESS_AT_REST', 'False') == 'True'
+COMPRESS_AT_REST_CODEC = os.getenv('COMPRESS_AT_REST_CODEC', 'zstd')  # zstd 或 gzip，未安裝 zstandard 時使用 gzip
+COMPRESS_FRAME_SIZE = int(os.getenv('COMPRESS_FRAME_SIZE', 262144))  # 每段原始大小，越小範圍請求越快、壓縮率越低
+
+
+# 非同步串流下載（以 ASGI 部署時開啟）
+ASYNC_DOWNLOADS = os.getenv('ASYNC_DOWNLOADS', 'False') == 'True'
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', 65536))
+
+# 媒體畫廊每次載入的縮圖數
+GALLERY_PAGE_SIZE = int(os.getenv('GALLERY_PAGE_SIZE', 60))
+
+# 圖片預覽圖的長邊尺寸（逗號分隔），預設送出最小的尺寸
+PREVIEW_SIZES = [int(size) for size in os.getenv('PREVIEW_SIZES', '1280,2560').split(',') if size.strip()]
+
+# 批次操作 API 單次請求最多項目數
+BATCH_API_MAX_ITEMS = int(os.getenv('BATCH_API_MAX_ITEMS', 10000))
+
+# 分享連結：快取秒數，以及是否把沒有下載上限的連結的下載次數先累積再批次寫回
+SHARE_CACHE_TTL = int(os.getenv('SHARE_CACHE_TTL', 30))
+SHARE_COUNT_BUFFER = os.getenv('SHARE_COUNT_BUFFER', 'False') == 'True'
+SHARE_COUNT_FLUSH_SIZE = int(os.getenv('SHARE_COUNT_FLUSH_SIZE', 100))
+SHARE_COUNT_FLUSH_INTERVAL = int(os.getenv('SHARE_COUNT_FLUSH_INTERVAL', 10))
+
+# 簽章下載網址：預覽與分享下載改用有期限的 HMAC 簽章網址，讀取時不查 session 與資料庫
+SIGNED_URLS = os.getenv('SIGNED_URLS', 'False') == 'True'
+SIGNED_URL_TTL = int(os.getenv('SIGNED_URL_TTL', 300))
+# 設定後交給 nginx X-Accel-Redirect 送出檔案，例如 /protected-media/
+SIGNED_URL_ACCEL_PREFIX = os.getenv('SIGNED_URL_ACCEL_PREFIX', '')
+
+# 下載頻寬控制（KB/s，0 不限制）：全站、每位使用者、每個分享連結的預設上限
+BANDWIDTH_GLOBAL_KBPS = int(os.getenv('BANDWIDTH_GLOBAL_KBPS', 0))
+BANDWIDTH_USER_KBPS = int(os.getenv('BANDWIDTH_USER_KBPS', 0))
+BANDWIDTH_SHARE_KBPS = int(os.getenv('BANDWIDTH_SHARE_KBPS', 0))
+BANDWIDTH_BURST_SECONDS = float(os.getenv('BANDWIDTH_BURST_SECONDS', 1))
+# 同一台主機上各 worker 共用的頻寬狀態檔
+BANDWIDTH_STORE = os.getenv('BANDWIDTH_STORE', os.path.join(tempfile.gettempdir(), 'local_storage_bandwidth.sqlite3'))
+
+# 背景清除回收站
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 500))
+PURGE_WORKERS = int(os.getenv('PURGE_WORKERS', 4))
+
+# 系統總容量（bytes），用於容量預測與預設配額
+TOTAL_SYSTEM_STORAGE = int(os.getenv('TOTAL_SYSTEM_STORAGE', 100 * 1024 * 1024 * 1024))
+
+# 儲存空間配額：預設上限（bytes，0 為依系統總容量 × QUOTA_SYSTEM_RATIO 平均分配給所有使用者）
+QUOTA_DEFAULT_BYTES = int(os.getenv('QUOTA_DEFAULT_BYTES', 0))
+QUOTA_SYSTEM_RATIO = float(os.getenv('QUOTA_SYSTEM_RATIO', 0.9))
+QUOTA_POLICY_TTL = int(os.getenv('QUOTA_POLICY_TTL', 300))  # 平均分配的上限快取秒數
+QUOTA_RESERVATION_TTL = int(os.getenv('QUOTA_RESERVATION_TTL', 6 * 3600))  # 上傳中途中斷留下的保留多久後清掉
+
+# 完整性檢查（scrub）：每晚檢查的檔案比例（0.1 約 10 天涵蓋全部）與讀取速度上限（MB/s，0 不限制）
+SCRUB_FRACTION = float(os.getenv('SCRUB_FRACTION', 0.1))
+SCRUB_MAX_MB_PER_SECOND = float(os.getenv('SCRUB_MAX_MB_PER_SECOND', 50))
+
+# 相似圖片：感知 hash 漢明距離門檻（0-64，越小越嚴格）
+SIMILAR_IMAGE_THRESHOLD = int(os.getenv('SIMILAR_IMAGE_THRESHOLD', 6))
 
 # 檔案上傳大小
 FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv('FILE_UPLOAD_MAX_SIZE', 52428800))
@@ -257,10 +257,191 @@ async function processUploadQueue() {
     }, 2000);
 }
 
+// ==========================================
+// 秒傳（上傳前先比對 SHA-256）
+// ==========================================
+
+// 小檔案計算 hash 的時間比直接上傳還久，不做秒傳檢查
+const INSTANT_UPLOAD_MIN_SIZE = 1024 * 1024;
+const HASH_CHUNK_SIZE = 4 * 1024 * 1024;
+
+/**
+ * Web Worker 的程式：分段讀取檔案並逐段計算 SHA-256
+ * （以 http 在區網使用時沒有 crypto.subtle，且 crypto.subtle 無法分段計算大檔案）
+ */
+function sha256Worker() {
+    const K = new Uint32Array([
+        0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+        0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+        0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+        0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+        0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+        0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+        0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+        0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2,
+    ]);
+    const H = new Uint32Array([
+        0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19,
+    ]);
+    const W = new Uint32Array(64);
+    const block = new Uint8Array(64);
+    let blockLength = 0;
+    let totalLength = 0;
+
+    const rotr = (x, n) => (x >>> n) | (x << (32 - n));
+
+    function compress(data, offset) {
+        for (let i = 0; i < 16; i++) {
+            const j = offset + i * 4;
+            W[i] = (data[j] << 24) | (data[j + 1] << 16) | (data[j + 2] << 8) | data[j + 3];
+        }
+        for (let i = 16; i < 64; i++) {
+            const s0 = rotr(W[i - 15], 7) ^ rotr(W[i - 15], 18) ^ (W[i - 15] >>> 3);
+            const s1 = rotr(W[i - 2], 17) ^ rotr(W[i - 2], 19) ^ (W[i - 2] >>> 10);
+            W[i] = W[i - 16] + s0 + W[i - 7] + s1;
+        }
+        let [a, b, c, d, e, f, g, h] = H;
+        for (let i = 0; i < 64; i++) {
+            const t1 = (h + (rotr(e, 6) ^ rotr(e, 11) ^ rotr(e, 25)) + ((e & f) ^ (~e & g)) + K[i] + W[i]) | 0;
+            const t2 = ((rotr(a, 2) ^ rotr(a, 13) ^ rotr(a, 22)) + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            h = g; g = f; f = e; e = (d + t1) | 0;
+            d = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        H[0] += a; H[1] += b; H[2] += c; H[3] += d;
+        H[4] += e; H[5] += f; H[6] += g; H[7] += h;
+    }
+
+    function update(data) {
+        totalLength += data.length;
+        let i = 0;
+        if (blockLength) {
+            const take = Math.min(64 - blockLength, data.length);
+            block.set(data.subarray(0, take), blockLength);
+            blockLength += take;
+            i = take;
+            if (blockLength < 64) return;
+            compress(block, 0);
+            blockLength = 0;
+        }
+        for (; i + 64 <= data.length; i += 64) {
+            compress(data, i);
+        }
+        block.set(data.subarray(i), 0);
+        blockLength = data.length - i;
+    }
+
+    function digest() {
+        block[blockLength++] = 0x80;
+        if (blockLength > 56) {
+            block.fill(0, blockLength);
+            compress(block, 0);
+            blockLength = 0;
+        }
+        block.fill(0, blockLength, 56);
+        // 長度以位元計，寫成 64 位元大端序
+        const view = new DataView(block.buffer);
+        view.setUint32(56, Math.floor(totalLength / 0x20000000));
+        view.setUint32(60, (totalLength * 8) >>> 0);
+        compress(block, 0);
+        return Array.from(H, word => word.toString(16).padStart(8, '0')).join('');
+    }
+
+    self.onmessage = async (event) => {
+        const { file, chunkSize } = event.data;
+        try {
+            for (let offset = 0; offset < file.size; offset += chunkSize) {
+                const chunk = await file.slice(offset, offset + chunkSize).arrayBuffer();
+                update(new Uint8Array(chunk));
+                self.postMessage({ progress: Math.min(offset + chunkSize, file.size) / file.size });
+            }
+            self.postMessage({ hash: digest() });
+        } catch (err) {
+            self.postMessage({ error: String(err) });
+        }
+    };
+}
+
 /**
- * 上傳單個文件
+ * 在 Web Worker 中計算檔案的 SHA-256，不會卡住頁面
  */
-function uploadFile(item) {
+function hashFile(file, onProgress) {
+    return new Promise((resolve, reject) => {
+        const source = new Blob([`(${sha256Worker.toString()})();`], { type: 'text/javascript' });
+        const url = URL.createObjectURL(source);
+        const worker = new Worker(url);
+        const finish = () => {
+            worker.terminate();
+            URL.revokeObjectURL(url);
+        };
+        worker.onmessage = (event) => {
+            const { progress, hash, error } = event.data;
+            if (progress !== undefined) {
+                if (onProgress) onProgress(progress);
+                return;
+            }
+            finish();
+            if (error) reject(new Error(error));
+            else resolve(hash);
+        };
+        worker.onerror = (event) => {
+            finish();
+            reject(new Error(event.message));
+        };
+        worker.postMessage({ file: file, chunkSize: HASH_CHUNK_SIZE });
+    });
+}
+
+/**
+ * 秒傳檢查：伺服器已有相同內容時直接建立檔案，回傳 true；否則回傳 false
+ */
+async function tryInstantUpload(item) {
+    updateStatus(item.id, '檢查中...', 'uploading');
+    const sha256 = await hashFile(item.file, progress => updateProgress(item.id, progress * 100));
+    updateProgress(item.id, 0);
+
+    const folderId = document.getElementById('folderId');
+    const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]');
+    const response = await fetch('/api/upload/precheck/', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken ? csrfToken.value : '',
+        },
+        body: JSON.stringify({
+            name: item.file.name,
+            size: item.file.size,
+            sha256: sha256,
+            folder_id: folderId && folderId.value ? folderId.value : null,
+        }),
+    });
+    if (!response.ok) return false;
+
+    const data = await response.json();
+    if (!data.exists) return false;
+
+    updateProgress(item.id, 100);
+    updateStatus(item.id, '完成（秒傳）', 'success');
+    return true;
+}
+
+/**
+ * 上傳單個文件（先嘗試秒傳，不成功時才上傳檔案內容）
+ */
+async function uploadFile(item) {
+    if (item.file.size >= INSTANT_UPLOAD_MIN_SIZE && window.Worker) {
+        try {
+            if (await tryInstantUpload(item)) return;
+        } catch (err) {
+            console.warn('秒傳檢查失敗，改為一般上傳', err);
+        }
+    }
+    return sendFile(item);
+}
+
+/**
+ * 上傳檔案內容
+ */
+function sendFile(item) {
     return new Promise((resolve, reject) => {
         const formData = new FormData();
         formData.append('file', item.file);
@@ -331,28 +512,150 @@ function updateStatus(id, text, type) {
 // 媒體功能
 // ==========================================
 
+// 檔案 ID -> { time, request }，預覽網址可能是有期限的簽章網址，只快取一分鐘
+const mediaCache = new Map();
+const MEDIA_CACHE_MS = 60000;
+
 /**
- * 切換媒體檔案
+ * 取得檔案與前後媒體檔案的資訊（同一檔案只請求一次）
+ * 搜尋結果頁的前後項目限於搜尋結果，其他頁面為同一資料夾
  */
-function switchMedia(newFileId) {
+function fetchNeighbors(fileId) {
+    const cached = mediaCache.get(fileId);
+    if (cached && Date.now() - cached.time < MEDIA_CACHE_MS) {
+        return cached.request;
+    }
+    
+    const params = new URLSearchParams({ type: 'media' });
+    const searchQuery = new URLSearchParams(window.location.search).get('search');
+    if (searchQuery && searchQuery.trim()) {
+        params.set('search', searchQuery.trim());
+    }
+    const request = fetch(`/api/file/${fileId}/neighbors/?${params}`)
+        .then(res => {
+            if (!res.ok) throw new Error(`載入失敗 (${res.status})`);
+            return res.json();
+        })
+        .catch(err => {
+            mediaCache.delete(fileId);
+            throw err;
+        });
+    mediaCache.set(fileId, { time: Date.now(), request: request });
+    return request;
+}
+
+/**
+ * 圖片預覽網址加上需要的尺寸（依視窗大小與像素比），伺服器會選擇最接近的預覽圖
+ */
+function sizedPreviewUrl(url) {
+    const size = Math.round(Math.max(window.innerWidth, window.innerHeight) * (window.devicePixelRatio || 1));
+    return `${url}${url.includes('?') ? '&' : '?'}size=${size}`;
+}
+
+/**
+ * 預先載入前後項目：圖片先下載，其他只先取得資訊
+ */
+function prefetchMedia(item) {
+    if (!item) return;
+    if (item.category === 'image') {
+        const img = new Image();
+        img.src = sizedPreviewUrl(item.preview_url);
+    }
+    fetchNeighbors(item.id).catch(() => {});
+}
+
+/**
+ * 依檔案類型建立預覽元素
+ */
+function createMediaElement(item) {
+    if (item.category === 'image') {
+        const img = document.createElement('img');
+        img.src = sizedPreviewUrl(item.preview_url);
+        img.alt = item.name;
+        img.className = 'img-fluid rounded';
+        img.style.maxHeight = '70vh';
+        img.style.objectFit = 'contain';
+        return img;
+    }
+    
+    const isVideo = item.category === 'video';
+    const player = document.createElement(isVideo ? 'video' : 'audio');
+    player.controls = true;
+    const source = document.createElement('source');
+    source.src = item.preview_url;
+    source.type = item.file_type;
+    player.appendChild(source);
+    
+    if (isVideo) {
+        player.className = 'rounded';
+        player.style.maxHeight = '70vh';
+        player.style.maxWidth = '100%';
+        return player;
+    }
+    
+    const container = document.createElement('div');
+    container.className = 'audio-player-container p-4';
+    container.innerHTML = '<i class="fas fa-music fa-5x text-warning mb-3"></i><h5 class="mb-3"></h5>';
+    container.querySelector('h5').textContent = item.name;
+    player.className = 'w-100';
+    container.appendChild(player);
+    return container;
+}
+
+/**
+ * 設定左右切換按鈕
+ */
+function setMediaNavButton(button, item) {
+    if (!button) return;
+    button.style.display = item ? '' : 'none';
+    button.onclick = item ? () => openMedia(item.id) : null;
+}
+
+/**
+ * 開啟媒體預覽（燈箱）
+ */
+function openMedia(fileId) {
+    const modalElement = document.getElementById('mediaModal');
+    if (!modalElement) return;
+    
     document.querySelectorAll('video, audio').forEach(media => {
         media.pause();
         media.currentTime = 0;
     });
     
-    const currentModal = document.querySelector('.modal.show');
-    if (currentModal) {
-        const modal = bootstrap.Modal.getInstance(currentModal);
-        if (modal) modal.hide();
-    }
-    
-    setTimeout(() => {
-        const newModalElement = document.getElementById('mediaModal' + newFileId);
-        if (newModalElement) {
-            const newModal = new bootstrap.Modal(newModalElement);
-            newModal.show();
-        }
-    }, 150);
+    fetchNeighbors(fileId)
+        .then(data => {
+            const item = data.file;
+            const icons = { image: 'fa-image', video: 'fa-video', audio: 'fa-music' };
+            document.getElementById('mediaModalIcon').className = 'fas ' + (icons[item.category] || 'fa-file');
+            document.getElementById('mediaModalTitle').textContent = item.name;
+            document.getElementById('mediaDownload').href = item.download_url;
+            const galleryLink = document.getElementById('mediaGallery');
+            if (galleryLink) {
+                galleryLink.style.display = item.gallery_url ? '' : 'none';
+                galleryLink.href = item.gallery_url || '#';
+            }
+            
+            const body = document.getElementById('mediaModalBody');
+            body.replaceChildren(createMediaElement(item));
+            
+            setMediaNavButton(document.getElementById('mediaPrev'), data.prev);
+            setMediaNavButton(document.getElementById('mediaNext'), data.next);
+            
+            bootstrap.Modal.getOrCreateInstance(modalElement).show();
+            
+            // 預先載入前後項目，切換時不用等待
+            prefetchMedia(data.prev);
+            prefetchMedia(data.next);
+        })
+        .catch(err => console.error(err));
+}
+
+/**
+ * 切換媒體檔案
+ */
+function switchMedia(newFileId) {
+    openMedia(newFileId);
 }
 
 // ==========================================
@@ -755,6 +1058,15 @@ document.addEventListener('keydown', function(e) {
             if (modal) modal.hide();
         }
     }
+    
+    // 媒體預覽中以左右鍵切換
+    if (e.key === 'ArrowLeft' || e.key === 'ArrowRight') {
+        const activeModal = document.querySelector('.modal.show');
+        if (activeModal && activeModal.id === 'mediaModal') {
+            const button = document.getElementById(e.key === 'ArrowLeft' ? 'mediaPrev' : 'mediaNext');
+            if (button && button.onclick) button.onclick();
+        }
+    }
 });
 
 // ==========================================
@@ -1,12 +1,13 @@
 from django.contrib import admin
-from .models import File, Folder, SharedLink ,UserProfile
+from .models import File, Folder, SharedLink ,UserProfile, TierAccessStat, PurgeTask, IntegrityIssue, DailyUsage
+from . import usage
 
 @admin.register(File)
 class FileAdmin(admin.ModelAdmin):
-    list_display = ['name', 'owner', 'folder', 'file_size', 'created_at']
-    list_filter = ['file_type', 'created_at', 'owner']
+    list_display = ['name', 'owner', 'folder', 'file_size', 'storage_tier', 'created_at']
+    list_filter = ['file_type', 'storage_tier', 'faststart', 'created_at', 'owner']
     search_fields = ['name', 'description']
-    readonly_fields = ['file_size', 'share_token', 'created_at', 'updated_at']
+    readonly_fields = ['file_size', 'share_token', 'created_at', 'updated_at', 'storage_tier', 'last_accessed_at', 'stored_size', 'faststart']
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
@@ -28,11 +29,44 @@ class FolderAdmin(admin.ModelAdmin):
 
 @admin.register(SharedLink)
 class SharedLinkAdmin(admin.ModelAdmin):
-    list_display = ['file', 'token', 'created_by', 'expires_at', 'download_count', 'is_active']
+    list_display = ['file', 'token', 'created_by', 'expires_at', 'download_count', 'is_active', 'bandwidth_limit']
     list_filter = ['is_active', 'created_at', 'expires_at']
     readonly_fields = ['token', 'download_count', 'created_at']
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'phone', 'location', 'created_at']
-    search_fields = ['user__username', 'phone']
\ No newline at end of file
+    list_display = ['user', 'phone', 'location', 'bandwidth_limit', 'quota_bytes', 'used_bytes', 'created_at']
+    search_fields = ['user__username', 'phone']
+    readonly_fields = ['used_bytes', 'reserved_bytes']
+
+@admin.register(TierAccessStat)
+class TierAccessStatAdmin(admin.ModelAdmin):
+    list_display = ['date', 'hot_hits', 'cold_hits', 'bytes_promoted', 'bytes_demoted']
+
+
+@admin.register(PurgeTask)
+class PurgeTaskAdmin(admin.ModelAdmin):
+    list_display = ['owner', 'status', 'total_files', 'deleted_files', 'failed_files', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+
+
+@admin.register(IntegrityIssue)
+class IntegrityIssueAdmin(admin.ModelAdmin):
+    list_display = ['file', 'status', 'detected_at', 'checked_at']
+    list_filter = ['status', 'detected_at']
+    search_fields = ['file__name']
+    readonly_fields = ['expected_hash', 'actual_hash', 'detected_at', 'checked_at']
+
+
+@admin.register(DailyUsage)
+class DailyUsageAdmin(admin.ModelAdmin):
+    list_display = ['date', 'user', 'category', 'total_bytes', 'file_count', 'uploads', 'deletes', 'share_downloads']
+    list_filter = ['date', 'category']
+    search_fields = ['user__username']
+    date_hierarchy = 'date'
+
+    def changelist_view(self, request, extra_context=None):
+        # 容量預測只讀彙總表
+        extra_context = extra_context or {}
+        extra_context['forecast'] = usage.forecast()
+        return super().changelist_view(request, extra_context=extra_context)
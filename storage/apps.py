@@ -5,3 +5,7 @@ class StorageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'storage'
     verbose_name = '檔案儲存系統'
+
+    def ready(self):
+        # 連線設定與全文索引的 signal
+        from . import sqlite  # noqa: F401
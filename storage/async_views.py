@@ -0,0 +1,149 @@
+"""非同步串流下載
+
+在 ASGI 下，下載、預覽與分享下載改用這裡的 async 版本：檔案以固定大小的區塊
+送出，每次讀取都丟到執行緒池中進行，等待慢速用戶端時不會佔住 worker，
+單一 ASGI 行程即可同時服務大量慢速下載。
+設定 ASYNC_DOWNLOADS=True 後由 urls.py 切換。
+"""
+import asyncio
+import mimetypes
+import os
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import redirect, render
+
+from . import bandwidth, compression, ranges, shares, signed_urls, tiering, views
+from .models import File
+
+
+async def _stream_file(file_obj, start=0, length=None):
+    """逐塊讀取檔案，讀取動作在執行緒中進行"""
+    chunk_size = settings.DOWNLOAD_CHUNK_SIZE
+    fh = await asyncio.to_thread(compression.open_file, file_obj)
+    try:
+        if start:
+            await asyncio.to_thread(fh.seek, start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await asyncio.to_thread(fh.read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(fh.close)
+
+
+def _prepare_read(file_obj):
+    """回升冷儲存並回傳原始大小，檔案不存在時回傳 None"""
+    tiering.ensure_hot(file_obj)
+    if not file_obj.file or not os.path.exists(file_obj.file.path):
+        return None
+    return compression.logical_size(file_obj)
+
+
+async def _get_own_file(request, pk):
+    user = await request.auser()
+    try:
+        return await File.objects.aget(pk=pk, owner=user)
+    except File.DoesNotExist:
+        raise Http404("檔案不存在")
+
+
+@login_required
+async def file_download(request, pk): #檔案下載
+    file_obj = await _get_own_file(request, pk)
+
+    file_size = await sync_to_async(_prepare_read)(file_obj)
+    if file_size is None:
+        raise Http404("檔案不存在")
+
+    limits = await sync_to_async(bandwidth.buckets)(file_obj.owner_id)
+    response = StreamingHttpResponse(
+        bandwidth.athrottle(_stream_file(file_obj), limits),
+        content_type=mimetypes.guess_type(file_obj.file.name)[0],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
+    response['Content-Length'] = str(file_size)
+    return response
+
+
+async def _stream_segments(file_obj, segments):
+    """依序送出 multipart 分隔與各段檔案內容"""
+    for segment in segments:
+        if isinstance(segment, bytes):
+            yield segment
+            continue
+        start, length = segment
+        async for chunk in _stream_file(file_obj, start, length):
+            yield chunk
+
+
+@login_required
+async def file_preview(request, pk): #檔案預覽（支援所有檔案的範圍請求）
+    file_obj = await _get_own_file(request, pk)
+
+    file_size = await sync_to_async(_prepare_read)(file_obj)
+    if file_size is None:
+        return redirect('storage:file_download', pk=pk)
+
+    content_type = mimetypes.guess_type(file_obj.file.name)[0] or 'application/octet-stream'
+    if file_obj.is_audio():
+        content_type = views.AUDIO_MIME_TYPES.get(file_obj.get_file_extension(), 'audio/mpeg')
+    limits = await sync_to_async(bandwidth.buckets)(file_obj.owner_id)
+
+    status, headers, segments = await asyncio.to_thread(
+        ranges.plan, request, file_obj.file.path, file_size, content_type
+    )
+    response = StreamingHttpResponse(
+        bandwidth.athrottle(_stream_segments(file_obj, segments), limits),
+        status=status,
+        content_type=headers.pop('Content-Type', content_type),
+    )
+    for header, value in headers.items():
+        response[header] = value
+    response['Content-Disposition'] = f'inline; filename="{file_obj.name}"'
+    return response
+
+
+def _claim_share_download(token):
+    """計入一次分享下載，無法下載時回傳 None"""
+    share_link = shares.get_share(token)
+    if share_link is None:
+        raise Http404("分享連結不存在")
+    if not shares.claim_download(share_link):
+        return None
+    return share_link
+
+
+async def shared_file_download(request, token): #透過分享連結下載檔案
+    # 下載頁面沿用同步版本，只有實際下載改為串流
+    if request.method != 'POST':
+        return await sync_to_async(views.shared_file_download)(request, token)
+
+    share_link = await sync_to_async(_claim_share_download)(token)
+    if share_link is None:
+        return await sync_to_async(render)(request, 'storage/share_expired.html', {
+            'reason': '分享連結已失效'
+        })
+
+    file = share_link.file
+    if settings.SIGNED_URLS:
+        # 轉到簽章網址，實際傳送不再經過分享連結的查詢
+        return redirect(await sync_to_async(signed_urls.sign)(file, 'download', share_link=share_link))
+    file_size = await sync_to_async(_prepare_read)(file)
+    if file_size is None:
+        raise Http404("檔案不存在")
+
+    limits = await sync_to_async(bandwidth.share_buckets)(share_link)
+    response = StreamingHttpResponse(
+        bandwidth.athrottle(_stream_file(file), limits), content_type='application/octet-stream'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{file.name}"'
+    response['Content-Length'] = str(file_size)
+    return response
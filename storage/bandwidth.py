@@ -0,0 +1,123 @@
+"""下載頻寬控制
+
+以 token bucket 限制下載速度，分成三種桶：全站、每位使用者、每個分享連結。
+每送出一塊資料前先向所有適用的桶預約同樣的位元組數，額度不足時桶會變成
+負值（欠額），預約者睡到欠額補回為止，同時下載的連線會依序輪流取得頻寬，
+單一使用者打包大量檔案或單一熱門分享連結不會佔滿整個上傳頻寬。
+
+桶的狀態放在本機的小型 SQLite 檔案（BANDWIDTH_STORE），同一台主機上的
+所有 worker 行程共用。速度單位為 KB/s，0 代表不限制；使用者與分享連結
+可在管理後台個別設定，留空則使用預設值。
+"""
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserProfile
+
+_local = threading.local()
+
+# 每次預約時有這個機率順便清掉很久沒用的桶（沒有紀錄的桶視為額度全滿）
+CLEANUP_PROBABILITY = 0.001
+STALE_SECONDS = 3600
+
+# 使用者頻寬設定的快取秒數
+USER_RATE_CACHE_TTL = 60
+
+
+def _connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(settings.BANDWIDTH_STORE, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+        )
+        _local.conn = conn
+    return conn
+
+
+def user_rate(user_id):
+    """使用者的速度上限（KB/s），沒有個別設定時使用 BANDWIDTH_USER_KBPS"""
+    key = f'bandwidth:user:{user_id}'
+    rate = cache.get(key)
+    if rate is None:
+        limit = UserProfile.objects.filter(user_id=user_id).values_list('bandwidth_limit', flat=True).first()
+        rate = settings.BANDWIDTH_USER_KBPS if limit is None else limit
+        cache.set(key, rate, USER_RATE_CACHE_TTL)
+    return rate
+
+
+def buckets(user_id=None, share_id=None, share_rate=None):
+    """適用的桶，回傳 [(key, 每秒位元組數)]，不限制的桶不列入"""
+    result = [('global', settings.BANDWIDTH_GLOBAL_KBPS)]
+    if user_id is not None:
+        result.append((f'user:{user_id}', user_rate(user_id)))
+    if share_id is not None:
+        rate = settings.BANDWIDTH_SHARE_KBPS if share_rate is None else share_rate
+        result.append((f'share:{share_id}', rate))
+    return [(key, rate * 1024) for key, rate in result if rate]
+
+
+def share_buckets(share_link):
+    """分享下載適用的桶：分享者本人、分享連結與全站"""
+    return buckets(share_link.created_by_id, share_link.pk, share_link.bandwidth_limit)
+
+
+def reserve(bucket_list, size):
+    """向所有桶預約 size 個位元組，回傳需要等待的秒數"""
+    if not bucket_list:
+        return 0
+
+    burst = settings.BANDWIDTH_BURST_SECONDS
+    conn = _connection()
+    now = time.time()
+    wait = 0
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for key, rate in bucket_list:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            capacity = rate * burst
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            tokens -= size
+            if tokens < 0:
+                wait = max(wait, -tokens / rate)
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now),
+            )
+        if random.random() < CLEANUP_PROBABILITY:
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - STALE_SECONDS,))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return wait
+
+
+def throttle(chunks, bucket_list):
+    """包住同步串流的產生器，依頻寬限制送出每一塊"""
+    if not bucket_list:
+        yield from chunks
+        return
+    for chunk in chunks:
+        wait = reserve(bucket_list, len(chunk))
+        if wait:
+            time.sleep(wait)
+        yield chunk
+
+
+async def athrottle(chunks, bucket_list):
+    """非同步版本，等待時不佔住事件迴圈"""
+    async for chunk in chunks:
+        if bucket_list:
+            wait = await asyncio.to_thread(reserve, bucket_list, len(chunk))
+            if wait:
+                await asyncio.sleep(wait)
+        yield chunk
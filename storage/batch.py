@@ -0,0 +1,287 @@
+"""批次操作 API
+
+一次請求處理多個操作（移動、移至回收站、還原、加減標籤、依樣式重新命名），
+每個操作以集合式查詢完成，不逐一 save()。整批在同一個交易中執行，
+個別項目失敗（找不到、名稱衝突等）只會記在結果中，不影響其他項目。
+"""
+import os
+import string
+
+from django.db.models import Q
+from django.utils import timezone
+
+from . import signed_urls
+from .models import File, Folder
+
+
+class BatchError(Exception):
+    """請求格式錯誤，整批不執行"""
+
+
+# 重新命名樣式可用的欄位
+RENAME_FIELDS = {'name', 'ext', 'n'}
+
+
+def _check_pattern(pattern):
+    """只允許 {name}、{ext}、{n} 與格式指定，不允許屬性、索引或巢狀欄位"""
+    try:
+        fields = list(string.Formatter().parse(pattern))
+    except ValueError as e:
+        raise BatchError(f'pattern 格式錯誤: {e}')
+    for _, field, spec, _ in fields:
+        if field is None:
+            continue
+        if field not in RENAME_FIELDS:
+            raise BatchError(f'pattern 只能使用 {{name}}、{{ext}}、{{n}}: {{{field}}}')
+        if spec and ('{' in spec or '}' in spec):
+            raise BatchError('pattern 不支援巢狀欄位')
+
+
+def _tags(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise BatchError('tags 必須是陣列或以逗號分隔的字串')
+    tags = [str(tag).strip() for tag in value if str(tag).strip()]
+    if not tags:
+        raise BatchError('tags 不可為空')
+    return tags
+
+
+class BatchRunner:
+    def __init__(self, user, max_items=None):
+        self.user = user
+        self.max_items = max_items
+        self.item_count = 0
+        self._folder_parents = None
+
+    # ---------- 共用 ----------
+
+    def _ids(self, value, field):
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            raise BatchError(f'{field} 必須是陣列')
+        try:
+            ids = list(dict.fromkeys(int(v) for v in value))
+        except (TypeError, ValueError):
+            raise BatchError(f'{field} 只能包含數字 ID')
+
+        self.item_count += len(ids)
+        if self.max_items and self.item_count > self.max_items:
+            raise BatchError(f'單次請求最多處理 {self.max_items} 個項目')
+        return ids
+
+    def folder_parents(self):
+        """使用者所有資料夾的 pk -> parent_id，一次查詢後快取"""
+        if self._folder_parents is None:
+            self._folder_parents = dict(
+                Folder.objects.filter(owner=self.user).values_list('pk', 'parent_id')
+            )
+        return self._folder_parents
+
+    def descendants(self, folder_ids):
+        """包含自身在內的所有子孫資料夾"""
+        children = {}
+        for pk, parent_id in self.folder_parents().items():
+            children.setdefault(parent_id, []).append(pk)
+
+        result = set()
+        stack = list(folder_ids)
+        while stack:
+            pk = stack.pop()
+            if pk in result:
+                continue
+            result.add(pk)
+            stack.extend(children.get(pk, []))
+        return result
+
+    def _split_files(self, file_ids, **filters):
+        found = set(
+            File.objects.filter(pk__in=file_ids, owner=self.user, **filters).values_list('pk', flat=True)
+        )
+        return [pk for pk in file_ids if pk in found], [pk for pk in file_ids if pk not in found]
+
+    def _split_folders(self, folder_ids):
+        parents = self.folder_parents()
+        return [pk for pk in folder_ids if pk in parents], [pk for pk in folder_ids if pk not in parents]
+
+    @staticmethod
+    def _result(op, files=(), folders=(), failed=()):
+        return {
+            'op': op,
+            'files': list(files),
+            'folders': list(folders),
+            'failed': list(failed),
+        }
+
+    @staticmethod
+    def _failures(kind, ids, error):
+        return [{'type': kind, 'id': pk, 'error': error} for pk in ids]
+
+    # ---------- 操作 ----------
+
+    def run(self, operation):
+        if not isinstance(operation, dict):
+            raise BatchError('每個操作必須是物件')
+        op = operation.get('op')
+        handler = getattr(self, f'op_{op}', None) if isinstance(op, str) else None
+        if handler is None:
+            raise BatchError(f'不支援的操作: {op}')
+        return handler(operation)
+
+    def op_move(self, operation):
+        file_ids = self._ids(operation.get('files'), 'files')
+        folder_ids = self._ids(operation.get('folders'), 'folders')
+        target_id = operation.get('target_folder')
+
+        if target_id is not None:
+            try:
+                target_id = int(target_id)
+            except (TypeError, ValueError):
+                raise BatchError('target_folder 必須是數字 ID 或 null')
+            if target_id not in self.folder_parents():
+                raise BatchError('目標資料夾不存在')
+
+        files, failed_files = self._split_files(file_ids)
+        folders, failed_folders = self._split_folders(folder_ids)
+        failed = self._failures('file', failed_files, '找不到檔案')
+        failed += self._failures('folder', failed_folders, '找不到資料夾')
+
+        # 不能把資料夾移進自己或自己的子資料夾，也就是目標本身或它的上層
+        if target_id is not None:
+            blocked = set()
+            pk = target_id
+            while pk is not None and pk not in blocked:
+                blocked.add(pk)
+                pk = self.folder_parents().get(pk)
+            failed += self._failures('folder', [pk for pk in folders if pk in blocked], '不能移動到自己的子資料夾')
+            folders = [pk for pk in folders if pk not in blocked]
+
+        # 目標位置已有同名資料夾時會違反唯一性
+        if folders:
+            existing = set(
+                Folder.objects.filter(owner=self.user, parent_id=target_id)
+                .exclude(pk__in=folders).values_list('name', flat=True)
+            )
+            seen = set()
+            conflicts = []
+            for pk, name in Folder.objects.filter(pk__in=folders).values_list('pk', 'name'):
+                if name in existing or name in seen:
+                    conflicts.append(pk)
+                seen.add(name)
+            failed += self._failures('folder', conflicts, '目標位置已有同名資料夾')
+            folders = [pk for pk in folders if pk not in conflicts]
+
+        File.objects.filter(pk__in=files).update(folder_id=target_id)
+        Folder.objects.filter(pk__in=folders).update(parent_id=target_id)
+        for pk in folders:
+            self.folder_parents()[pk] = target_id
+
+        return self._result('move', files, folders, failed)
+
+    def _set_deleted(self, op, operation, is_deleted):
+        file_ids = self._ids(operation.get('files'), 'files')
+        folder_ids = self._ids(operation.get('folders'), 'folders')
+        deleted_at = timezone.now() if is_deleted else None
+
+        # 已交給清除工作的項目不能再變更
+        files, failed_files = self._split_files(file_ids, purge_task__isnull=True)
+        folders, failed_folders = self._split_folders(folder_ids)
+
+        # 資料夾連同所有子資料夾與其中的檔案一起處理
+        all_folders = self.descendants(folders)
+        Folder.objects.filter(
+            pk__in=all_folders, purge_task__isnull=True
+        ).update(is_deleted=is_deleted, deleted_at=deleted_at)
+        File.objects.filter(
+            Q(folder_id__in=all_folders) | Q(pk__in=files), owner=self.user, purge_task__isnull=True
+        ).update(is_deleted=is_deleted, deleted_at=deleted_at)
+        if is_deleted:
+            # 移至回收站的檔案，之前發出的簽章網址全部失效
+            if all_folders:
+                signed_urls.revoke_user(self.user)
+            elif files:
+                signed_urls.revoke_file(files)
+
+        failed = self._failures('file', failed_files, '找不到檔案')
+        failed += self._failures('folder', failed_folders, '找不到資料夾')
+        return self._result(op, files, folders, failed)
+
+    def op_trash(self, operation):
+        return self._set_deleted('trash', operation, True)
+
+    def op_restore(self, operation):
+        return self._set_deleted('restore', operation, False)
+
+    def _change_tags(self, op, operation, add):
+        file_ids = self._ids(operation.get('files'), 'files')
+        tags = _tags(operation.get('tags'))
+
+        rows = File.objects.filter(pk__in=file_ids, owner=self.user).values_list('pk', 'tags')
+        tag_field = File._meta.get_field('tags')
+        changed = []
+        done = []
+        failed = []
+        for pk, current in rows:
+            current_tags = [t.strip() for t in (current or '').split(',') if t.strip()]
+            if add:
+                new_tags = current_tags + [t for t in tags if t not in current_tags]
+            else:
+                new_tags = [t for t in current_tags if t not in tags]
+            new_value = ', '.join(new_tags)
+            if len(new_value) > tag_field.max_length:
+                failed.append({'type': 'file', 'id': pk, 'error': '標籤總長度超過上限'})
+                continue
+            if new_value != (current or ''):
+                changed.append(File(pk=pk, tags=new_value))
+            done.append(pk)
+
+        File.objects.bulk_update(changed, ['tags'], batch_size=500)
+
+        found = set(done) | {f['id'] for f in failed}
+        failed += self._failures('file', [pk for pk in file_ids if pk not in found], '找不到檔案')
+        return self._result(op, done, (), failed)
+
+    def op_add_tags(self, operation):
+        return self._change_tags('add_tags', operation, True)
+
+    def op_remove_tags(self, operation):
+        return self._change_tags('remove_tags', operation, False)
+
+    def op_rename(self, operation):
+        """依樣式重新命名檔案，可用 {name}、{ext}、{n}（如 {n:03d}）"""
+        file_ids = self._ids(operation.get('files'), 'files')
+        pattern = operation.get('pattern')
+        if not isinstance(pattern, str) or not pattern.strip():
+            raise BatchError('pattern 不可為空')
+        _check_pattern(pattern)
+        try:
+            start = int(operation.get('start', 1))
+        except (TypeError, ValueError):
+            raise BatchError('start 必須是數字')
+        if operation.get('folders'):
+            raise BatchError('rename 只支援檔案')
+
+        names = dict(File.objects.filter(pk__in=file_ids, owner=self.user).values_list('pk', 'name'))
+        max_length = File._meta.get_field('name').max_length
+        changed = []
+        done = []
+        failed = []
+        # 編號依請求中的順序
+        for n, pk in enumerate((pk for pk in file_ids if pk in names), start):
+            stem, ext = os.path.splitext(names[pk])
+            try:
+                new_name = pattern.format(name=stem, ext=ext, n=n).strip()
+            except (KeyError, IndexError, ValueError, AttributeError, TypeError) as e:
+                raise BatchError(f'pattern 格式錯誤: {e}')
+            if not new_name or len(new_name) > max_length:
+                failed.append({'type': 'file', 'id': pk, 'error': '新名稱為空或過長'})
+                continue
+            changed.append(File(pk=pk, name=new_name))
+            done.append(pk)
+
+        File.objects.bulk_update(changed, ['name'], batch_size=500)
+
+        failed += self._failures('file', [pk for pk in file_ids if pk not in names], '找不到檔案')
+        return self._result('rename', done, (), failed)
@@ -0,0 +1,233 @@
+"""靜態壓縮儲存
+
+可壓縮的檔案（文字、CSV、JSON、SVG 等）在上傳後以分段格式壓縮存放：
+每 COMPRESS_FRAME_SIZE 個原始位元組獨立壓縮成一段，檔尾附上每段的大小表，
+讀取時只需解壓命中的那一段，因此範圍請求仍可隨機存取。
+
+    標頭:  MAGIC(4) 編碼(1) 每段原始大小(4)
+    資料:  各段壓縮資料
+    檔尾:  每段 (壓縮大小 4, 原始大小 4) ... 段數(4) 原始總大小(8) TRAILER_MAGIC(4)
+
+zstd 需要安裝 zstandard，未安裝時改用 gzip。
+"""
+import io
+import os
+import shutil
+import struct
+import uuid
+import zipfile
+import zlib
+
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+MAGIC = b'LSZ1'
+TRAILER_MAGIC = b'LSZT'
+HEADER = struct.Struct('<4sBI')
+FRAME_ENTRY = struct.Struct('<II')
+TRAILER = struct.Struct('<IQ4s')
+
+CODEC_GZIP = 'gzip'
+CODEC_ZSTD = 'zstd'
+CODEC_IDS = {CODEC_GZIP: 1, CODEC_ZSTD: 2}
+CODEC_NAMES = {v: k for k, v in CODEC_IDS.items()}
+
+# 壓縮後至少要省下這個比例才保留壓縮版本
+MIN_SAVING_RATIO = 0.1
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_codec():
+    codec = settings.COMPRESS_AT_REST_CODEC
+    if codec == CODEC_ZSTD and zstandard is None:
+        return CODEC_GZIP
+    return codec
+
+
+def _compressor(codec):
+    if codec == CODEC_ZSTD:
+        cctx = zstandard.ZstdCompressor(level=3)
+        return cctx.compress
+    # wbits=31 產生標準 gzip 格式
+    def compress(data):
+        c = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return c.compress(data) + c.flush()
+    return compress
+
+
+def _decompressor(codec):
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise OSError('讀取 zstd 壓縮檔需要安裝 zstandard')
+        dctx = zstandard.ZstdDecompressor()
+        return dctx.decompress
+    return lambda data: zlib.decompress(data, 31)
+
+
+def compress_path(path, codec=None, frame_size=None):
+    """把原始檔案就地壓縮成分段格式
+
+    以串流方式逐段壓縮到暫存檔，效益不足時保留原檔。
+    回傳壓縮後的實體大小，未壓縮時回傳 None。
+    """
+    codec = codec or get_codec()
+    frame_size = frame_size or settings.COMPRESS_FRAME_SIZE
+    compress = _compressor(codec)
+
+    raw_size = os.path.getsize(path)
+    if raw_size == 0:
+        return None
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    entries = []
+    try:
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(HEADER.pack(MAGIC, CODEC_IDS[codec], frame_size))
+            while True:
+                chunk = src.read(frame_size)
+                if not chunk:
+                    break
+                frame = compress(chunk)
+                dst.write(frame)
+                entries.append((len(frame), len(chunk)))
+            for entry in entries:
+                dst.write(FRAME_ENTRY.pack(*entry))
+            dst.write(TRAILER.pack(len(entries), raw_size, TRAILER_MAGIC))
+
+        stored_size = os.path.getsize(tmp_path)
+        if stored_size > raw_size * (1 - MIN_SAVING_RATIO):
+            os.remove(tmp_path)
+            return None
+
+        os.replace(tmp_path, path)
+        return stored_size
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FramedReader(io.RawIOBase):
+    """以原始位元組的角度讀取分段壓縮檔，支援 seek"""
+
+    def __init__(self, path):
+        self._fh = open(path, 'rb')
+        self.name = path
+        try:
+            magic, codec_id, self.frame_size = HEADER.unpack(self._fh.read(HEADER.size))
+            if magic != MAGIC:
+                raise OSError(f'不是壓縮檔: {path}')
+            self._decompress = _decompressor(CODEC_NAMES[codec_id])
+
+            self._fh.seek(-TRAILER.size, os.SEEK_END)
+            count, self.size, trailer_magic = TRAILER.unpack(self._fh.read(TRAILER.size))
+            if trailer_magic != TRAILER_MAGIC:
+                raise OSError(f'壓縮檔尾損毀: {path}')
+
+            self._fh.seek(-TRAILER.size - FRAME_ENTRY.size * count, os.SEEK_END)
+            table = self._fh.read(FRAME_ENTRY.size * count)
+        except BaseException:
+            self._fh.close()
+            raise
+
+        # 每段在實體檔案中的起始位置
+        self._frames = []
+        offset = HEADER.size
+        for i in range(count):
+            compressed_len, raw_len = FRAME_ENTRY.unpack_from(table, i * FRAME_ENTRY.size)
+            self._frames.append((offset, compressed_len, raw_len))
+            offset += compressed_len
+
+        self._pos = 0
+        self._cached_index = None
+        self._cached_frame = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f'無效的 whence: {whence}')
+        if pos < 0:
+            raise ValueError('seek 位置不可為負數')
+        self._pos = pos
+        return pos
+
+    def _frame(self, index):
+        if index != self._cached_index:
+            offset, compressed_len, _ = self._frames[index]
+            self._fh.seek(offset)
+            self._cached_frame = self._decompress(self._fh.read(compressed_len))
+            self._cached_index = index
+        return self._cached_frame
+
+    def readinto(self, buffer):
+        if self._pos >= self.size:
+            return 0
+        index = self._pos // self.frame_size
+        frame = self._frame(index)
+        start = self._pos - index * self.frame_size
+        data = frame[start:start + len(buffer)]
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def readall(self):
+        chunks = []
+        while True:
+            chunk = self.read(self.frame_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        if not self.closed:
+            self._fh.close()
+        super().close()
+
+
+def open_file(file_obj):
+    """開啟檔案供讀取，壓縮檔會自動解壓"""
+    path = file_obj.file.path
+    if file_obj.compression:
+        return io.BufferedReader(FramedReader(path), buffer_size=settings.COMPRESS_FRAME_SIZE)
+    return open(path, 'rb')
+
+
+def logical_size(file_obj):
+    """檔案解壓後的大小"""
+    if file_obj.compression:
+        return file_obj.file_size
+    return os.path.getsize(file_obj.file.path)
+
+
+def write_to_zip(zip_file, file_obj, arcname):
+    """把檔案加入 ZIP，壓縮檔以解壓後的內容寫入"""
+    if not file_obj.compression:
+        zip_file.write(file_obj.file.path, arcname)
+        return
+
+    info = zipfile.ZipInfo.from_file(file_obj.file.path, arcname)
+    info.compress_type = zip_file.compression
+    info.file_size = file_obj.file_size
+    with open_file(file_obj) as src, zip_file.open(info, 'w') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
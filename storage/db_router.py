@@ -0,0 +1,150 @@
+"""讀寫分離
+
+寫入一律送到主資料庫。只有明確標記為唯讀的 view（replica_reads）與
+管理指令的掃描才會把讀取送到 DB_REPLICAS 設定的副本，其他讀取仍走主資料庫，
+避免一般頁面讀到尚未同步的資料。
+
+- 副本延遲：每個副本每 DB_REPLICA_CHECK_INTERVAL 秒檢查一次，MySQL 讀取
+  SHOW REPLICA STATUS 的延遲秒數，超過 DB_REPLICA_MAX_LAG、複寫停止或連不上時
+  暫時不使用；其他資料庫（本機測試用的 SQLite）只檢查連線。沒有可用的副本時改讀主資料庫。
+- 讀到自己的寫入：使用者送出寫入請求（POST 等）後，ReplicaPinMiddleware 設定
+  cookie，DB_REPLICA_PIN_SECONDS 秒內該使用者的讀取都留在主資料庫。
+- 交易中的讀取一律走主資料庫。
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_use_replica = ContextVar('use_replica', default=False)
+_pinned = ContextVar('pinned', default=False)
+
+# 副本 -> (檢查時間, 是否可用)，每個行程各自檢查
+_health = {}
+_health_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+@contextmanager
+def replica_reads():
+    """這段期間的讀取可以送到副本，也可以當成 view 的 decorator 使用"""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replication_lag(alias):
+    """副本落後的秒數；複寫停止時回傳 None"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor != 'mysql':
+            cursor.execute('SELECT 1')
+            return 0
+
+        # MySQL 8.0.22 以後改名為 REPLICA，舊版與部分 MariaDB 只有 SLAVE
+        for statement, column in (
+            ('SHOW REPLICA STATUS', 'Seconds_Behind_Source'),
+            ('SHOW SLAVE STATUS', 'Seconds_Behind_Master'),
+        ):
+            try:
+                cursor.execute(statement)
+            except DatabaseError:
+                continue
+            row = cursor.fetchone()
+            if row is None:
+                # 不是副本（例如本機測試用的第二個資料庫），視為沒有延遲
+                return 0
+            status = dict(zip([col[0] for col in cursor.description], row))
+            lag = status.get(column)
+            return None if lag is None else int(lag)
+    return None
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    with _health_lock:
+        checked_at, healthy = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < settings.DB_REPLICA_CHECK_INTERVAL:
+        return healthy
+
+    try:
+        lag = replication_lag(alias)
+        healthy = lag is not None and lag <= settings.DB_REPLICA_MAX_LAG
+    except DatabaseError:
+        healthy = False
+        connections[alias].close()
+
+    with _health_lock:
+        _health[alias] = (now, healthy)
+    return healthy
+
+
+def choose_replica():
+    """隨機選一個可用的副本，沒有時回傳主資料庫"""
+    healthy = [alias for alias in replica_aliases() if is_healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or _pinned.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        # 從副本讀出的物件儲存時也要寫回主資料庫
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 所有副本與主資料庫的資料相同
+        return True
+
+
+@sync_and_async_middleware
+def ReplicaPinMiddleware(get_response):
+    """寫入請求之後的一段時間內，同一個使用者的讀取都留在主資料庫"""
+
+    def pin(request):
+        return _pinned.set(PIN_COOKIE in request.COOKIES)
+
+    def mark(request, response):
+        if request.method not in SAFE_METHODS and replica_aliases():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = pin(request)
+            try:
+                response = await get_response(request)
+            finally:
+                _pinned.reset(token)
+            return mark(request, response)
+    else:
+        def middleware(request):
+            token = pin(request)
+            try:
+                response = get_response(request)
+            finally:
+                _pinned.reset(token)
+            return mark(request, response)
+
+    return middleware
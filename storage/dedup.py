@@ -0,0 +1,133 @@
+"""重複檔案分組
+
+重複組以視窗函式（ROW_NUMBER / COUNT / FIRST_VALUE OVER PARTITION BY file_hash）
+在同一個查詢中算出，依序讀取後在 Python 端依 hash 切成組，
+不需要每個 hash 再查一次。每組最早上傳的檔案視為原始檔案。
+
+fill_candidate_hashes 是快速模式的前置步驟：先依大小分組，大小相同的檔案
+才計算部分 hash（開頭與結尾各一段），部分 hash 仍相同的才讀完整檔案
+計算 file_hash。大小或部分 hash 唯一的檔案不可能重複，不需要讀完。
+算出的部分 hash 與完整 hash 都會存回資料庫，下次執行直接沿用。
+"""
+from itertools import groupby
+
+from django.db.models import Count, F, Max, Sum, Window
+from django.db.models.functions import FirstValue, RowNumber
+
+from .models import File
+
+# 部分 hash 讀取開頭與結尾各多少位元組。存下來的部分 hash 只有在同一個大小下
+# 才能互相比較，因此固定不變，不提供選項
+PARTIAL_HASH_SAMPLE_SIZE = 65536
+
+
+def hashed_files(queryset):
+    """只保留已計算 hash 的檔案"""
+    return queryset.filter(file_hash__isnull=False).exclude(file_hash='')
+
+
+def duplicate_summary(queryset):
+    """每個重複 hash 的檔案數與浪費空間，依浪費空間由大到小排序
+
+    同一個 hash 的檔案大小相同，浪費空間 = 總大小 - 單一檔案大小。
+    """
+    return hashed_files(queryset).values('file_hash').annotate(
+        count=Count('id'),
+        wasted=Sum('file_size') - Max('file_size'),
+    ).filter(count__gt=1).order_by('-wasted', 'file_hash')
+
+
+def duplicate_files(queryset):
+    """標上組內資訊的重複檔案，依浪費空間、hash、上傳時間排序"""
+    partition = {'partition_by': [F('file_hash')]}
+    in_upload_order = {'order_by': [F('created_at').asc(), F('pk').asc()]}
+    return hashed_files(queryset).annotate(
+        group_rank=Window(RowNumber(), **partition, **in_upload_order),
+        group_size=Window(Count('id'), **partition),
+        group_wasted=Window(Sum('file_size'), **partition)
+        - Window(FirstValue('file_size'), **partition, **in_upload_order),
+    ).filter(group_size__gt=1).order_by('-group_wasted', 'file_hash', 'group_rank')
+
+
+def iter_groups(files):
+    """把依 hash 排好序的檔案切成重複組"""
+    for hash_value, group in groupby(files, key=lambda f: f.file_hash):
+        original, *duplicates = group
+        yield {
+            'hash': hash_value,
+            'original': original,
+            'duplicates': duplicates,
+            'wasted_space': original.group_wasted,
+        }
+
+
+def _has_hash(file_obj):
+    return bool(file_obj.file_hash)
+
+
+def _hash_bucket(files, stats):
+    """處理一組大小相同的檔案，回傳需要更新的檔案"""
+    changed = {}
+
+    # 小檔案的部分 hash 就是讀完整個檔案，直接當作完整 hash
+    if files[0].file_size <= PARTIAL_HASH_SAMPLE_SIZE * 2:
+        for file_obj in files:
+            if not _has_hash(file_obj):
+                file_obj.file_hash = file_obj.calculate_hash()
+                stats['full'] += 1
+                changed[file_obj.pk] = file_obj
+        return changed.values()
+
+    for file_obj in files:
+        if not file_obj.partial_hash:
+            file_obj.partial_hash = file_obj.calculate_partial_hash(PARTIAL_HASH_SAMPLE_SIZE)
+            stats['partial'] += 1
+            changed[file_obj.pk] = file_obj
+
+    by_partial = {}
+    for file_obj in files:
+        if file_obj.partial_hash:
+            by_partial.setdefault(file_obj.partial_hash, []).append(file_obj)
+
+    for candidates in by_partial.values():
+        if len(candidates) < 2:
+            continue
+        for file_obj in candidates:
+            if not _has_hash(file_obj):
+                file_obj.file_hash = file_obj.calculate_hash()
+                stats['full'] += 1
+                changed[file_obj.pk] = file_obj
+
+    return changed.values()
+
+
+def fill_candidate_hashes(queryset, batch_size=500):
+    """為可能重複的檔案補上 hash，回傳各階段的統計
+
+    只讀取大小相同的檔案，依大小排序串流處理，記憶體用量只和最大的
+    同大小組有關。
+    """
+    stats = {'buckets': 0, 'files': 0, 'partial': 0, 'full': 0}
+    rows = queryset.annotate(
+        size_count=Window(Count('id'), partition_by=[F('file_size')]),
+    ).filter(size_count__gt=1).only(
+        'pk', 'name', 'file', 'file_size', 'file_hash', 'partial_hash',
+        'storage_tier', 'cold_compressed', 'compression',
+    ).order_by('file_size', 'pk')
+
+    pending = []
+    for _, bucket in groupby(rows.iterator(chunk_size=2000), key=lambda f: f.file_size):
+        bucket = list(bucket)
+        stats['files'] += len(bucket)
+        # 全部都已有完整 hash 的組不需要處理
+        if all(_has_hash(f) for f in bucket):
+            continue
+        stats['buckets'] += 1
+        pending.extend(_hash_bucket(bucket, stats))
+        if len(pending) >= batch_size:
+            File.objects.bulk_update(pending, ['file_hash', 'partial_hash'])
+            pending = []
+
+    if pending:
+        File.objects.bulk_update(pending, ['file_hash', 'partial_hash'])
+    return stats
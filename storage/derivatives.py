@@ -0,0 +1,114 @@
+"""螢幕尺寸的預覽圖
+
+file_view 不直接送出原圖：依需要的寬度選擇 PREVIEW_SIZES 中的尺寸（長邊），
+第一次請求時產生並存在 MEDIA_ROOT/previews/<檔案 id>/，之後直接送出。
+格式依 Accept 標頭決定，瀏覽器支援時用 AVIF 或 WebP，否則用 JPEG。
+原圖只能透過下載取得。JPEG 以 draft 模式解碼，大張相片不需要完整解碼。
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from . import compression
+
+PREVIEW_DIR = 'previews'
+
+# 格式 -> (Pillow 格式名稱, Content-Type, 儲存參數)
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', {'quality': 60}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# 不產生預覽圖、直接送出原檔的格式（向量圖與動畫）
+PASSTHROUGH_EXTENSIONS = ['.svg', '.gif']
+
+
+def _supported(image_format):
+    from PIL import features
+    return features.check(image_format.lower())
+
+
+def choose_format(accept):
+    """依 Accept 標頭選擇輸出格式"""
+    accept = accept or ''
+    for name in ('avif', 'webp'):
+        if f'image/{name}' in accept and _supported(name):
+            return name
+    return 'jpeg'
+
+
+def choose_size(requested=None):
+    """選擇不小於需要寬度的最小尺寸，沒有指定時用最小的尺寸"""
+    sizes = sorted(settings.PREVIEW_SIZES)
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        return sizes[0]
+    for size in sizes:
+        if size >= requested:
+            return size
+    return sizes[-1]
+
+
+def preview_root(file_id):
+    return os.path.join(settings.MEDIA_ROOT, PREVIEW_DIR, str(file_id))
+
+
+def get_preview(file_obj, size, image_format):
+    """回傳預覽圖路徑，需要時才產生；原圖比預覽圖新時重新產生"""
+    source = file_obj.file.path
+    path = os.path.join(preview_root(file_obj.pk), f'{size}.{image_format}')
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(source):
+            return path
+    except FileNotFoundError:
+        pass
+
+    with compression.open_file(file_obj) as fh:
+        generate(fh, path, size, image_format)
+    return path
+
+
+def generate(source, path, size, image_format):
+    """把 source（路徑或檔案物件）縮到長邊不超過 size，不會放大"""
+    from PIL import Image, ImageOps
+
+    pil_format, _, options = FORMATS[image_format]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with Image.open(source) as img:
+        # JPEG 直接以縮小的比例解碼，速度快很多
+        img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            if pil_format == 'JPEG':
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+        # 先寫暫存檔再取代，同時有多個請求產生同一張預覽圖也不會讀到一半的檔案
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                img.save(fh, format=pil_format, **options)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def content_type(image_format):
+    return FORMATS[image_format][1]
+
+
+def remove_previews(file_id):
+    """刪除檔案的所有預覽圖"""
+    shutil.rmtree(preview_root(file_id), ignore_errors=True)
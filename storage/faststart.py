@@ -0,0 +1,174 @@
+"""MP4 快速播放（faststart）
+
+很多 MP4 的 moov（索引）放在檔案最後，瀏覽器要先取得檔尾才能開始播放。
+這裡解析最上層的 box，把 moov 移到 mdat 之前，並修正 stco / co64 中的
+chunk 位移。mdat 以串流方式複製，只有 moov 會讀進記憶體；位移超過 32 位元
+時 stco 會改寫成 co64。寫入暫存檔後再取代原檔，失敗不會破壞原檔。
+"""
+import os
+import shutil
+import struct
+import tempfile
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# 超過這個大小的 moov 不處理，避免整個讀進記憶體
+MAX_MOOV_SIZE = 64 * 1024 * 1024
+
+# 需要往下找 stco / co64 的容器 box
+CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# 處理結果
+MOVED = 'moved'
+ALREADY = 'already'
+SKIPPED = 'skipped'
+
+
+class FaststartError(Exception):
+    """檔案結構無法處理"""
+
+
+def read_boxes(fh, end):
+    """列出最上層的 box，回傳 [(類型, 起點, 大小)]"""
+    boxes = []
+    offset = 0
+    while offset < end:
+        fh.seek(offset)
+        header = fh.read(8)
+        if len(header) < 8:
+            raise FaststartError('box 標頭不完整')
+        size, box_type = struct.unpack('>I4s', header)
+        if size == 1:
+            size = struct.unpack('>Q', fh.read(8))[0]
+        elif size == 0:
+            size = end - offset
+        if size < 8 or offset + size > end:
+            raise FaststartError(f'{box_type!r} 大小錯誤')
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+
+def _children(data):
+    offset = 0
+    while offset < len(data):
+        if offset + 8 > len(data):
+            raise FaststartError('moov 結構不完整')
+        size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - offset
+        if size < header_size or offset + size > len(data):
+            raise FaststartError(f'{box_type!r} 大小錯誤')
+        yield box_type, data[offset + header_size:offset + size]
+        offset += size
+
+
+def _box(box_type, payload):
+    if len(payload) + 8 > 0xFFFFFFFF:
+        return struct.pack('>I4sQ', 1, box_type, len(payload) + 16) + payload
+    return struct.pack('>I4s', len(payload) + 8, box_type) + payload
+
+
+def _rebuild(data, shift, use_co64):
+    """重組 box 內容，修正所有 chunk 位移"""
+    out = []
+    for box_type, payload in _children(data):
+        if box_type in CONTAINERS:
+            out.append(_box(box_type, _rebuild(payload, shift, use_co64)))
+        elif box_type == b'stco':
+            version_flags, count = struct.unpack_from('>4sI', payload)
+            offsets = [shift(o) for o in struct.unpack_from(f'>{count}I', payload, 8)]
+            if use_co64:
+                out.append(_box(b'co64', version_flags + struct.pack(f'>I{count}Q', count, *offsets)))
+            else:
+                if offsets and max(offsets) > 0xFFFFFFFF:
+                    raise OverflowError
+                out.append(_box(b'stco', version_flags + struct.pack(f'>I{count}I', count, *offsets)))
+        elif box_type == b'co64':
+            version_flags, count = struct.unpack_from('>4sI', payload)
+            offsets = [shift(o) for o in struct.unpack_from(f'>{count}Q', payload, 8)]
+            out.append(_box(b'co64', version_flags + struct.pack(f'>I{count}Q', count, *offsets)))
+        elif box_type == b'cmov':
+            raise FaststartError('不支援壓縮的 moov')
+        else:
+            out.append(_box(box_type, payload))
+    return b''.join(out)
+
+
+def _copy_range(src, dst, start, length):
+    src.seek(start)
+    while length > 0:
+        chunk = src.read(min(COPY_BUFFER_SIZE, length))
+        if not chunk:
+            raise FaststartError('檔案提前結束')
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def faststart(path):
+    """把 moov 移到 mdat 之前，回傳 MOVED、ALREADY 或 SKIPPED"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as src:
+        boxes = read_boxes(src, file_size)
+        types = [box_type for box_type, _, _ in boxes]
+        if b'moov' not in types or b'mdat' not in types:
+            return SKIPPED
+
+        moov_index = types.index(b'moov')
+        if moov_index < types.index(b'mdat'):
+            return ALREADY
+
+        _, moov_start, moov_size = boxes[moov_index]
+        if moov_size > MAX_MOOV_SIZE:
+            return SKIPPED
+        src.seek(moov_start)
+        old_moov = src.read(moov_size)
+
+        # moov 插在第一個 mdat 之前（通常就是 ftyp 之後）
+        insert_at = boxes[types.index(b'mdat')][1]
+
+        _, moov_payload = next(_children(old_moov))
+
+        # 先試著保留 stco，位移超過 32 位元時改用 co64；
+        # 位移量等於新 moov 的大小，改用 co64 後 moov 會變大，所以需要再算一次
+        use_co64 = False
+        new_size = moov_size
+        for _ in range(3):
+            def shift(offset, grow=new_size):
+                if offset < insert_at:
+                    return offset
+                if offset < moov_start:
+                    return offset + grow
+                return offset + grow - moov_size
+
+            try:
+                new_moov = _box(b'moov', _rebuild(moov_payload, shift, use_co64))
+            except OverflowError:
+                use_co64 = True
+                continue
+            if len(new_moov) == new_size:
+                break
+            new_size = len(new_moov)
+        else:
+            raise FaststartError('無法計算 moov 大小')
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.faststart')
+        try:
+            with os.fdopen(fd, 'wb') as dst:
+                _copy_range(src, dst, 0, insert_at)
+                dst.write(new_moov)
+                for box_type, start, size in boxes:
+                    if start < insert_at or box_type == b'moov' and start == moov_start:
+                        continue
+                    _copy_range(src, dst, start, size)
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return MOVED
@@ -0,0 +1,76 @@
+"""媒體畫廊
+
+同一資料夾中的圖片與影片依 (類別, 名稱, id) 排序，剛好對應
+(owner, folder, category, name) 索引。分頁用 keyset（以某個檔案為錨點往前或往後取），
+位置與總數也只做索引上的 COUNT，不需要把整個資料夾的檔案讀進來，
+數萬張照片的資料夾捲動時每頁的成本都一樣。
+"""
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import File
+
+CATEGORIES = [File.CATEGORY_IMAGE, File.CATEGORY_VIDEO]
+ORDERING = ['category', 'name', 'pk']
+REVERSED = ['-category', '-name', '-pk']
+
+
+def gallery_files(user, folder_id):
+    return File.objects.filter(
+        owner=user, folder_id=folder_id, is_deleted=False, category__in=CATEGORIES
+    ).select_related('owner__profile')  # 簽章網址需要使用者的金鑰世代
+
+
+def _after(anchor):
+    return (
+        Q(category__gt=anchor.category)
+        | Q(category=anchor.category, name__gt=anchor.name)
+        | Q(category=anchor.category, name=anchor.name, pk__gt=anchor.pk)
+    )
+
+
+def _before(anchor):
+    return (
+        Q(category__lt=anchor.category)
+        | Q(category=anchor.category, name__lt=anchor.name)
+        | Q(category=anchor.category, name=anchor.name, pk__lt=anchor.pk)
+    )
+
+
+def position(files, anchor):
+    """錨點在畫廊中的位置（從 1 開始）"""
+    return files.filter(_before(anchor)).count() + 1
+
+
+def page(files, anchor=None, direction='after', limit=60):
+    """以錨點為界往後（或往前）取一頁，回傳 (檔案列表, 第一個檔案的位置, 是否還有更多)"""
+    if direction == 'before' and anchor is not None:
+        items = list(files.filter(_before(anchor)).order_by(*REVERSED)[:limit + 1])
+        has_more = len(items) > limit
+        items = items[:limit][::-1]
+        return items, position(files, anchor) - len(items), has_more
+
+    if anchor is None:
+        items = list(files.order_by(*ORDERING)[:limit + 1])
+        start = 1
+    else:
+        items = list(files.filter(_after(anchor)).order_by(*ORDERING)[:limit + 1])
+        start = position(files, anchor) + 1
+    return items[:limit], start, len(items) > limit
+
+
+def item(file_obj, index):
+    """畫廊需要的檔案資訊"""
+    thumbnail = file_obj.thumbnail.url if file_obj.thumbnail else None
+    return {
+        'id': file_obj.pk,
+        'name': file_obj.name,
+        'category': file_obj.category,
+        'file_type': file_obj.file_type,
+        'position': index,
+        'width': file_obj.width,
+        'height': file_obj.height,
+        'thumbnail_url': thumbnail,
+        'preview_url': file_obj.get_preview_url(),
+        'gallery_url': reverse('storage:media_gallery', args=[file_obj.pk]),
+    }
@@ -0,0 +1,82 @@
+"""秒傳
+
+上傳前用戶端先送出檔案大小與 SHA-256（瀏覽器在 Web Worker 中計算），
+使用者自己已經有相同內容的檔案時，直接建立新的檔案紀錄，不必再傳一次。
+
+只比對使用者自己的檔案：只憑 hash 就能取得別人的檔案等於洩漏內容，
+因此其他使用者的檔案不列入。新的檔案以硬連結指向既有的實體檔案，
+不佔用額外空間；之後搬移、壓縮、降級或刪除任一邊都是以新檔案取代路徑，
+不會影響另一邊。無法建立硬連結（不同磁碟、檔案系統不支援）時改為在伺服器端複製。
+"""
+import mimetypes
+import os
+import re
+import shutil
+
+from .models import File
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def find_source(user, sha256, size):
+    """使用者自己的檔案中內容相同、實體檔案在熱儲存的一個"""
+    candidates = File.objects.filter(
+        owner=user,
+        file_hash=sha256,
+        file_size=size,
+        is_deleted=False,
+        purge_task__isnull=True,
+        storage_tier=File.TIER_HOT,
+    ).exclude(file='').order_by('pk')
+    for candidate in candidates[:5]:
+        if os.path.exists(candidate.file.path):
+            return candidate
+    return None
+
+
+def _link(source_path, name, storage):
+    """在 storage 中以 name（重複時自動改名）建立 source_path 的硬連結，回傳實際名稱"""
+    name = storage.generate_filename(name)
+    max_length = File._meta.get_field('file').max_length
+    while True:
+        name = storage.get_available_name(name, max_length=max_length)
+        target = storage.path(name)
+        try:
+            os.link(source_path, target)
+            return name
+        except FileExistsError:
+            # 同時有另一個請求用了同一個名稱，重新取名
+            continue
+        except OSError:
+            try:
+                with open(source_path, 'rb') as src, open(target, 'xb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                return name
+            except FileExistsError:
+                continue
+
+
+def create_from(source, owner, name, folder=None):
+    """以 source 的實體檔案建立新的檔案紀錄"""
+    storage = source.file.storage
+    stored_name = _link(source.file.path, os.path.basename(name), storage)
+
+    file_obj = File(
+        owner=owner,
+        folder=folder,
+        name=name,
+        file=stored_name,
+        file_size=source.file_size,
+        file_type=mimetypes.guess_type(name)[0] or 'unknown',
+        file_hash=source.file_hash,
+        partial_hash=source.partial_hash,
+        # 壓縮過的實體檔案照原樣沿用
+        compression=source.compression,
+        stored_size=source.stored_size,
+    )
+    try:
+        file_obj.save()
+    except Exception:
+        storage.delete(stored_name)
+        raise
+    return file_obj
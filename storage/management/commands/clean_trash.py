@@ -1,8 +1,16 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db.models import Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
-from storage.models import File, Folder
+from storage.models import File, Folder, JobCheckpoint
+from storage import purge
 import os
+import time
+
+
+CHECKPOINT_NAME = 'clean_trash'
 
 
 class Command(BaseCommand):
@@ -20,6 +28,40 @@ class Command(BaseCommand):
             action='store_true',
             help='僅顯示會被刪除的項目，不實際刪除'
         )
+        parser.add_argument(
+            '--chunked',
+            action='store_true',
+            help='分批平行清除，適合大量項目，中斷後可從進度繼續'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='分批模式每批處理的項目數（預設 1000）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.PURGE_WORKERS,
+            help=f'分批模式刪除實體檔案的執行緒數（預設 PURGE_WORKERS={settings.PURGE_WORKERS}，與背景清除工作相同）'
+        )
+        parser.add_argument(
+            '--max-files-per-second',
+            type=float,
+            default=0,
+            help='分批模式每秒最多刪除幾個實體檔案，避免影響線上服務（0 表示不限制）'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='分批模式每批之間暫停的秒數'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='忽略上次中斷留下的進度，重新開始'
+        )
 
     def handle(self, *args, **options):
         days = options['days']
@@ -28,6 +70,9 @@ class Command(BaseCommand):
         # 計算截止日期
         cutoff_date = timezone.now() - timedelta(days=days)
         
+        if options['chunked'] and not dry_run:
+            return self.handle_chunked(cutoff_date, options)
+        
         self.stdout.write(f'清理超過 {days} 天的回收站項目')
         self.stdout.write(f'截止日期: {cutoff_date.strftime("%Y-%m-%d %H:%M:%S")}')
         
@@ -48,7 +93,7 @@ class Command(BaseCommand):
         
         file_count = expired_files.count()
         folder_count = expired_folders.count()
-        total_size = sum(f.file_size for f in expired_files)
+        total_size = expired_files.aggregate(total=Sum('file_size'))['total'] or 0
         
         self.stdout.write(f'\n找到:')
         self.stdout.write(f'  檔案: {file_count} 個 ({self.format_size(total_size)})')
@@ -114,6 +159,103 @@ class Command(BaseCommand):
         self.stdout.write(f'  刪除檔案: {deleted_files} 個 ({self.format_size(deleted_size)})')
         self.stdout.write(f'  刪除資料夾: {deleted_folders} 個')
     
+    def handle_chunked(self, cutoff_date, options):
+        """分批清除：每批平行刪除實體檔案後直接 DELETE 資料列，並記錄進度"""
+        batch_size = max(1, options['batch_size'])
+        workers = options['workers']
+        max_rate = options['max_files_per_second']
+        pause = options['pause']
+        
+        checkpoint, created = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        state = checkpoint.state
+        if state and not options['restart']:
+            # 沿用上次的截止日期，才能從中斷處繼續
+            cutoff_date = parse_datetime(state['cutoff'])
+            self.stdout.write(self.style.WARNING(
+                f'從上次中斷處繼續（檔案 #{state["last_file_pk"]}、資料夾 #{state["last_folder_pk"]} 之後）'
+            ))
+        else:
+            state = {
+                'cutoff': cutoff_date.isoformat(),
+                'last_file_pk': 0,
+                'last_folder_pk': 0,
+                'deleted_files': 0,
+                'deleted_size': 0,
+                'deleted_folders': 0,
+                'failed': 0,
+            }
+        
+        def save_state():
+            checkpoint.state = state
+            checkpoint.save(update_fields=['state', 'updated_at'])
+        
+        self.stdout.write(f'截止日期: {cutoff_date.strftime("%Y-%m-%d %H:%M:%S")}')
+        
+        expired_files = File.objects.filter(is_deleted=True, deleted_at__lt=cutoff_date)
+        expired_folders = Folder.objects.filter(is_deleted=True, deleted_at__lt=cutoff_date)
+        
+        remaining = expired_files.filter(pk__gt=state['last_file_pk'])
+        summary = remaining.aggregate(total=Sum('file_size'))
+        self.stdout.write(f'\n待清除檔案: {remaining.count()} 個 ({self.format_size(summary["total"] or 0)})')
+        self.stdout.write(f'待清除資料夾: {expired_folders.filter(pk__gt=state["last_folder_pk"]).count()} 個')
+        
+        # 檔案：以 pk 遞增分批，每批都是獨立的短查詢
+        while True:
+            chunk = list(
+                expired_files.filter(pk__gt=state['last_file_pk'])
+                .only(*purge.PURGE_FIELDS).order_by('pk')[:batch_size]
+            )
+            if not chunk:
+                break
+            
+            started = time.monotonic()
+            done, errors = purge.unlink_many(chunk, workers)
+            for file, error in errors:
+                self.stdout.write(self.style.ERROR(f'  ✗ 刪除 {file.name} 失敗: {error}'))
+            
+            purge.delete_file_rows([file.pk for file in done])
+            
+            state['last_file_pk'] = chunk[-1].pk
+            state['deleted_files'] += len(done)
+            state['deleted_size'] += sum(file.file_size for file in done)
+            state['failed'] += len(errors)
+            save_state()
+            
+            self.stdout.write(f'  已清除 {state["deleted_files"]} 個檔案 ({self.format_size(state["deleted_size"])})')
+            self.throttle(started, len(chunk), max_rate, pause)
+        
+        # 資料夾
+        while True:
+            chunk = list(
+                expired_folders.filter(pk__gt=state['last_folder_pk'])
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not chunk:
+                break
+            
+            state['deleted_folders'] += purge.delete_folder_rows(chunk)
+            state['last_folder_pk'] = chunk[-1]
+            save_state()
+            if pause:
+                time.sleep(pause)
+        
+        checkpoint.delete()
+        
+        # 顯示結果
+        self.stdout.write(self.style.SUCCESS(f'\n✓ 清理完成!'))
+        self.stdout.write(f'  刪除檔案: {state["deleted_files"]} 個 ({self.format_size(state["deleted_size"])})')
+        self.stdout.write(f'  刪除資料夾: {state["deleted_folders"]} 個')
+        if state['failed']:
+            self.stdout.write(self.style.WARNING(f'  失敗: {state["failed"]} 個'))
+    
+    def throttle(self, started, count, max_rate, pause):
+        """依每秒檔案數上限與批次間隔暫停"""
+        delay = pause
+        if max_rate > 0:
+            delay += max(0, count / max_rate - (time.monotonic() - started))
+        if delay > 0:
+            time.sleep(delay)
+    
     def format_size(self, size):
         """格式化檔案大小"""
         for unit in ['B', 'KB', 'MB', 'GB']:
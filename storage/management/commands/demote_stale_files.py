@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from storage.models import File
+from storage import tiering
+
+
+class Command(BaseCommand):
+    help = '把長時間未存取的檔案降級到冷儲存'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TIER_DEMOTE_AFTER_DAYS,
+            help=f'超過指定天數未存取即降級（預設 {settings.TIER_DEMOTE_AFTER_DAYS} 天）'
+        )
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            default=settings.TIER_COLD_COMPRESS,
+            help='降級時以 gzip 壓縮'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='最多處理幾個檔案（0 表示不限制）'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='僅顯示會被降級的檔案，不實際搬移'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        compress = options['compress']
+        limit = options['limit']
+        dry_run = options['dry_run']
+
+        # 先把本行程緩衝的存取紀錄寫回
+        tiering.flush_access_buffer()
+
+        cutoff_date = timezone.now() - timedelta(days=days)
+        self.stdout.write(f'降級超過 {days} 天未存取的檔案')
+        self.stdout.write(f'截止日期: {cutoff_date.strftime("%Y-%m-%d %H:%M:%S")}')
+
+        # 從未被讀取過的檔案以上傳時間判斷
+        stale_files = File.objects.filter(
+            storage_tier=File.TIER_HOT
+        ).filter(
+            Q(last_accessed_at__lt=cutoff_date) |
+            Q(last_accessed_at__isnull=True, created_at__lt=cutoff_date)
+        ).order_by('pk')
+
+        if limit:
+            stale_files = stale_files[:limit]
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('⚠ 測試模式 - 不會實際搬移'))
+            count = 0
+            for file in stale_files.iterator():
+                self.stdout.write(f'  • {file.name} ({file.get_size_display()})')
+                count += 1
+            self.stdout.write(f'\n共 {count} 個檔案')
+            return
+
+        demoted = 0
+        skipped = 0
+        failed = 0
+        logical_bytes = 0
+        stored_bytes = 0
+
+        for file in stale_files.iterator():
+            try:
+                if tiering.demote_file(file, compress=compress):
+                    demoted += 1
+                    logical_bytes += file.file_size
+                    stored_bytes += file.stored_size or 0
+                else:
+                    skipped += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f'  ✗ 降級 {file.name} 失敗: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'\n完成!'))
+        self.stdout.write(f'  降級: {demoted} 個 ({self.format_size(logical_bytes)})')
+        if compress:
+            self.stdout.write(f'  冷儲存實際佔用: {self.format_size(stored_bytes)}')
+        self.stdout.write(f'  跳過: {skipped}')
+        if failed > 0:
+            self.stdout.write(self.style.WARNING(f'  失敗: {failed}'))
+
+    def format_size(self, size):
+        """格式化檔案大小"""
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024.0:
+                return f"{size:.1f} {unit}"
+            size /= 1024.0
+        return f"{size:.1f} TB"
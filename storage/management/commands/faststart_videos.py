@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from storage.models import File
+
+
+class Command(BaseCommand):
+    help = '把既有 MP4 影片的 moov 移到檔案開頭，讓瀏覽器可以邊下載邊播放'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='重新處理之前失敗的影片'
+        )
+
+    def handle(self, *args, **options):
+        statuses = [''] + ([File.FASTSTART_FAILED] if options['retry_failed'] else [])
+        files = File.objects.filter(
+            extension__in=File.FASTSTART_EXTENSIONS,
+            faststart__in=statuses,
+            storage_tier=File.TIER_HOT,
+            compression='',
+        ).exclude(file='')
+        total = files.count()
+
+        self.stdout.write(f'檢查 {total} 個影片')
+
+        results = {status: 0 for status, _ in File.FASTSTART_CHOICES}
+        for i, file in enumerate(files.iterator(), 1):
+            self.stdout.write(f'[{i}/{total}] 處理: {file.name}')
+            file.apply_faststart()
+            results[file.faststart] = results.get(file.faststart, 0) + 1
+
+            if file.faststart == File.FASTSTART_MOVED:
+                # 內容改變，重新計算 hash
+                File.objects.filter(pk=file.pk).update(file_hash=file.calculate_hash(), partial_hash=None)
+            elif file.faststart == File.FASTSTART_FAILED:
+                self.stdout.write(self.style.ERROR('  ✗ 失敗'))
+
+        self.stdout.write(self.style.SUCCESS(f'\n完成!'))
+        self.stdout.write(f'  已搬移: {results[File.FASTSTART_MOVED]}')
+        self.stdout.write(f'  原本就可快速播放: {results[File.FASTSTART_ALREADY]}')
+        self.stdout.write(f'  略過: {results[File.FASTSTART_SKIPPED]}')
+        if results[File.FASTSTART_FAILED]:
+            self.stdout.write(self.style.WARNING(f'  失敗: {results[File.FASTSTART_FAILED]}'))
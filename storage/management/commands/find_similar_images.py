@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from storage import similarity
+
+
+class Command(BaseCommand):
+    help = '依感知 hash 重新計算相似圖片群組，重複檔案頁面會列出結果'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='只重新計算指定的使用者 ID（可重複指定）'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=settings.SIMILAR_IMAGE_THRESHOLD,
+            help=f'漢明距離門檻，越小越嚴格（預設 SIMILAR_IMAGE_THRESHOLD={settings.SIMILAR_IMAGE_THRESHOLD}）'
+        )
+
+    def handle(self, *args, **options):
+        users, groups = similarity.update_groups(options['threshold'], options['users'])
+        self.stdout.write(self.style.SUCCESS(f'✓ 已檢查 {users} 位使用者，找到 {groups} 組相似圖片'))
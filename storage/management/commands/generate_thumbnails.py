@@ -1,12 +1,19 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from storage import similarity
 from storage.models import File
 
 class Command(BaseCommand):
-    help = '為所有圖片生成縮圖'
+    help = '為所有圖片生成縮圖與感知 hash，並補記圖片尺寸'
 
     def handle(self, *args, **kwargs):
-        # 修改查詢：找 thumbnail 是 NULL 或空字串的
-        files = File.objects.filter(thumbnail__isnull=True) | File.objects.filter(thumbnail='')
+        # 修改查詢：找 thumbnail 是 NULL 或空字串的，以及還沒有感知 hash 或尺寸的
+        files = (
+            File.objects.filter(thumbnail__isnull=True)
+            | File.objects.filter(thumbnail='')
+            | File.objects.filter(perceptual_hash__isnull=True)
+            | File.objects.filter(width__isnull=True)
+        )
         files = files.distinct()
         total = files.count()
         
@@ -15,12 +22,23 @@ class Command(BaseCommand):
         success = 0
         skipped = 0
         failed = 0
+        # 補上感知 hash 的使用者，結束後重新計算他們的相似圖片群組
+        hashed_owners = set()
         
         for i, file in enumerate(files, 1):
             if file.is_image():
                 try:
                     self.stdout.write(f'[{i}/{total}] 處理: {file.name}')
-                    file.create_thumbnail()
+                    if file.thumbnail:
+                        # 已有縮圖，只補算感知 hash 與尺寸
+                        if not file.perceptual_hash:
+                            file.update_perceptual_hash()
+                        if file.width is None:
+                            file.update_dimensions()
+                    else:
+                        file.create_thumbnail()
+                    if file.perceptual_hash:
+                        hashed_owners.add(file.owner_id)
                     success += 1
                 except Exception as e:
                     failed += 1
@@ -28,6 +46,10 @@ class Command(BaseCommand):
             else:
                 skipped += 1
         
+        if hashed_owners:
+            users, groups = similarity.update_groups(settings.SIMILAR_IMAGE_THRESHOLD, hashed_owners)
+            self.stdout.write(f'重新計算 {users} 位使用者的相似圖片: {groups} 組')
+        
         self.stdout.write(self.style.SUCCESS(f'\n完成!'))
         self.stdout.write(f'  成功: {success}')
         self.stdout.write(f'  跳過: {skipped}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from storage import quota
+
+
+class Command(BaseCommand):
+    help = '依檔案資料重新計算每位使用者的已使用空間，並清掉逾時的上傳保留'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='只重新計算指定的使用者 ID（可重複指定）'
+        )
+
+    def handle(self, *args, **options):
+        released = quota.release_expired()
+        if released:
+            self.stdout.write(self.style.WARNING(f'清掉 {released} 筆逾時的上傳保留'))
+
+        updated = quota.recalculate(options['users'])
+        self.stdout.write(self.style.SUCCESS(f'✓ 已重新計算 {updated} 位使用者的已使用空間'))
@@ -0,0 +1,160 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from storage import db_router, reconcile
+from storage.models import File, IntegrityIssue
+
+
+class Command(BaseCommand):
+    help = '比對儲存空間與資料庫，找出孤兒檔案與遺失的檔案'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reclaim',
+            action='store_true',
+            help='刪除孤兒檔案，並清除已遺失的縮圖欄位（預設只回報）'
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='只處理修改時間超過指定小時數的孤兒檔案，避免誤刪上傳中的檔案（預設 24）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='平行走訪目錄與檢查檔案的執行緒數（預設 8）'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='每批比對的路徑數（預設 5000）'
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=20,
+            help='每一類最多列出幾個路徑（預設 20）'
+        )
+
+    def handle(self, *args, **options):
+        reclaim = options['reclaim']
+        workers = max(1, options['workers'])
+        cutoff = time.time() - options['min_age_hours'] * 3600
+        # 只回報時孤兒檔案的比對可以讀副本；要刪除檔案時以主資料庫為準
+        orphan_reads = nullcontext if reclaim else db_router.replica_reads
+
+        # ---------- 磁碟 → 資料庫：孤兒檔案 ----------
+        roots = reconcile.storage_roots()
+        orphan_count = 0
+        orphan_size = 0
+        recent = 0
+        reclaimed = 0
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for label, root, find_orphans in roots:
+                self.stdout.write(f'\n掃描 {label}: {root}')
+                others = [other for _, other, _ in roots if other != root]
+                scanned = 0
+
+                for batch in reconcile.scan_files(root, workers, options['batch_size'], exclude=others):
+                    scanned += len(batch)
+                    orphans = []
+                    with orphan_reads():
+                        found = find_orphans(batch)
+                    for path, size, mtime in found:
+                        if mtime > cutoff:
+                            recent += 1
+                            continue
+                        orphans.append(os.path.join(root, path))
+                        orphan_count += 1
+                        orphan_size += size
+                        if orphan_count <= options['show']:
+                            self.stdout.write(self.style.WARNING(f'  孤兒檔案: {path} ({self.format_size(size)})'))
+
+                    if reclaim and orphans:
+                        for error in pool.map(self.remove, orphans):
+                            if error:
+                                failed += 1
+                                self.stdout.write(self.style.ERROR(f'  ✗ {error}'))
+                            else:
+                                reclaimed += 1
+
+                self.stdout.write(f'  已掃描 {scanned} 個檔案')
+
+            # ---------- 資料庫 → 磁碟：遺失的檔案 ----------
+            self.stdout.write('\n檢查資料庫中的檔案...')
+            files = File.objects.exclude(file='').filter(purge_task__isnull=True).only(
+                'pk', 'name', 'file', 'thumbnail', 'storage_tier', 'cold_compressed'
+            ).order_by('pk')
+
+            missing_files = 0
+            missing_thumbnails = 0
+            last_pk = 0
+            while True:
+                chunk = list(files.filter(pk__gt=last_pk)[:options['batch_size']])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+
+                parts = [chunk[i::workers] for i in range(workers)]
+                missing = [item for result in pool.map(reconcile.missing_blobs, parts) for item in result]
+
+                lost_thumbnails = []
+                for file_obj, kind in missing:
+                    if kind == 'thumbnail':
+                        missing_thumbnails += 1
+                        lost_thumbnails.append(file_obj.pk)
+                        continue
+                    missing_files += 1
+                    if missing_files <= options['show']:
+                        self.stdout.write(self.style.ERROR(f'  遺失檔案: {file_obj.name} (#{file_obj.pk})'))
+                    IntegrityIssue.objects.update_or_create(
+                        file_id=file_obj.pk,
+                        defaults={'status': IntegrityIssue.STATUS_MISSING, 'message': '對帳時找不到實體檔案'},
+                    )
+
+                if reclaim and lost_thumbnails:
+                    # 清掉欄位後可用 generate_thumbnails 重新產生
+                    File.objects.filter(pk__in=lost_thumbnails).update(thumbnail='')
+
+        # 顯示結果
+        self.stdout.write(self.style.SUCCESS(f'\n✓ 對帳完成!'))
+        self.stdout.write(f'  孤兒檔案: {orphan_count} 個 ({self.format_size(orphan_size)})')
+        if recent:
+            self.stdout.write(f'  略過近期修改的檔案: {recent} 個')
+        if reclaim:
+            self.stdout.write(self.style.SUCCESS(f'  已回收: {reclaimed} 個'))
+            if failed:
+                self.stdout.write(self.style.WARNING(f'  回收失敗: {failed} 個'))
+        elif orphan_count:
+            self.stdout.write('  使用 --reclaim 刪除孤兒檔案')
+        if missing_files:
+            self.stdout.write(self.style.ERROR(f'  遺失檔案: {missing_files} 個（已記錄為完整性問題）'))
+        if missing_thumbnails:
+            message = '已清除欄位，可用 generate_thumbnails 重新產生' if reclaim else '使用 --reclaim 清除欄位'
+            self.stdout.write(self.style.WARNING(f'  遺失縮圖: {missing_thumbnails} 個（{message}）'))
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            return f'刪除 {path} 失敗: {e}'
+        return None
+
+    def format_size(self, size):
+        """格式化檔案大小"""
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024.0:
+                return f"{size:.1f} {unit}"
+            size /= 1024.0
+        return f"{size:.1f} TB"
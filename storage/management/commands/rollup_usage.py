@@ -0,0 +1,53 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from storage import usage
+
+
+class Command(BaseCommand):
+    help = '彙總每位使用者每個類別的每日用量（可每晚或每小時執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='彙總的日期 YYYY-MM-DD（預設今天；使用空間與檔案數一律是執行當下的值）'
+        )
+        parser.add_argument(
+            '--forecast-days',
+            type=int,
+            default=30,
+            help='容量預測參考最近幾天的資料（預設 30）'
+        )
+
+    def handle(self, *args, **options):
+        target = None
+        if options['date']:
+            try:
+                target = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('日期格式錯誤，請使用 YYYY-MM-DD')
+
+        count = usage.rollup(target)
+        self.stdout.write(self.style.SUCCESS(f'✓ 已寫入 {count} 筆每日用量'))
+
+        result = usage.forecast(days=options['forecast_days'])
+        self.stdout.write(f'\n目前總用量: {self.format_size(result["current"])} / {self.format_size(result["capacity"])}')
+        self.stdout.write(f'每日平均成長: {self.format_size(max(0, result["growth"]))}')
+        if result['days_left'] is not None:
+            self.stdout.write(self.style.WARNING(
+                f'預計 {result["days_left"]} 天後（{result["full_date"]}）容量用完'
+            ))
+        elif result['growth'] > 0:
+            self.stdout.write('成長緩慢，100 年內不會用完容量')
+        else:
+            self.stdout.write('用量沒有成長，無法預測容量用完的時間')
+
+    def format_size(self, size):
+        """格式化檔案大小"""
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024.0:
+                return f"{size:.1f} {unit}"
+            size /= 1024.0
+        return f"{size:.1f} TB"
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from storage.models import PurgeTask
+from storage import purge
+
+
+class Command(BaseCommand):
+    help = '執行等待中或中斷的回收站清除工作'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=10,
+            help='執行中但超過指定分鐘數沒有進度的工作視為中斷（預設 10 分鐘）'
+        )
+
+    def handle(self, *args, **options):
+        stale_before = timezone.now() - timedelta(minutes=options['stale_minutes'])
+
+        # 等待中的工作，以及行程重啟後停在執行中或失敗的工作
+        tasks = PurgeTask.objects.filter(
+            Q(status=PurgeTask.STATUS_PENDING) |
+            Q(status__in=[PurgeTask.STATUS_RUNNING, PurgeTask.STATUS_FAILED], updated_at__lt=stale_before)
+        ).order_by('pk')
+
+        task_ids = list(tasks.values_list('pk', flat=True))
+        if not task_ids:
+            self.stdout.write(self.style.SUCCESS('✓ 沒有需要執行的清除工作'))
+            return
+
+        self.stdout.write(f'找到 {len(task_ids)} 個清除工作')
+
+        for task_id in task_ids:
+            self.stdout.write(f'  執行工作 #{task_id}', ending=' ... ')
+            purge.run_task(task_id, resume=True)
+
+            task = PurgeTask.objects.get(pk=task_id)
+            if task.status == PurgeTask.STATUS_DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ 刪除 {task.deleted_files} 個檔案、{task.deleted_folders} 個資料夾'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'✗ {task.error}'))
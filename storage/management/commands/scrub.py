@@ -0,0 +1,172 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from storage import scrub
+from storage.models import File, IntegrityIssue, JobCheckpoint
+
+CHECKPOINT_NAME = 'scrub'
+
+
+class Command(BaseCommand):
+    help = '重新計算檔案 hash 檢查完整性，每次檢查一部分，輪流涵蓋所有檔案'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fraction',
+            type=float,
+            default=settings.SCRUB_FRACTION,
+            help=f'每次檢查的檔案比例（預設 {settings.SCRUB_FRACTION}，1 代表全部）'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='同時讀取的執行緒數（預設 4）'
+        )
+        parser.add_argument(
+            '--max-mb-per-second',
+            type=float,
+            default=settings.SCRUB_MAX_MB_PER_SECOND,
+            help='每秒最多讀取的 MB 數，0 代表不限制'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='每批檢查的檔案數，每批完成後記錄進度（預設 200）'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='捨棄上次中斷的進度，從頭開始'
+        )
+
+    def handle(self, *args, **options):
+        files = File.objects.exclude(file='').filter(purge_task__isnull=True)
+        total = files.count()
+        if total == 0:
+            self.stdout.write(self.style.SUCCESS('✓ 沒有需要檢查的檔案'))
+            return
+
+        checkpoint, created = JobCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+        state = checkpoint.state
+        if options['restart'] or not state:
+            state = {'last_pk': 0, 'cycle_started': timezone.now().isoformat(), 'cycles': 0}
+
+        if state.get('remaining'):
+            # 上次沒做完，先把那一輪的份量做完
+            self.stdout.write(self.style.WARNING(
+                f'從上次中斷處繼續（檔案 #{state["last_pk"]} 之後，剩 {state["remaining"]} 個）'
+            ))
+        else:
+            state['remaining'] = max(1, math.ceil(total * min(options['fraction'], 1)))
+            state['run'] = {'checked': 0, 'bytes': 0, 'hashed': 0, 'issues': 0, 'fixed': 0}
+
+        def save_state():
+            checkpoint.state = state
+            checkpoint.save(update_fields=['state', 'updated_at'])
+
+        self.stdout.write(f'共 {total} 個檔案，本次檢查 {state["remaining"]} 個')
+
+        budget = scrub.ByteBudget(options['max_mb_per_second'] * 1024 * 1024)
+
+        def check(file_obj):
+            try:
+                return file_obj, scrub.check_file(file_obj, budget)
+            finally:
+                # 重新讀取層級時執行緒會開自己的資料庫連線，用完就關閉，長時間檢查不會累積連線
+                connection.close()
+        run = state['run']
+        wrapped = False
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            while state['remaining'] > 0:
+                chunk = list(
+                    files.filter(pk__gt=state['last_pk'])
+                    .only(*scrub.SCRUB_FIELDS).order_by('pk')[:min(options['batch_size'], state['remaining'])]
+                )
+                if not chunk:
+                    if wrapped:
+                        break
+                    # 到尾端後從頭開始，完成一整輪
+                    wrapped = True
+                    state['last_pk'] = 0
+                    state['cycles'] += 1
+                    state['cycle_started'] = timezone.now().isoformat()
+                    self.stdout.write(self.style.SUCCESS('  ✓ 已檢查完一整輪，從頭開始'))
+                    continue
+
+                results = list(pool.map(check, chunk))
+                self.record(results, run)
+
+                state['last_pk'] = chunk[-1].pk
+                state['remaining'] -= len(chunk)
+                run['checked'] += len(chunk)
+                run['bytes'] += sum(f.file_size for f in chunk)
+                save_state()
+
+                self.stdout.write(f'  已檢查 {run["checked"]} 個檔案 ({self.format_size(run["bytes"])})')
+
+        state['remaining'] = 0
+        save_state()
+
+        # 顯示結果
+        self.stdout.write(self.style.SUCCESS(f'\n✓ 檢查完成!'))
+        self.stdout.write(f'  檢查檔案: {run["checked"]} 個 ({self.format_size(run["bytes"])})')
+        if run['hashed']:
+            self.stdout.write(f'  補上 hash: {run["hashed"]} 個')
+        if run['fixed']:
+            self.stdout.write(self.style.SUCCESS(f'  恢復正常: {run["fixed"]} 個'))
+        if run['issues']:
+            self.stdout.write(self.style.ERROR(f'  發現問題: {run["issues"]} 個'))
+        open_issues = IntegrityIssue.objects.count()
+        if open_issues:
+            self.stdout.write(self.style.WARNING(f'  目前未解決的問題共 {open_issues} 個，請到管理後台查看'))
+
+    def record(self, results, run):
+        """寫回檢查結果"""
+        ok_ids = []
+        missing_hash = []
+        for file_obj, (status, actual, message) in results:
+            if status is None:
+                ok_ids.append(file_obj.pk)
+                if not file_obj.file_hash:
+                    # 沒有 hash 的檔案以這次的結果作為基準
+                    file_obj.file_hash = actual
+                    missing_hash.append(file_obj)
+                continue
+
+            run['issues'] += 1
+            self.stdout.write(self.style.ERROR(
+                f'  ✗ {file_obj.name} (#{file_obj.pk}): {dict(IntegrityIssue.STATUS_CHOICES)[status]} {message}'
+            ))
+            # 檢查途中被永久刪除的檔案不記錄
+            if File.objects.filter(pk=file_obj.pk).exists():
+                IntegrityIssue.objects.update_or_create(
+                    file_id=file_obj.pk,
+                    defaults={
+                        'status': status,
+                        'expected_hash': file_obj.file_hash or '',
+                        'actual_hash': actual,
+                        'message': message,
+                    },
+                )
+
+        if missing_hash:
+            File.objects.bulk_update(missing_hash, ['file_hash'])
+            run['hashed'] += len(missing_hash)
+        fixed, _ = IntegrityIssue.objects.filter(file_id__in=ok_ids).delete()
+        run['fixed'] += fixed
+
+    def format_size(self, size):
+        """格式化檔案大小"""
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024.0:
+                return f"{size:.1f} {unit}"
+            size /= 1024.0
+        return f"{size:.1f} TB"
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import timedelta
+from storage.models import File, TierAccessStat
+from storage import db_router, tiering
+
+
+class Command(BaseCommand):
+    help = '顯示冷熱分層儲存的命中率與各層用量'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='統計最近幾天的命中率（預設 7 天）'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+
+        tiering.flush_access_buffer()
+
+        # 各層用量
+        self.stdout.write('各層用量:')
+        # 整個資料表的彙總從副本讀取；命中率在剛寫入後讀取，留在主資料庫
+        with db_router.replica_reads():
+            tiers = list(File.objects.values('storage_tier').annotate(
+                count=Count('id'),
+                logical=Sum('file_size'),
+                physical=Sum(Coalesce('stored_size', 'file_size')),
+            ).order_by('storage_tier'))
+
+        labels = dict(File.TIER_CHOICES)
+        for tier in tiers:
+            self.stdout.write(
+                f'  {labels.get(tier["storage_tier"], tier["storage_tier"])}: '
+                f'{tier["count"]} 個檔案, '
+                f'{self.format_size(tier["logical"] or 0)} '
+                f'(實際佔用 {self.format_size(tier["physical"] or 0)})'
+            )
+
+        # 命中率
+        since = timezone.localdate() - timedelta(days=days - 1)
+        totals = TierAccessStat.objects.filter(date__gte=since).aggregate(
+            hot_hits=Sum('hot_hits'),
+            cold_hits=Sum('cold_hits'),
+            bytes_promoted=Sum('bytes_promoted'),
+            bytes_demoted=Sum('bytes_demoted'),
+        )
+        hot_hits = totals['hot_hits'] or 0
+        cold_hits = totals['cold_hits'] or 0
+        total_hits = hot_hits + cold_hits
+
+        self.stdout.write(f'\n最近 {days} 天:')
+        if total_hits:
+            self.stdout.write(f'  熱儲存命中率: {hot_hits / total_hits * 100:.1f}% ({hot_hits}/{total_hits})')
+        else:
+            self.stdout.write('  沒有存取紀錄')
+        self.stdout.write(f'  冷儲存命中: {cold_hits}')
+        self.stdout.write(f'  回升: {self.format_size(totals["bytes_promoted"] or 0)}')
+        self.stdout.write(f'  降級: {self.format_size(totals["bytes_demoted"] or 0)}')
+
+    def format_size(self, size):
+        """格式化檔案大小"""
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if size < 1024.0:
+                return f"{size:.1f} {unit}"
+            size /= 1024.0
+        return f"{size:.1f} TB"
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0008_file_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TierAccessStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='日期')),
+                ('hot_hits', models.BigIntegerField(default=0, verbose_name='熱儲存命中')),
+                ('cold_hits', models.BigIntegerField(default=0, verbose_name='冷儲存命中')),
+                ('bytes_promoted', models.BigIntegerField(default=0, verbose_name='回升位元組')),
+                ('bytes_demoted', models.BigIntegerField(default=0, verbose_name='降級位元組')),
+            ],
+            options={
+                'verbose_name': '分層存取統計',
+                'verbose_name_plural': '分層存取統計',
+            },
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='cold_compressed',
+            field=models.BooleanField(default=False, verbose_name='冷儲存已壓縮'),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='最後存取時間'),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='storage_tier',
+            field=models.CharField(choices=[('hot', '熱儲存'), ('cold', '冷儲存')], db_index=True, default='hot', max_length=10, verbose_name='儲存層級'),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='stored_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='實體佔用大小'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0009_storage_tiering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='compression',
+            field=models.CharField(blank=True, max_length=10, verbose_name='壓縮格式'),
+        ),
+    ]
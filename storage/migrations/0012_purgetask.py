@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0011_jobcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', '等待中'), ('running', '執行中'), ('done', '已完成'), ('failed', '失敗')], db_index=True, default='pending', max_length=10, verbose_name='狀態')),
+                ('total_files', models.IntegerField(default=0, verbose_name='檔案總數')),
+                ('deleted_files', models.IntegerField(default=0, verbose_name='已刪除檔案')),
+                ('failed_files', models.IntegerField(default=0, verbose_name='刪除失敗檔案')),
+                ('total_folders', models.IntegerField(default=0, verbose_name='資料夾總數')),
+                ('deleted_folders', models.IntegerField(default=0, verbose_name='已刪除資料夾')),
+                ('error', models.TextField(blank=True, verbose_name='錯誤訊息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='擁有者')),
+            ],
+            options={
+                'verbose_name': '清除工作',
+                'verbose_name_plural': '清除工作',
+            },
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='purge_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='files', to='storage.purgetask', verbose_name='清除工作'),
+        ),
+        migrations.AddField(
+            model_name='folder',
+            name='purge_task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='folders', to='storage.purgetask', verbose_name='清除工作'),
+        ),
+    ]
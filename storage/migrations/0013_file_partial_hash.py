@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0012_purgetask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='partial_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='部分 Hash'),
+        ),
+    ]
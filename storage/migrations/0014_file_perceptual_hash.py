@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0013_file_partial_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='perceptual_hash',
+            field=models.CharField(blank=True, max_length=16, null=True, verbose_name='感知 Hash'),
+        ),
+    ]
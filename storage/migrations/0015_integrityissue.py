@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0014_file_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IntegrityIssue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('mismatch', 'Hash 不符'), ('missing', '檔案遺失'), ('error', '讀取錯誤')], db_index=True, max_length=10, verbose_name='狀態')),
+                ('expected_hash', models.CharField(blank=True, max_length=64, verbose_name='預期 Hash')),
+                ('actual_hash', models.CharField(blank=True, max_length=64, verbose_name='實際 Hash')),
+                ('message', models.TextField(blank=True, verbose_name='訊息')),
+                ('detected_at', models.DateTimeField(auto_now_add=True, verbose_name='發現時間')),
+                ('checked_at', models.DateTimeField(auto_now=True, verbose_name='最後檢查時間')),
+                ('file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='integrity_issue', to='storage.file', verbose_name='檔案')),
+            ],
+            options={
+                'verbose_name': '完整性問題',
+                'verbose_name_plural': '完整性問題',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0015_integrityissue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='file',
+            name='file',
+            field=models.FileField(db_index=True, upload_to='', verbose_name='檔案'),
+        ),
+    ]
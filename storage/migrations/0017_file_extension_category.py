@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:02
+
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# 與 File.is_image() 等方法相同的分類（遷移中不能呼叫模型方法）
+CATEGORY_EXTENSIONS = [
+    ('image', ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg']),
+    ('video', ['.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.mkv', '.m4v']),
+    ('audio', ['.mp3', '.wav', '.flac', '.aac', '.ogg', '.wma', '.m4a']),
+    ('document', ['.pdf', '.doc', '.docx', '.txt', '.rtf']),
+]
+
+
+def backfill_extension_category(apps, schema_editor):
+    File = apps.get_model('storage', 'File')
+    categories = {ext: category for category, extensions in CATEGORY_EXTENSIONS for ext in extensions}
+
+    last_pk = 0
+    while True:
+        chunk = list(File.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'file')[:2000])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        for file_obj in chunk:
+            ext = os.path.splitext(file_obj.file.name or '')[1].lower()
+            file_obj.extension = ext[:20]
+            file_obj.category = categories.get(ext, 'other')
+        File.objects.bulk_update(chunk, ['extension', 'category'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0016_file_path_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='category',
+            field=models.CharField(choices=[('image', '圖片'), ('video', '影片'), ('audio', '音樂'), ('document', '文件'), ('other', '其他')], db_index=True, default='other', max_length=10, verbose_name='類別'),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='extension',
+            field=models.CharField(blank=True, db_index=True, max_length=20, verbose_name='副檔名'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'category'], name='file_owner_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'extension'], name='file_owner_extension_idx'),
+        ),
+        migrations.RunPython(backfill_extension_category, migrations.RunPython.noop),
+    ]
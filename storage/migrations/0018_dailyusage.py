@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0017_file_extension_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('category', models.CharField(choices=[('image', '圖片'), ('video', '影片'), ('audio', '音樂'), ('document', '文件'), ('other', '其他')], max_length=10, verbose_name='類別')),
+                ('total_bytes', models.BigIntegerField(default=0, verbose_name='使用空間')),
+                ('file_count', models.IntegerField(default=0, verbose_name='檔案數')),
+                ('uploads', models.IntegerField(default=0, verbose_name='上傳數')),
+                ('upload_bytes', models.BigIntegerField(default=0, verbose_name='上傳量')),
+                ('deletes', models.IntegerField(default=0, verbose_name='刪除數')),
+                ('delete_bytes', models.BigIntegerField(default=0, verbose_name='刪除量')),
+                ('share_downloads', models.IntegerField(default=0, verbose_name='分享下載數')),
+                ('share_downloads_total', models.BigIntegerField(default=0, verbose_name='累計分享下載數')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL, verbose_name='使用者')),
+            ],
+            options={
+                'verbose_name': '每日用量',
+                'verbose_name_plural': '每日用量',
+                'indexes': [models.Index(fields=['user', 'date'], name='daily_usage_user_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'user', 'category'), name='unique_daily_usage')],
+            },
+        ),
+    ]
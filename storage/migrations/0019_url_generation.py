@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0018_dailyusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='url_generation',
+            field=models.PositiveIntegerField(default=0, verbose_name='簽章網址世代'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='url_generation',
+            field=models.PositiveIntegerField(default=0, verbose_name='簽章網址世代'),
+        ),
+    ]
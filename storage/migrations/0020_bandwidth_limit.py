@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0019_url_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedlink',
+            name='bandwidth_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='留空使用預設值，0 為不限制', null=True, verbose_name='下載速度上限 (KB/s)'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='bandwidth_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='留空使用預設值，0 為不限制', null=True, verbose_name='下載速度上限 (KB/s)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0020_bandwidth_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='faststart',
+            field=models.CharField(blank=True, choices=[('moved', '已搬移 moov'), ('already', '原本就可快速播放'), ('skipped', '略過'), ('failed', '處理失敗')], max_length=10, verbose_name='快速播放'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0021_file_faststart'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', 'created_at'], name='file_owner_folder_created_idx'),
+        ),
+    ]
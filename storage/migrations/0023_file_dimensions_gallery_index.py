@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0022_file_folder_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='高度'),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='寬度'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['owner', 'folder', 'category', 'name'], name='file_gallery_idx'),
+        ),
+    ]
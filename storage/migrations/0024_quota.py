@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_used_bytes(apps, schema_editor):
+    File = apps.get_model('storage', 'File')
+    UserProfile = apps.get_model('storage', 'UserProfile')
+    for row in File.objects.values('owner_id').annotate(size=Sum('file_size')):
+        UserProfile.objects.filter(user_id=row['owner_id']).update(used_bytes=row['size'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0023_file_dimensions_gallery_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='quota_bytes',
+            field=models.BigIntegerField(blank=True, help_text='留空使用預設值，0 為不限制', null=True, verbose_name='儲存空間上限 (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reserved_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='上傳中保留空間'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='used_bytes',
+            field=models.BigIntegerField(default=0, verbose_name='已使用空間'),
+        ),
+        migrations.CreateModel(
+            name='QuotaReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.BigIntegerField(verbose_name='保留空間')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quota_reservations', to=settings.AUTH_USER_MODEL, verbose_name='使用者')),
+            ],
+            options={
+                'verbose_name': '配額保留',
+                'verbose_name_plural': '配額保留',
+            },
+        ),
+        migrations.RunPython(backfill_used_bytes, migrations.RunPython.noop),
+    ]
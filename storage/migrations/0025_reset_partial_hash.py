@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def reset_partial_hash(apps, schema_editor):
+    # 之前的部分 hash 可能以不同的 --sample-size 計算，彼此無法比較，清掉後重新計算
+    File = apps.get_model('storage', 'File')
+    File.objects.exclude(partial_hash=None).update(partial_hash=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0024_quota'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_partial_hash, migrations.RunPython.noop),
+    ]
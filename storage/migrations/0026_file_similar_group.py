@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storage', '0025_reset_partial_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='similar_group',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True, verbose_name='相似圖片群組'),
+        ),
+    ]
@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 import os
 import uuid
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 from django.utils import timezone
@@ -22,6 +22,7 @@ class Folder(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
     is_deleted = models.BooleanField(default=False, verbose_name='是否刪除')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='刪除時間')
+    purge_task = models.ForeignKey('PurgeTask', null=True, blank=True, on_delete=models.SET_NULL, related_name='folders', verbose_name='清除工作')
     
     class Meta:
         verbose_name = '資料夾'
@@ -44,8 +45,41 @@ class Folder(models.Model):
 
 
 class File(models.Model):
+    TIER_HOT = 'hot'
+    TIER_COLD = 'cold'
+    TIER_CHOICES = [
+        (TIER_HOT, '熱儲存'),
+        (TIER_COLD, '冷儲存'),
+    ]
+
+    CATEGORY_IMAGE = 'image'
+    CATEGORY_VIDEO = 'video'
+    CATEGORY_AUDIO = 'audio'
+    CATEGORY_DOCUMENT = 'document'
+    CATEGORY_OTHER = 'other'
+    CATEGORY_CHOICES = [
+        (CATEGORY_IMAGE, '圖片'),
+        (CATEGORY_VIDEO, '影片'),
+        (CATEGORY_AUDIO, '音樂'),
+        (CATEGORY_DOCUMENT, '文件'),
+        (CATEGORY_OTHER, '其他'),
+    ]
+
+    FASTSTART_MOVED = 'moved'
+    FASTSTART_ALREADY = 'already'
+    FASTSTART_SKIPPED = 'skipped'
+    FASTSTART_FAILED = 'failed'
+    FASTSTART_CHOICES = [
+        (FASTSTART_MOVED, '已搬移 moov'),
+        (FASTSTART_ALREADY, '原本就可快速播放'),
+        (FASTSTART_SKIPPED, '略過'),
+        (FASTSTART_FAILED, '處理失敗'),
+    ]
+    # 可以調整 moov 位置的影片格式
+    FASTSTART_EXTENSIONS = ['.mp4', '.m4v', '.mov']
+
     name = models.CharField(max_length=255, verbose_name='檔案名稱')
-    file = models.FileField(upload_to='', verbose_name='檔案')
+    file = models.FileField(upload_to='', db_index=True, verbose_name='檔案')
     folder = models.ForeignKey(Folder, null=True, blank=True, on_delete=models.CASCADE, verbose_name='所在資料夾')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='擁有者')
     file_type = models.CharField(max_length=100, blank=True, verbose_name='檔案類型')
@@ -59,11 +93,32 @@ class File(models.Model):
     is_deleted = models.BooleanField(default=False, verbose_name='是否刪除')
     deleted_at = models.DateTimeField(null=True, blank=True, verbose_name='刪除時間')
     file_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, verbose_name='檔案 Hash')
+    partial_hash = models.CharField(max_length=64, blank=True, null=True, verbose_name='部分 Hash')
+    perceptual_hash = models.CharField(max_length=16, blank=True, null=True, verbose_name='感知 Hash')
+    similar_group = models.BigIntegerField(null=True, blank=True, db_index=True, verbose_name='相似圖片群組')
     tags = models.CharField(max_length=500, blank=True, verbose_name='標籤')
+    extension = models.CharField(max_length=20, blank=True, db_index=True, verbose_name='副檔名')
+    category = models.CharField(max_length=10, choices=CATEGORY_CHOICES, default=CATEGORY_OTHER, db_index=True, verbose_name='類別')
+    url_generation = models.PositiveIntegerField(default=0, verbose_name='簽章網址世代')
+    storage_tier = models.CharField(max_length=10, choices=TIER_CHOICES, default=TIER_HOT, db_index=True, verbose_name='儲存層級')
+    last_accessed_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name='最後存取時間')
+    stored_size = models.BigIntegerField(null=True, blank=True, verbose_name='實體佔用大小')
+    cold_compressed = models.BooleanField(default=False, verbose_name='冷儲存已壓縮')
+    compression = models.CharField(max_length=10, blank=True, verbose_name='壓縮格式')
+    faststart = models.CharField(max_length=10, choices=FASTSTART_CHOICES, blank=True, verbose_name='快速播放')
+    width = models.PositiveIntegerField(null=True, blank=True, verbose_name='寬度')
+    height = models.PositiveIntegerField(null=True, blank=True, verbose_name='高度')
+    purge_task = models.ForeignKey('PurgeTask', null=True, blank=True, on_delete=models.SET_NULL, related_name='files', verbose_name='清除工作')
     
     class Meta:
         verbose_name = '檔案'
         verbose_name_plural = '檔案'
+        indexes = [
+            models.Index(fields=['owner', 'category'], name='file_owner_category_idx'),
+            models.Index(fields=['owner', 'extension'], name='file_owner_extension_idx'),
+            models.Index(fields=['owner', 'folder', 'created_at'], name='file_owner_folder_created_idx'),
+            models.Index(fields=['owner', 'folder', 'category', 'name'], name='file_gallery_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -92,6 +147,23 @@ class File(models.Model):
 
     def is_media(self):
         return self.is_image() or self.is_video() or self.is_audio()
+
+    def get_category(self):
+        if self.is_image():
+            return self.CATEGORY_IMAGE
+        if self.is_video():
+            return self.CATEGORY_VIDEO
+        if self.is_audio():
+            return self.CATEGORY_AUDIO
+        if self.is_document():
+            return self.CATEGORY_DOCUMENT
+        return self.CATEGORY_OTHER
+
+    def is_compressible(self):
+        # docx/xlsx/pptx 本身已是 zip 壓縮，不列入
+        compressible_extensions = ['.txt', '.csv', '.tsv', '.log', '.json', '.xml', '.svg',
+                                   '.md', '.html', '.htm', '.css', '.js', '.yaml', '.yml']
+        return self.get_file_extension() in compressible_extensions
     
     def get_size_display(self):
         size = self.file_size
@@ -113,8 +185,19 @@ class File(models.Model):
             return max(0, remaining)
         return 30
     
+    def is_cold(self):
+        return self.storage_tier == self.TIER_COLD
+
+    def get_cold_path(self):
+        # 冷儲存沿用相同的相對路徑，壓縮時加上 .gz
+        path = os.path.join(settings.COLD_STORAGE_ROOT, self.file.name)
+        if self.cold_compressed:
+            path += '.gz'
+        return path
+    
     def calculate_hash(self):
         import hashlib
+        from .compression import open_file
         
         if not self.file or not os.path.exists(self.file.path):
             return None
@@ -122,7 +205,7 @@ class File(models.Model):
         sha256_hash = hashlib.sha256()
         
         try:
-            with open(self.file.path, "rb") as f:
+            with open_file(self) as f:
                 for byte_block in iter(lambda: f.read(4096), b""):
                     sha256_hash.update(byte_block)
             return sha256_hash.hexdigest()
@@ -130,10 +213,36 @@ class File(models.Model):
             print(f"計算 hash 失敗 {self.name}: {e}")
             return None
     
+    def calculate_partial_hash(self, sample_size=65536):
+        """只讀取開頭與結尾各 sample_size 的 hash，用於快速篩選重複候選"""
+        import hashlib
+        from .compression import open_file
+
+        if not self.file or not os.path.exists(self.file.path):
+            return None
+
+        sha256_hash = hashlib.sha256()
+
+        try:
+            with open_file(self) as f:
+                sha256_hash.update(f.read(sample_size))
+                if self.file_size > sample_size:
+                    f.seek(max(sample_size, self.file_size - sample_size))
+                    sha256_hash.update(f.read(sample_size))
+            return sha256_hash.hexdigest()
+        except Exception as e:
+            print(f"計算部分 hash 失敗 {self.name}: {e}")
+            return None
+    
     def save(self, *args, **kwargs):
 
         is_new = not self.pk
+        # 副檔名與類別存成欄位，統計時直接在資料庫分組
         if self.file:
+            self.extension = self.get_file_extension()[:20]
+            self.category = self.get_category()
+        # 冷儲存或壓縮過的檔案實體大小不等於原始大小，沿用既有的 file_size
+        if self.file and not self.is_cold() and not self.compression:
             self.file_size = self.file.size
             if not self.name:
                 self.name = self.file.name
@@ -143,9 +252,56 @@ class File(models.Model):
         if is_new and self.is_image():
             self.create_thumbnail()
 
+        # MP4 把 moov 移到檔案開頭，邊下載邊播放
+        if is_new and self.get_file_extension() in self.FASTSTART_EXTENSIONS:
+            self.apply_faststart()
+
+        if is_new and settings.COMPRESS_AT_REST and self.is_compressible():
+            self.compress_at_rest()
+
+    def apply_faststart(self):
+        from .faststart import faststart
+
+        if self.is_cold() or self.compression or not self.file:
+            return
+
+        try:
+            self.faststart = faststart(self.file.path)
+        except Exception as e:
+            print(f"✗ 快速播放處理失敗 {self.name}: {e}")
+            self.faststart = self.FASTSTART_FAILED
+        # 改用 co64 時檔案會變大一點
+        old_size = self.file_size
+        if self.faststart == self.FASTSTART_MOVED:
+            self.file_size = os.path.getsize(self.file.path)
+        File.objects.filter(pk=self.pk).update(faststart=self.faststart, file_size=self.file_size)
+        if self.file_size != old_size:
+            # 配額以 used_bytes 為準，大小的差額一併計入
+            UserProfile.objects.filter(user_id=self.owner_id).update(
+                used_bytes=models.F('used_bytes') + (self.file_size - old_size)
+            )
+
+    def compress_at_rest(self):
+        from .compression import compress_path, get_codec
+
+        if self.compression or self.is_cold() or not self.file:
+            return
+
+        try:
+            codec = get_codec()
+            stored_size = compress_path(self.file.path, codec)
+            if stored_size is None:
+                return
+            self.compression = codec
+            self.stored_size = stored_size
+            File.objects.filter(pk=self.pk).update(compression=codec, stored_size=stored_size)
+        except Exception as e:
+            print(f"✗ 壓縮失敗 {self.name}: {e}")
+
     def create_thumbnail(self):
         from PIL import Image
         from django.core.files.base import ContentFile
+        from .similarity import dhash
         import io
         
         if not self.is_image():
@@ -163,6 +319,7 @@ class File(models.Model):
                 return
             
             img = Image.open(image_path)
+            self.width, self.height = img.size
             
             # 转换 RGBA 为 RGB
             if img.mode in ('RGBA', 'LA', 'P'):
@@ -175,6 +332,9 @@ class File(models.Model):
             
             # 生成缩图
             img.thumbnail((300, 300), Image.Resampling.LANCZOS)
+
+            # 用缩图计算感知 hash，找相似图片用
+            self.perceptual_hash = dhash(img)
             
             # 储存到记忆体
             thumb_io = io.BytesIO()
@@ -190,7 +350,9 @@ class File(models.Model):
                 save=False
             )
             
-            File.objects.filter(pk=self.pk).update(thumbnail=self.thumbnail)
+            File.objects.filter(pk=self.pk).update(
+                thumbnail=self.thumbnail, perceptual_hash=self.perceptual_hash, width=self.width, height=self.height
+            )
             print(f"✓ 縮圖已生成: {thumb_filename}")
             
         except Exception as e:
@@ -198,6 +360,40 @@ class File(models.Model):
             import traceback
             traceback.print_exc()
     
+    def update_perceptual_hash(self):
+        """已有縮圖的圖片補算感知 hash，直接讀縮圖即可"""
+        from PIL import Image
+        from .similarity import dhash
+
+        source = self.thumbnail if self.thumbnail else self.file
+        if not source or not os.path.exists(source.path):
+            return None
+
+        try:
+            with Image.open(source.path) as img:
+                self.perceptual_hash = dhash(img)
+            File.objects.filter(pk=self.pk).update(perceptual_hash=self.perceptual_hash)
+            return self.perceptual_hash
+        except Exception as e:
+            print(f"✗ 計算感知 hash 失敗 {self.name}: {e}")
+            return None
+
+    def update_dimensions(self):
+        """補記原圖的寬高，只讀取圖片標頭"""
+        from PIL import Image
+
+        if not self.file or not os.path.exists(self.file.path):
+            return None
+
+        try:
+            with Image.open(self.file.path) as img:
+                self.width, self.height = img.size
+            File.objects.filter(pk=self.pk).update(width=self.width, height=self.height)
+            return self.width, self.height
+        except Exception as e:
+            print(f"✗ 讀取圖片尺寸失敗 {self.name}: {e}")
+            return None
+
     def get_thumbnail_url(self):
         if self.thumbnail:
             return self.thumbnail.url
@@ -205,6 +401,139 @@ class File(models.Model):
             return self.file.url
         return None
 
+    def get_preview_url(self):
+        # 開啟 SIGNED_URLS 時改用簽章網址，讀取時不需要 session 與資料庫
+        if settings.SIGNED_URLS and self.file:
+            from .signed_urls import sign
+            return sign(self, 'preview')
+        if self.is_image():
+            # 圖片使用螢幕尺寸的預覽圖，不送出原圖
+            return reverse('storage:file_view', args=[self.pk])
+        return reverse('storage:file_preview', args=[self.pk])
+
+
+class TierAccessStat(models.Model):
+    date = models.DateField(unique=True, verbose_name='日期')
+    hot_hits = models.BigIntegerField(default=0, verbose_name='熱儲存命中')
+    cold_hits = models.BigIntegerField(default=0, verbose_name='冷儲存命中')
+    bytes_promoted = models.BigIntegerField(default=0, verbose_name='回升位元組')
+    bytes_demoted = models.BigIntegerField(default=0, verbose_name='降級位元組')
+    
+    class Meta:
+        verbose_name = '分層存取統計'
+        verbose_name_plural = '分層存取統計'
+    
+    def __str__(self):
+        return f"{self.date} 熱 {self.hot_hits} / 冷 {self.cold_hits}"
+
+
+class DailyUsage(models.Model):
+    date = models.DateField(verbose_name='日期')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_usage', verbose_name='使用者')
+    category = models.CharField(max_length=10, choices=File.CATEGORY_CHOICES, verbose_name='類別')
+    total_bytes = models.BigIntegerField(default=0, verbose_name='使用空間')
+    file_count = models.IntegerField(default=0, verbose_name='檔案數')
+    uploads = models.IntegerField(default=0, verbose_name='上傳數')
+    upload_bytes = models.BigIntegerField(default=0, verbose_name='上傳量')
+    deletes = models.IntegerField(default=0, verbose_name='刪除數')
+    delete_bytes = models.BigIntegerField(default=0, verbose_name='刪除量')
+    share_downloads = models.IntegerField(default=0, verbose_name='分享下載數')
+    share_downloads_total = models.BigIntegerField(default=0, verbose_name='累計分享下載數')
+    
+    class Meta:
+        verbose_name = '每日用量'
+        verbose_name_plural = '每日用量'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user', 'category'], name='unique_daily_usage'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date'], name='daily_usage_user_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.user.username} {self.get_category_display()}"
+
+
+class PurgeTask(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待中'),
+        (STATUS_RUNNING, '執行中'),
+        (STATUS_DONE, '已完成'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='擁有者')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True, verbose_name='狀態')
+    total_files = models.IntegerField(default=0, verbose_name='檔案總數')
+    deleted_files = models.IntegerField(default=0, verbose_name='已刪除檔案')
+    failed_files = models.IntegerField(default=0, verbose_name='刪除失敗檔案')
+    total_folders = models.IntegerField(default=0, verbose_name='資料夾總數')
+    deleted_folders = models.IntegerField(default=0, verbose_name='已刪除資料夾')
+    error = models.TextField(blank=True, verbose_name='錯誤訊息')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='完成時間')
+    
+    class Meta:
+        verbose_name = '清除工作'
+        verbose_name_plural = '清除工作'
+    
+    def __str__(self):
+        return f"{self.owner.username} 的清除工作 #{self.pk}"
+    
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+    
+    def get_progress(self):
+        total = self.total_files + self.total_folders
+        if total == 0:
+            return 100
+        handled = self.deleted_files + self.failed_files + self.deleted_folders
+        return min(100, int(handled * 100 / total))
+
+
+class JobCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='工作名稱')
+    state = models.JSONField(default=dict, verbose_name='進度')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
+    
+    class Meta:
+        verbose_name = '工作進度'
+        verbose_name_plural = '工作進度'
+    
+    def __str__(self):
+        return self.name
+
+
+class IntegrityIssue(models.Model):
+    STATUS_MISMATCH = 'mismatch'
+    STATUS_MISSING = 'missing'
+    STATUS_ERROR = 'error'
+    STATUS_CHOICES = [
+        (STATUS_MISMATCH, 'Hash 不符'),
+        (STATUS_MISSING, '檔案遺失'),
+        (STATUS_ERROR, '讀取錯誤'),
+    ]
+
+    file = models.OneToOneField(File, on_delete=models.CASCADE, related_name='integrity_issue', verbose_name='檔案')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, db_index=True, verbose_name='狀態')
+    expected_hash = models.CharField(max_length=64, blank=True, verbose_name='預期 Hash')
+    actual_hash = models.CharField(max_length=64, blank=True, verbose_name='實際 Hash')
+    message = models.TextField(blank=True, verbose_name='訊息')
+    detected_at = models.DateTimeField(auto_now_add=True, verbose_name='發現時間')
+    checked_at = models.DateTimeField(auto_now=True, verbose_name='最後檢查時間')
+    
+    class Meta:
+        verbose_name = '完整性問題'
+        verbose_name_plural = '完整性問題'
+    
+    def __str__(self):
+        return f"{self.file.name} - {self.get_status_display()}"
+
 
 class SharedLink(models.Model):
     file = models.ForeignKey(File, on_delete=models.CASCADE, verbose_name='檔案')
@@ -215,6 +544,7 @@ class SharedLink(models.Model):
     download_count = models.IntegerField(default=0, verbose_name='下載次數')
     max_downloads = models.IntegerField(null=True, blank=True, verbose_name='最大下載次數')
     is_active = models.BooleanField(default=True, verbose_name='是否啟用')
+    bandwidth_limit = models.PositiveIntegerField(null=True, blank=True, verbose_name='下載速度上限 (KB/s)', help_text='留空使用預設值，0 為不限制')
     
     class Meta:
         verbose_name = '分享連結'
@@ -223,6 +553,10 @@ class SharedLink(models.Model):
     def __str__(self):
         return f"{self.file.name} - {self.token}"
     
+    @staticmethod
+    def cache_key(token):
+        return f'share:{token}'
+    
     def is_expired(self):
         if self.expires_at:
             return timezone.now() > self.expires_at
@@ -242,6 +576,11 @@ class UserProfile(models.Model):
     bio = models.TextField(blank=True, max_length=500, verbose_name='個人簡介')
     phone = models.CharField(max_length=20, blank=True, verbose_name='電話')
     location = models.CharField(max_length=100, blank=True, verbose_name='地點')
+    bandwidth_limit = models.PositiveIntegerField(null=True, blank=True, verbose_name='下載速度上限 (KB/s)', help_text='留空使用預設值，0 為不限制')
+    url_generation = models.PositiveIntegerField(default=0, verbose_name='簽章網址世代')
+    quota_bytes = models.BigIntegerField(null=True, blank=True, verbose_name='儲存空間上限 (bytes)', help_text='留空使用預設值，0 為不限制')
+    used_bytes = models.BigIntegerField(default=0, verbose_name='已使用空間')
+    reserved_bytes = models.BigIntegerField(default=0, verbose_name='上傳中保留空間')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
     
@@ -249,6 +588,17 @@ class UserProfile(models.Model):
         verbose_name = '用戶資料'
         verbose_name_plural = '用戶資料'
     
+    # 由 quota 以 F() 原子更新的計數，一般儲存不寫回，以免蓋掉同時進行的更新
+    COUNTER_FIELDS = ('used_bytes', 'reserved_bytes')
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.user.username} 的資料"
     
@@ -258,7 +608,52 @@ class UserProfile(models.Model):
         return None
 
 
+class QuotaReservation(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quota_reservations', verbose_name='使用者')
+    size = models.BigIntegerField(verbose_name='保留空間')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+
+    class Meta:
+        verbose_name = '配額保留'
+        verbose_name_plural = '配額保留'
+
+    def __str__(self):
+        return f"{self.user.username} 保留 {self.size} bytes"
+
+
 # 信號處理
+@receiver(post_delete, sender=File)
+def release_quota(sender, instance, **kwargs):
+    # 永久刪除後把空間還給使用者
+    UserProfile.objects.filter(user_id=instance.owner_id).update(
+        used_bytes=models.F('used_bytes') - (instance.file_size or 0)
+    )
+
+
+@receiver(post_delete, sender=File)
+def delete_cold_copy(sender, instance, **kwargs):
+    # 永久刪除時一併清掉冷儲存中的實體檔案
+    if instance.is_cold() and instance.file:
+        cold_path = instance.get_cold_path()
+        if os.path.exists(cold_path):
+            os.remove(cold_path)
+
+
+@receiver(post_delete, sender=File)
+def delete_previews(sender, instance, **kwargs):
+    # 永久刪除時一併清掉螢幕尺寸的預覽圖
+    from .derivatives import remove_previews
+    remove_previews(instance.pk)
+
+
+@receiver(post_save, sender=SharedLink)
+@receiver(post_delete, sender=SharedLink)
+def invalidate_share_cache(sender, instance, **kwargs):
+    # 分享連結變更後清掉快取，下次下載重新讀取
+    from django.core.cache import cache
+    cache.delete(SharedLink.cache_key(instance.token))
+
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs): 
     if created:
@@ -266,5 +661,7 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs): 
-        instance.profile.save()
\ No newline at end of file
+def save_user_profile(sender, instance, update_fields=None, **kwargs): 
+        # 登入等只更新部分欄位的儲存與用戶資料無關，不連帶寫回
+        if update_fields is None:
+            instance.profile.save()
\ No newline at end of file
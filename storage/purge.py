@@ -0,0 +1,173 @@
+"""回收站大量清除
+
+刪除實體檔案以執行緒池平行進行，資料列則以 ID 分批直接下 DELETE，
+不經過 Django 逐筆 collect／signal 的流程，因此相關的清理（分享連結、
+完整性檢查紀錄、冷儲存副本、縮圖、預覽圖、已使用空間、子資料夾的參照）都在這裡自行處理。
+
+網頁上的清空回收站與批次永久刪除會建立 PurgeTask：請求中只把項目標記
+給工作（回收站立即不再顯示），實際刪除在背景執行緒中分批進行，
+進度寫回 PurgeTask 供頁面輪詢。行程重啟而中斷的工作由 run_purge_tasks 接手。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .derivatives import remove_previews
+from .models import File, Folder, IntegrityIssue, PurgeTask, SharedLink, UserProfile
+
+
+# 清除時需要的欄位
+PURGE_FIELDS = ['pk', 'name', 'file', 'thumbnail', 'file_size', 'storage_tier', 'cold_compressed']
+
+
+def blob_paths(file_obj):
+    """檔案在磁碟上可能佔用的所有路徑"""
+    paths = []
+    if file_obj.file:
+        paths.append(file_obj.file.path)
+        if file_obj.is_cold():
+            paths.append(file_obj.get_cold_path())
+    if file_obj.thumbnail:
+        paths.append(file_obj.thumbnail.path)
+    return paths
+
+
+def unlink_blobs(file_obj):
+    """刪除實體檔案，已經不存在的路徑視為成功"""
+    for path in blob_paths(file_obj):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    remove_previews(file_obj.pk)
+
+
+def unlink_many(files, workers=8):
+    """平行刪除多個檔案的實體檔案，回傳 (成功的檔案, [(檔案, 錯誤)])"""
+    def task(file_obj):
+        try:
+            unlink_blobs(file_obj)
+            return file_obj, None
+        except OSError as e:
+            return file_obj, e
+
+    done = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for file_obj, error in pool.map(task, files):
+            if error is None:
+                done.append(file_obj)
+            else:
+                errors.append((file_obj, error))
+    return done, errors
+
+
+def _raw_delete(model, column, ids):
+    if not ids:
+        return 0
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(column)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', list(ids))
+        return cursor.rowcount
+
+
+def delete_file_rows(ids):
+    """刪除檔案資料列（含分享連結與完整性檢查紀錄），回傳刪除筆數"""
+    with transaction.atomic():
+        # 不會觸發 post_delete，已使用空間在這裡扣回
+        for row in File.objects.filter(pk__in=ids).values('owner_id').annotate(size=Sum('file_size')):
+            UserProfile.objects.filter(user_id=row['owner_id']).update(used_bytes=F('used_bytes') - (row['size'] or 0))
+        _raw_delete(SharedLink, SharedLink._meta.get_field('file').column, ids)
+        _raw_delete(IntegrityIssue, IntegrityIssue._meta.get_field('file').column, ids)
+        return _raw_delete(File, File._meta.pk.column, ids)
+
+
+def delete_folder_rows(ids):
+    """刪除資料夾資料列，回傳刪除筆數
+
+    仍留在這些資料夾裡的檔案與子資料夾（尚未過期或已還原）移到根目錄，
+    不會被連帶刪除。
+    """
+    with transaction.atomic():
+        File.objects.filter(folder_id__in=ids).update(folder=None)
+        Folder.objects.filter(parent_id__in=ids).update(parent=None)
+        return _raw_delete(Folder, Folder._meta.pk.column, ids)
+
+
+def create_task(owner, files, folders=None):
+    """建立清除工作並把項目標記給它，回傳 PurgeTask"""
+    with transaction.atomic():
+        task = PurgeTask.objects.create(owner=owner)
+        task.total_files = files.filter(purge_task__isnull=True).update(purge_task=task)
+        if folders is not None:
+            task.total_folders = folders.filter(purge_task__isnull=True).update(purge_task=task)
+        task.save(update_fields=['total_files', 'total_folders'])
+    return task
+
+
+def start_task(task):
+    """交易提交後在背景執行緒執行清除工作"""
+    def start():
+        threading.Thread(target=run_task, args=(task.pk,), daemon=True).start()
+    transaction.on_commit(start)
+
+
+def run_task(task_pk, resume=False):
+    """分批執行清除工作，resume=True 時可接手中斷的工作"""
+    claimable = [PurgeTask.STATUS_PENDING]
+    if resume:
+        claimable += [PurgeTask.STATUS_RUNNING, PurgeTask.STATUS_FAILED]
+
+    try:
+        claimed = PurgeTask.objects.filter(pk=task_pk, status__in=claimable).update(
+            status=PurgeTask.STATUS_RUNNING, error='', updated_at=timezone.now()
+        )
+        if not claimed:
+            return
+
+        batch_size = settings.PURGE_BATCH_SIZE
+        tasks = PurgeTask.objects.filter(pk=task_pk)
+
+        while True:
+            chunk = list(
+                File.objects.filter(purge_task_id=task_pk)
+                .only(*PURGE_FIELDS).order_by('pk')[:batch_size]
+            )
+            if not chunk:
+                break
+
+            done, errors = unlink_many(chunk, settings.PURGE_WORKERS)
+            delete_file_rows([file.pk for file in done])
+            if errors:
+                # 刪不掉的檔案放回回收站，讓使用者看得到
+                File.objects.filter(pk__in=[file.pk for file, _ in errors]).update(purge_task=None)
+            tasks.update(
+                deleted_files=F('deleted_files') + len(done),
+                failed_files=F('failed_files') + len(errors),
+                updated_at=timezone.now(),
+            )
+
+        while True:
+            chunk = list(
+                Folder.objects.filter(purge_task_id=task_pk)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not chunk:
+                break
+
+            deleted = delete_folder_rows(chunk)
+            tasks.update(deleted_folders=F('deleted_folders') + deleted, updated_at=timezone.now())
+
+        tasks.update(status=PurgeTask.STATUS_DONE, finished_at=timezone.now())
+    except Exception as e:
+        print(f"清除工作 #{task_pk} 失敗: {e}")
+        PurgeTask.objects.filter(pk=task_pk).update(status=PurgeTask.STATUS_FAILED, error=str(e))
+    finally:
+        connection.close()
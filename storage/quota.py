@@ -0,0 +1,164 @@
+"""儲存空間配額
+
+每位使用者的已使用空間（used_bytes）與上傳中保留的空間（reserved_bytes）記在
+UserProfile，檢查與顯示只讀一列，不需要加總檔案。
+
+上傳流程：在讀取請求內容之前以宣告的大小保留空間（reserve），保留本身是一個
+帶條件的 UPDATE（used + reserved + size <= 上限），同時上傳的請求不會一起
+通過檢查而超過配額；實際大小超過宣告的大小時 resize 以同樣的條件補保留差額，
+空間不足就拒絕。檔案存好後 commit 把保留改成實際大小，最後一律 release，
+沒有 commit 的保留就會歸還。
+每筆保留另外記一列 QuotaReservation，行程中途結束留下的保留超過
+QUOTA_RESERVATION_TTL 秒後會被清掉。
+
+上限：UserProfile.quota_bytes，留空時使用預設值。預設值為 QUOTA_DEFAULT_BYTES，
+未設定時沿用「系統總容量 × QUOTA_SYSTEM_RATIO ÷ 使用者數」，結果快取
+QUOTA_POLICY_TTL 秒。0 為不限制。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import File, QuotaReservation, UserProfile
+
+POLICY_CACHE_KEY = 'quota:default-limit'
+
+
+def default_limit():
+    """沒有個別設定時的上限（bytes），0 為不限制"""
+    if settings.QUOTA_DEFAULT_BYTES:
+        return settings.QUOTA_DEFAULT_BYTES
+    limit = cache.get(POLICY_CACHE_KEY)
+    if limit is None:
+        users = User.objects.count()
+        limit = int(settings.TOTAL_SYSTEM_STORAGE * settings.QUOTA_SYSTEM_RATIO / users) if users else 0
+        cache.set(POLICY_CACHE_KEY, limit, settings.QUOTA_POLICY_TTL)
+    return limit
+
+
+def _profile(user):
+    """取得用戶資料，回傳 (profile, 是否新建)
+
+    信號加入之前建立、或由略過信號的方式建立的帳號沒有用戶資料，這時補建一筆，
+    已使用空間依現有檔案計算。
+    """
+    try:
+        return UserProfile.objects.only('quota_bytes', 'used_bytes', 'reserved_bytes').get(user=user), False
+    except UserProfile.DoesNotExist:
+        used = File.objects.filter(owner=user).aggregate(size=Sum('file_size'))['size'] or 0
+        return UserProfile.objects.get_or_create(user=user, defaults={'used_bytes': used})
+
+
+def usage(user):
+    """回傳 {'used', 'reserved', 'limit', 'percentage'}"""
+    profile, _ = _profile(user)
+    limit = default_limit() if profile.quota_bytes is None else profile.quota_bytes
+    percentage = min(profile.used_bytes / limit * 100, 100) if limit else 0
+    return {
+        'used': profile.used_bytes,
+        'reserved': profile.reserved_bytes,
+        'limit': limit,
+        'percentage': percentage,
+    }
+
+
+def _try_reserve(user, size):
+    limit = Coalesce('quota_bytes', Value(default_limit()))
+    return UserProfile.objects.filter(user=user).alias(
+        limit=limit,
+        total=F('used_bytes') + F('reserved_bytes') + size,
+    ).filter(Q(limit=0) | Q(total__lte=F('limit'))).update(reserved_bytes=F('reserved_bytes') + size)
+
+
+def reserve(user, size):
+    """保留空間，回傳 QuotaReservation；空間不足回傳 None"""
+    size = max(0, int(size))
+    with transaction.atomic():
+        granted = _try_reserve(user, size)
+        # 清掉逾時的保留，或補建缺少的用戶資料後再試一次
+        if not granted and (release_expired(user) or _profile(user)[1]):
+            granted = _try_reserve(user, size)
+        if not granted:
+            return None
+        return QuotaReservation.objects.create(user=user, size=size)
+
+
+def _settle(reservation, used):
+    with transaction.atomic():
+        # 只有刪掉保留列的一方歸還保留的空間，重複 release 或已逾時清掉時不會重複扣回
+        if QuotaReservation.objects.filter(pk=reservation.pk).delete()[0]:
+            UserProfile.objects.filter(user_id=reservation.user_id).update(
+                reserved_bytes=F('reserved_bytes') - reservation.size,
+                used_bytes=F('used_bytes') + used,
+            )
+        elif used:
+            UserProfile.objects.filter(user_id=reservation.user_id).update(used_bytes=F('used_bytes') + used)
+
+
+def resize(reservation, size):
+    """實際大小超過保留（沒有或少報 Content-Length）時補保留差額，空間不足回傳 False"""
+    extra = size - reservation.size
+    if extra <= 0:
+        return True
+    with transaction.atomic():
+        if not _try_reserve(reservation.user_id, extra):
+            return False
+        if not QuotaReservation.objects.filter(pk=reservation.pk).update(size=size):
+            # 保留已逾時被清掉，不會再扣回保留的空間，差額直接歸還
+            UserProfile.objects.filter(user_id=reservation.user_id).update(
+                reserved_bytes=F('reserved_bytes') - extra
+            )
+    reservation.size = size
+    return True
+
+
+def commit(reservation, size):
+    """上傳完成：把保留改成實際使用的大小；超過保留且空間不足時不計入並回傳 False"""
+    if not resize(reservation, size):
+        return False
+    _settle(reservation, size)
+    return True
+
+
+def release(reservation):
+    """上傳失敗或取消：歸還保留的空間；已經 commit 時不做任何事"""
+    _settle(reservation, 0)
+
+
+def release_expired(user=None):
+    """清掉逾時的保留，回傳歸還的筆數"""
+    cutoff = timezone.now() - timedelta(seconds=settings.QUOTA_RESERVATION_TTL)
+    stale = QuotaReservation.objects.filter(created_at__lt=cutoff)
+    if user is not None:
+        stale = stale.filter(user=user)
+
+    released = 0
+    for reservation in stale:
+        with transaction.atomic():
+            if QuotaReservation.objects.filter(pk=reservation.pk).delete()[0]:
+                UserProfile.objects.filter(user_id=reservation.user_id).update(
+                    reserved_bytes=F('reserved_bytes') - reservation.size
+                )
+                released += 1
+    return released
+
+
+def recalculate(user_ids=None):
+    """依檔案資料重新計算已使用與保留的空間，回傳更新的使用者數"""
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    updated = 0
+    for user_id in profiles.values_list('user_id', flat=True).iterator():
+        with transaction.atomic():
+            used = File.objects.filter(owner_id=user_id).aggregate(size=Sum('file_size'))['size'] or 0
+            reserved = QuotaReservation.objects.filter(user_id=user_id).aggregate(size=Sum('size'))['size'] or 0
+            updated += UserProfile.objects.filter(user_id=user_id).update(used_bytes=used, reserved_bytes=reserved)
+    return updated
@@ -0,0 +1,188 @@
+"""檔案系統與資料庫對帳
+
+找出兩種不一致：
+- 孤兒檔案：磁碟上有、資料庫沒有參照的檔案（上傳中途當機、刪除失敗、
+  舊縮圖、搬移時留下的暫存檔等）
+- 遺失檔案：資料庫有紀錄、磁碟上卻找不到的檔案
+
+磁碟端以多個執行緒平行 scandir，結果分批經由有上限的佇列交給呼叫端；
+每批路徑再用一次索引查詢比對資料庫。資料庫端以 pk 分批讀取後檢查檔案
+是否存在。兩邊都只保留一批資料在記憶體中，檔案數量再多也不會用光記憶體。
+"""
+import os
+import queue
+import re
+import threading
+
+from django.conf import settings
+
+from .models import File, UserProfile
+
+THUMBNAIL_PATTERN = re.compile(r'^thumbnails/thumb_(\d+)')
+PREVIEW_PATTERN = re.compile(r'^previews/(\d+)/')
+
+
+def scan_files(root, workers=8, batch_size=5000, exclude=()):
+    """平行走訪 root 下所有檔案，分批產生 [(相對路徑, 大小, 修改時間)]
+
+    相對路徑一律以 / 分隔，與 FileField 存的名稱相同。
+    exclude 中的目錄（例如放在 MEDIA_ROOT 底下的冷儲存）不會走訪。
+    """
+    if not os.path.isdir(root):
+        return
+    exclude = {os.path.realpath(path) for path in exclude}
+
+    directories = queue.Queue()
+    batches = queue.Queue(maxsize=workers * 4)
+    lock = threading.Lock()
+    outstanding = [1]
+    done = object()
+    # 呼叫端提前結束（break 或例外）時通知執行緒停止，不會卡在已滿的佇列上
+    stop = threading.Event()
+
+    def put(batch):
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan(relative_dir):
+        batch = []
+        try:
+            with os.scandir(os.path.join(root, relative_dir)) as entries:
+                for entry in entries:
+                    if stop.is_set():
+                        return
+                    relative_path = f'{relative_dir}/{entry.name}' if relative_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.realpath(entry.path) in exclude:
+                            continue
+                        with lock:
+                            outstanding[0] += 1
+                        directories.put(relative_path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        batch.append((relative_path, stat.st_size, stat.st_mtime))
+                        if len(batch) >= batch_size:
+                            put(batch)
+                            batch = []
+        except OSError as e:
+            print(f"無法讀取目錄 {relative_dir or root}: {e}")
+        if batch:
+            put(batch)
+
+    def worker():
+        while True:
+            relative_dir = directories.get()
+            if relative_dir is done or stop.is_set():
+                return
+            scan(relative_dir)
+            with lock:
+                outstanding[0] -= 1
+                finished = outstanding[0] == 0
+            if finished:
+                put(done)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    directories.put('')
+
+    try:
+        while True:
+            batch = batches.get()
+            if batch is done:
+                break
+            yield batch
+    finally:
+        stop.set()
+        # 清空佇列，正在放入的執行緒不必等到逾時
+        while True:
+            try:
+                batches.get_nowait()
+            except queue.Empty:
+                break
+        for _ in threads:
+            directories.put(done)
+        for thread in threads:
+            thread.join()
+
+
+def media_orphans(batch):
+    """MEDIA_ROOT 下沒有被資料庫參照的檔案"""
+    files = []
+    thumbnails = {}
+    previews = {}
+    avatars = []
+    for item in batch:
+        path = item[0]
+        match = THUMBNAIL_PATTERN.match(path)
+        preview = PREVIEW_PATTERN.match(path)
+        if match:
+            thumbnails[path] = int(match.group(1))
+        elif preview:
+            previews[path] = int(preview.group(1))
+        elif path.startswith('avatars/'):
+            avatars.append(path)
+        else:
+            files.append(path)
+
+    referenced = set()
+    if files:
+        # 已降級到冷儲存的檔案，熱儲存不應該還有一份
+        referenced.update(
+            File.objects.filter(file__in=files, storage_tier=File.TIER_HOT).values_list('file', flat=True)
+        )
+    if thumbnails:
+        referenced.update(
+            File.objects.filter(pk__in=set(thumbnails.values())).exclude(thumbnail='')
+            .exclude(thumbnail__isnull=True).values_list('thumbnail', flat=True)
+        )
+    if previews:
+        # 預覽圖可以隨時重新產生，只要檔案還在就保留
+        existing = set(File.objects.filter(pk__in=set(previews.values())).values_list('pk', flat=True))
+        referenced.update(path for path, file_id in previews.items() if file_id in existing)
+    if avatars:
+        referenced.update(UserProfile.objects.filter(avatar__in=avatars).values_list('avatar', flat=True))
+
+    return [item for item in batch if item[0] not in referenced]
+
+
+def cold_orphans(batch):
+    """COLD_STORAGE_ROOT 下沒有對應冷儲存紀錄的檔案"""
+    # 壓縮的冷儲存副本多了 .gz，但原檔名本身也可能是 .gz
+    candidates = {}
+    for item in batch:
+        path = item[0]
+        candidates[path] = [(path, False)]
+        if path.endswith('.gz'):
+            candidates[path].append((path[:-3], True))
+
+    names = {name for keys in candidates.values() for name, _ in keys}
+    cold = set(
+        File.objects.filter(file__in=names, storage_tier=File.TIER_COLD)
+        .values_list('file', 'cold_compressed')
+    )
+    return [item for item in batch if not any(key in cold for key in candidates[item[0]])]
+
+
+def missing_blobs(files):
+    """回傳 [(檔案, 缺少的種類)]，種類為 'file' 或 'thumbnail'"""
+    missing = []
+    for file_obj in files:
+        path = file_obj.get_cold_path() if file_obj.is_cold() else file_obj.file.path
+        if not os.path.exists(path):
+            missing.append((file_obj, 'file'))
+        if file_obj.thumbnail and not os.path.exists(file_obj.thumbnail.path):
+            missing.append((file_obj, 'thumbnail'))
+    return missing
+
+
+def storage_roots():
+    """(名稱, 根目錄, 判斷孤兒的函式)"""
+    return [
+        ('media', settings.MEDIA_ROOT, media_orphans),
+        ('cold', settings.COLD_STORAGE_ROOT, cold_orphans),
+    ]
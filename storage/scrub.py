@@ -0,0 +1,85 @@
+"""完整性檢查（scrub）
+
+重新讀取儲存的檔案計算 SHA-256，與資料庫中的 file_hash 比對，找出位元損毀
+或在資料庫不知情下消失的檔案。冷儲存的檔案直接讀冷儲存副本，不會回升。
+讀取速度由所有執行緒共用的 ByteBudget 限制，避免影響線上服務。
+"""
+import gzip
+import hashlib
+import io
+import threading
+import time
+
+from django.conf import settings
+
+from . import compression
+from .models import IntegrityIssue
+
+READ_SIZE = 1024 * 1024
+
+# 檢查時需要的欄位
+SCRUB_FIELDS = ['pk', 'name', 'file', 'file_size', 'file_hash', 'storage_tier', 'cold_compressed', 'compression']
+
+
+class ByteBudget:
+    """限制每秒讀取的位元組數，多個執行緒共用同一個額度"""
+
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def consume(self, size):
+        if not self.bytes_per_second:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_slot, now)
+            self._next_slot = start + size / self.bytes_per_second
+        if start > now:
+            time.sleep(start - now)
+
+
+def open_stored(file_obj):
+    """開啟實際存放的檔案（熱或冷儲存），讀出原始內容"""
+    if not file_obj.is_cold():
+        return compression.open_file(file_obj)
+
+    cold_path = file_obj.get_cold_path()
+    if file_obj.cold_compressed:
+        return gzip.open(cold_path, 'rb')
+    if file_obj.compression:
+        return io.BufferedReader(compression.FramedReader(cold_path), buffer_size=settings.COMPRESS_FRAME_SIZE)
+    return open(cold_path, 'rb')
+
+
+def hash_stored(file_obj, budget):
+    sha256_hash = hashlib.sha256()
+    with open_stored(file_obj) as f:
+        while True:
+            budget.consume(READ_SIZE)
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                break
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+
+def check_file(file_obj, budget):
+    """檢查單一檔案，回傳 (狀態, 實際 hash, 訊息)，狀態為 None 代表正常"""
+    for attempt in range(2):
+        try:
+            actual = hash_stored(file_obj, budget)
+            break
+        except FileNotFoundError:
+            # 檢查途中可能剛好被降級或回升，重新讀取層級再試一次
+            tier = (file_obj.storage_tier, file_obj.cold_compressed)
+            file_obj.refresh_from_db(fields=['storage_tier', 'cold_compressed'])
+            if attempt or (file_obj.storage_tier, file_obj.cold_compressed) == tier:
+                return IntegrityIssue.STATUS_MISSING, '', '找不到實體檔案'
+        except Exception as e:
+            return IntegrityIssue.STATUS_ERROR, '', str(e)
+
+    if file_obj.file_hash and actual != file_obj.file_hash:
+        return IntegrityIssue.STATUS_MISMATCH, actual, ''
+    return None, actual, ''
@@ -0,0 +1,28 @@
+"""檔案搜尋
+
+SQLite 有全文索引時以 FTS5 trigram 比對（至少 3 個字元），其他資料庫或較短的
+關鍵字使用 icontains。兩者都是「欄位中包含整段字串、不分大小寫」。
+"""
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from . import sqlite
+
+# trigram 索引無法比對少於 3 個字元的字串
+MIN_FTS_LENGTH = 3
+
+
+def filter_files(files, query, fields=('name', 'description', 'tags')):
+    """篩選任一欄位包含 query 的檔案"""
+    connection = connections[files.db]
+    if len(query) >= MIN_FTS_LENGTH and sqlite.has_search_index(connection):
+        return files.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {sqlite.FTS_TABLE} WHERE {sqlite.FTS_TABLE} MATCH %s',
+            [sqlite.match_expression(query, fields)],
+        ))
+
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': query})
+    return files.filter(condition)
@@ -0,0 +1,110 @@
+"""分享連結下載
+
+熱門分享連結每次下載都要查 SharedLink 與 File 並更新同一列。這裡把連結
+（含檔案）放在快取中短暫保存，下載次數以帶條件的 F() UPDATE 原子性地加一，
+同時檢查是否啟用、是否過期與下載上限，並發下載不會少算也不會超過上限。
+
+沒有下載上限的連結可設定 SHARE_COUNT_BUFFER=True，把次數先累積在行程內，
+定量或定時再批次寫回，進一步減少對同一列的寫入。
+"""
+import atexit
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import SharedLink
+
+# 快取中代表「連結不存在」，避免無效的 token 每次都查資料庫
+MISSING = 'missing'
+
+_buffer_lock = threading.Lock()
+_pending_counts = defaultdict(int)   # pk -> 尚未寫回的下載次數
+_last_flush = time.monotonic()
+
+
+def get_share(token):
+    """取得分享連結（含檔案），不存在時回傳 None"""
+    key = SharedLink.cache_key(token)
+    share_link = cache.get(key)
+    if share_link is None:
+        share_link = SharedLink.objects.select_related('file').filter(token=token).first() or MISSING
+        cache.set(key, share_link, settings.SHARE_CACHE_TTL)
+    return None if share_link == MISSING else share_link
+
+
+def claim_download(share_link):
+    """計入一次下載，連結已失效或達到上限時回傳 False"""
+    if not share_link.can_download():
+        return False
+
+    if settings.SHARE_COUNT_BUFFER and not share_link.max_downloads:
+        _buffer_download(share_link.pk)
+        return True
+
+    now = timezone.now()
+    claimable = SharedLink.objects.filter(pk=share_link.pk, is_active=True).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    )
+    if share_link.max_downloads:
+        claimable = claimable.filter(
+            Q(max_downloads__isnull=True) | Q(download_count__lt=F('max_downloads'))
+        )
+
+    if not claimable.update(download_count=F('download_count') + 1):
+        # 其他請求已用完次數或連結已被停用
+        cache.delete(SharedLink.cache_key(share_link.token))
+        return False
+
+    if share_link.max_downloads:
+        # 達到下載上限，自動停用
+        reached = SharedLink.objects.filter(
+            pk=share_link.pk, download_count__gte=F('max_downloads')
+        ).update(is_active=False)
+        if reached:
+            cache.delete(SharedLink.cache_key(share_link.token))
+    return True
+
+
+def _buffer_download(pk):
+    global _last_flush
+
+    with _buffer_lock:
+        _pending_counts[pk] += 1
+        should_flush = (
+            sum(_pending_counts.values()) >= settings.SHARE_COUNT_FLUSH_SIZE
+            or time.monotonic() - _last_flush >= settings.SHARE_COUNT_FLUSH_INTERVAL
+        )
+
+    if should_flush:
+        flush_download_counts()
+
+
+def flush_download_counts():
+    """把緩衝的下載次數寫回資料庫，相同次數的連結合併成一個 UPDATE"""
+    global _pending_counts, _last_flush
+
+    with _buffer_lock:
+        pending = _pending_counts
+        _pending_counts = defaultdict(int)
+        _last_flush = time.monotonic()
+
+    by_count = defaultdict(list)
+    for pk, count in pending.items():
+        by_count[count].append(pk)
+    for count, pks in by_count.items():
+        SharedLink.objects.filter(pk__in=pks).update(download_count=F('download_count') + count)
+
+
+def _flush_at_exit():
+    try:
+        flush_download_counts()
+    except Exception as e:
+        print(f"寫回分享下載次數失敗: {e}")
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,103 @@
+"""HMAC 簽章的短效下載網址
+
+網址中帶有檔案路徑、大小、顯示名稱、用途（預覽或下載）與到期時間，並以 HMAC
+簽章。驗證只需要重新計算簽章，不需要 session，也不需要查詢 File，
+頁面上大量的圖片與影片可以直接由這個 view 或前端代理提供。
+
+簽章金鑰由 SECRET_KEY 加上使用者與檔案的「金鑰世代」組成，世代存在資料庫，
+每次驗證以主鍵查詢一次（不快取：預設的快取只在單一行程內，撤銷無法傳到其他
+worker）；把世代加一（revoke_file / revoke_user）後，之前發出的網址全部失效。
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F
+from django.urls import reverse
+
+from .models import File, UserProfile
+
+SALT = 'storage.signed_url'
+OPERATIONS = ('preview', 'download')
+
+
+def generations(user_id, file_id):
+    """取得使用者與檔案目前的金鑰世代（一次以主鍵查詢，連同擁有者的用戶資料）"""
+    row = File.objects.filter(pk=file_id, owner_id=user_id).values_list(
+        'owner__profile__url_generation', 'url_generation'
+    ).first()
+    if row is None:
+        return 0, 0
+    return row[0] or 0, row[1] or 0
+
+
+def _instance_generations(file_obj):
+    # 簽發時沿用已載入的世代；列表以 select_related('owner__profile') 取出時不必逐筆查詢
+    try:
+        user_generation = file_obj.owner.profile.url_generation
+    except UserProfile.DoesNotExist:
+        user_generation = 0
+    return user_generation, file_obj.url_generation
+
+
+def _signing_key(user_generation, file_generation):
+    return f'{settings.SECRET_KEY}:{user_generation}:{file_generation}'
+
+
+def _salt(user_id, file_id):
+    # 網址中的使用者與檔案 ID 也納入簽章，換成其他 ID 就無法通過驗證
+    return f'{SALT}:{user_id}:{file_id}'
+
+
+def sign(file_obj, operation='preview', ttl=None, share_link=None):
+    """產生簽章網址，由分享連結轉來時一併帶入分享連結的頻寬限制"""
+    if operation not in OPERATIONS:
+        raise ValueError(f'不支援的用途: {operation}')
+    ttl = ttl or settings.SIGNED_URL_TTL
+    payload = {
+        'p': file_obj.file.name,
+        'c': file_obj.compression,
+        's': file_obj.file_size,
+        'n': file_obj.name,
+        'o': operation,
+        'e': int(time.time()) + ttl,
+    }
+    if share_link is not None:
+        payload['l'] = share_link.pk
+        payload['r'] = share_link.bandwidth_limit
+    token = signing.dumps(
+        payload,
+        key=_signing_key(*_instance_generations(file_obj)),
+        salt=_salt(file_obj.owner_id, file_obj.pk),
+        compress=True,
+    )
+    return reverse('storage:signed_file', args=[file_obj.owner_id, file_obj.pk, token])
+
+
+def verify(user_id, file_id, token):
+    """驗證簽章與到期時間，回傳網址內容，無效時回傳 None"""
+    try:
+        payload = signing.loads(
+            token,
+            key=_signing_key(*generations(user_id, file_id)),
+            salt=_salt(user_id, file_id),
+        )
+    except signing.BadSignature:
+        return None
+    if payload.get('o') not in OPERATIONS or payload.get('e', 0) < time.time():
+        return None
+    return payload
+
+
+def revoke_file(file_ids):
+    """讓這些檔案已發出的簽章網址全部失效"""
+    if not settings.SIGNED_URLS:
+        return
+    File.objects.filter(pk__in=file_ids).update(url_generation=F('url_generation') + 1)
+
+
+def revoke_user(user):
+    """讓使用者所有檔案已發出的簽章網址全部失效"""
+    if not settings.SIGNED_URLS:
+        return
+    UserProfile.objects.filter(user=user).update(url_generation=F('url_generation') + 1)
@@ -0,0 +1,160 @@
+"""相似圖片偵測
+
+每張圖片在產生縮圖時一併計算 64 位元的差異 hash（dHash）：縮成 9x8 灰階，
+比較每列相鄰像素的明暗。重新壓縮、縮放或截圖的同一張照片，hash 只會差
+幾個位元，以漢明距離判斷相似。
+
+分群在背景執行（find_similar_images、generate_thumbnails），結果記在
+File.similar_group（群組中最小的檔案 id），重複檔案頁面只讀取記好的群組。
+
+比對使用多重索引 hash：把 64 位元切成 4 段，每段以數值建索引。距離在門檻內的兩個
+hash 依鴿籠原理至少有一段的距離不超過 threshold // 4，因此只需在各段查詢這個
+距離內的值（門檻 6 時為相同或差 1 位元），再以完整距離確認，不需要兩兩比較。
+"""
+from itertools import combinations
+
+from django.db import transaction
+from PIL import Image
+
+from .models import File
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+# 多重索引的段數，每段 16 位元
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+
+
+def dhash(img):
+    """計算 PIL 圖片的 dHash，回傳 16 位十六進位字串"""
+    small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f'{value:016x}'
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _band_masks(radius):
+    """一段之內距離不超過 radius 的所有位元翻轉遮罩"""
+    masks = []
+    for distance in range(radius + 1):
+        for bits in combinations(range(BAND_BITS), distance):
+            masks.append(sum(1 << bit for bit in bits))
+    return masks
+
+
+def similar_clusters(hashes, threshold):
+    """把 (項目, hash 字串) 依漢明距離分群，回傳至少兩個項目的群組
+
+    距離在門檻內的項目會被串成同一群（聯集），群組依大小由大到小排序。
+    """
+    values = [(item, int(hash_value, 16)) for item, hash_value in hashes]
+
+    parent = {}
+
+    def find(item):
+        root = item
+        while parent.get(root, root) != root:
+            root = parent[root]
+        # 路徑壓縮
+        while item != root:
+            parent[item], item = root, parent.get(item, item)
+        return root
+
+    # 完全相同的 hash 先合併，每個不同的值只進索引一次
+    by_value = {}
+    for item, value in values:
+        first = by_value.setdefault(value, item)
+        if first != item:
+            parent[find(item)] = find(first)
+
+    masks = _band_masks(max(threshold, 0) // BANDS)
+    band_mask = (1 << BAND_BITS) - 1
+    # 每一段：段的數值 -> 已加入索引的 hash
+    index = [{} for _ in range(BANDS)]
+    for value, item in by_value.items():
+        candidates = set()
+        for band in range(BANDS):
+            key = (value >> (band * BAND_BITS)) & band_mask
+            for mask in masks:
+                candidates.update(index[band].get(key ^ mask, ()))
+        for other in candidates:
+            if hamming(value, other) <= threshold:
+                root, other_root = find(item), find(by_value[other])
+                if root != other_root:
+                    parent[other_root] = root
+        for band in range(BANDS):
+            index[band].setdefault((value >> (band * BAND_BITS)) & band_mask, []).append(value)
+
+    clusters = {}
+    for item, _ in values:
+        clusters.setdefault(find(item), []).append(item)
+    return sorted((c for c in clusters.values() if len(c) > 1), key=len, reverse=True)
+
+
+def update_groups(threshold, user_ids=None):
+    """重新計算相似圖片群組並寫入 File.similar_group，回傳 (使用者數, 群組數)
+
+    只比對同一位使用者、未刪除的圖片；完全相同（file_hash 一樣）的群組不列入。
+    """
+    files = File.objects.filter(is_deleted=False)
+    if user_ids is not None:
+        files = files.filter(owner_id__in=user_ids)
+    owners = files.filter(perceptual_hash__isnull=False).exclude(perceptual_hash='').values_list(
+        'owner_id', flat=True
+    ).distinct()
+    if user_ids is not None:
+        # 指定的使用者即使已經沒有圖片也要清掉舊的群組
+        owners = set(owners) | set(user_ids)
+
+    users = 0
+    total = 0
+    for owner_id in list(owners):
+        rows = files.filter(owner_id=owner_id, perceptual_hash__isnull=False).exclude(perceptual_hash='').values_list(
+            'pk', 'perceptual_hash', 'file_hash'
+        )
+        file_hashes = {}
+        hashes = []
+        for pk, perceptual_hash, file_hash in rows.iterator(chunk_size=5000):
+            file_hashes[pk] = file_hash or pk
+            hashes.append((pk, perceptual_hash))
+
+        clusters = [
+            cluster for cluster in similar_clusters(hashes, threshold)
+            if len({file_hashes[pk] for pk in cluster}) > 1
+        ]
+        with transaction.atomic():
+            File.objects.filter(owner_id=owner_id, similar_group__isnull=False).update(similar_group=None)
+            for cluster in clusters:
+                File.objects.filter(pk__in=cluster).update(similar_group=min(cluster))
+        users += 1
+        total += len(clusters)
+    return users, total
+
+
+def similar_image_groups(queryset, limit=20):
+    """讀取記好的相似圖片群組
+
+    回傳 [{'files': [File, ...], 'total_size': 位元組}]，依群組大小排序。
+    分群之後刪除的檔案不列入，剩下不到兩張或內容完全相同的群組也略過。
+    """
+    files = queryset.filter(similar_group__isnull=False).select_related('folder').order_by('similar_group', 'created_at')
+    clusters = {}
+    for file_obj in files:
+        clusters.setdefault(file_obj.similar_group, []).append(file_obj)
+
+    groups = [
+        {'files': members, 'total_size': sum(f.file_size for f in members)}
+        for members in clusters.values()
+        if len(members) > 1 and len({f.file_hash or f.pk for f in members}) > 1
+    ]
+    groups.sort(key=lambda group: len(group['files']), reverse=True)
+    return groups[:limit]
@@ -0,0 +1,102 @@
+"""單機 SQLite 部署
+
+以 SQLite 為資料庫時：
+- 每條連線建立時套用 SQLITE_PRAGMAS（WAL、synchronous、mmap、快取大小等）。
+  WAL 模式下讀取不會被寫入擋住；同時寫入時由 OPTIONS 的 timeout（busy_timeout）
+  排隊等待，搭配 IMMEDIATE 交易在一開始就取得寫入鎖，不會在交易中途遇到 database is locked。
+- 檔案名稱、描述與標籤建立 FTS5 trigram 全文索引（storage_file_fts），
+  由觸發器與 storage_file 同步，搜尋不需要掃描整個資料表。
+
+Django 在 SQLite 上修改欄位時會重建資料表，觸發器會跟著消失，
+因此索引與觸發器在每次 migrate 之後檢查，缺少時重新建立並重建索引。
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+FTS_TABLE = 'storage_file_fts'
+FTS_COLUMNS = ['name', 'description', 'tags']
+
+# 資料庫別名 -> 是否有全文索引
+_fts_available = {}
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def _triggers(table):
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+    delete = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    )
+    insert = f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});'
+    return {
+        f'{FTS_TABLE}_ai': f'AFTER INSERT ON {table} BEGIN {insert} END',
+        f'{FTS_TABLE}_ad': f'AFTER DELETE ON {table} BEGIN {delete} END',
+        f'{FTS_TABLE}_au': f'AFTER UPDATE OF {columns} ON {table} BEGIN {delete} {insert} END',
+    }
+
+
+def ensure_search_index(connection):
+    """建立缺少的全文索引與觸發器，有變動時重建索引；SQLite 未編入 FTS5 時回傳 False"""
+    from django.db import DatabaseError
+
+    from .models import File
+
+    table = File._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+                       [f'{FTS_TABLE}%'])
+        existing = {row[0] for row in cursor.fetchall()}
+
+        changed = False
+        if FTS_TABLE not in existing:
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({', '.join(FTS_COLUMNS)}, "
+                    f"content='{table}', content_rowid='id', tokenize='trigram')"
+                )
+            except DatabaseError:
+                return False
+            changed = True
+        for name, body in _triggers(table).items():
+            if name not in existing:
+                cursor.execute(f'CREATE TRIGGER {name} {body}')
+                changed = True
+        if changed:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+@receiver(post_migrate)
+def build_search_index(sender, using, **kwargs):
+    from django.db import connections
+
+    if sender.name != 'storage' or connections[using].vendor != 'sqlite':
+        return
+    _fts_available[using] = ensure_search_index(connections[using])
+
+
+def has_search_index(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.alias not in _fts_available:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_available[connection.alias] = cursor.fetchone() is not None
+    return _fts_available[connection.alias]
+
+
+def match_expression(query, fields):
+    """FTS5 查詢：指定欄位中包含整段字串（不分大小寫）"""
+    phrase = '"' + query.replace('"', '""') + '"'
+    return f"{{{' '.join(fields)}}} : {phrase}"
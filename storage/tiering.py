@@ -0,0 +1,199 @@
+"""冷熱分層儲存
+
+熱儲存即 MEDIA_ROOT，冷儲存位於 COLD_STORAGE_ROOT 並沿用相同的相對路徑。
+存取時間先記在行程內的緩衝區，累積到一定數量或時間後才批次寫回資料庫，
+避免每次下載都更新一次 File。
+"""
+import atexit
+import gzip
+import os
+import shutil
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import File, TierAccessStat
+
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_buffer_lock = threading.Lock()
+_pending_access = {}   # pk -> 最後存取時間
+_pending_hits = {'hot': 0, 'cold': 0, 'bytes_promoted': 0}
+_last_flush = time.monotonic()
+
+
+def record_access(file_obj, tier):
+    """記錄一次讀取，必要時批次寫回資料庫"""
+    global _last_flush
+
+    with _buffer_lock:
+        _pending_access[file_obj.pk] = timezone.now()
+        _pending_hits[tier] += 1
+        should_flush = (
+            len(_pending_access) >= settings.TIER_ACCESS_FLUSH_SIZE
+            or time.monotonic() - _last_flush >= settings.TIER_ACCESS_FLUSH_INTERVAL
+        )
+
+    if should_flush:
+        flush_access_buffer()
+
+
+def flush_access_buffer():
+    """把緩衝的存取時間與命中次數寫回資料庫"""
+    global _pending_access, _last_flush
+
+    with _buffer_lock:
+        pending = _pending_access
+        hits = dict(_pending_hits)
+        _pending_access = {}
+        for key in _pending_hits:
+            _pending_hits[key] = 0
+        _last_flush = time.monotonic()
+
+    if pending:
+        File.objects.bulk_update(
+            [File(pk=pk, last_accessed_at=accessed_at) for pk, accessed_at in pending.items()],
+            ['last_accessed_at'],
+            batch_size=500,
+        )
+
+    if hits['hot'] or hits['cold'] or hits['bytes_promoted']:
+        _add_stats(
+            hot_hits=hits['hot'],
+            cold_hits=hits['cold'],
+            bytes_promoted=hits['bytes_promoted'],
+        )
+
+
+def _add_stats(**increments):
+    today = timezone.localdate()
+    TierAccessStat.objects.get_or_create(date=today)
+    TierAccessStat.objects.filter(date=today).update(
+        **{field: F(field) + value for field, value in increments.items()}
+    )
+
+
+def _flush_at_exit():
+    try:
+        flush_access_buffer()
+    except Exception as e:
+        print(f"寫回存取紀錄失敗: {e}")
+
+
+atexit.register(_flush_at_exit)
+
+
+def _copy_atomic(src, dst, compress=False, decompress=False):
+    """串流複製到暫存檔後再 rename，避免讀者看到寫到一半的檔案"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        if decompress:
+            src_fh = gzip.open(src, 'rb')
+        else:
+            src_fh = open(src, 'rb')
+        with src_fh:
+            if compress:
+                dst_fh = gzip.open(tmp_path, 'wb', compresslevel=6)
+            else:
+                dst_fh = open(tmp_path, 'wb')
+            with dst_fh:
+                shutil.copyfileobj(src_fh, dst_fh, COPY_BUFFER_SIZE)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def demote_file(file_obj, compress=None):
+    """把熱儲存的檔案搬到冷儲存，回傳是否成功"""
+    if compress is None:
+        compress = settings.TIER_COLD_COMPRESS
+    # 已經靜態壓縮過的檔案不再 gzip 一次
+    compress = compress and not file_obj.compression
+
+    if file_obj.is_cold() or not file_obj.file:
+        return False
+
+    hot_path = file_obj.file.path
+    if not os.path.exists(hot_path):
+        return False
+
+    file_obj.cold_compressed = compress
+    cold_path = file_obj.get_cold_path()
+    _copy_atomic(hot_path, cold_path, compress=compress)
+    stored_size = os.path.getsize(cold_path)
+
+    # 只在仍是熱儲存時切換，避免與同時進行的回升互相覆蓋
+    updated = File.objects.filter(pk=file_obj.pk, storage_tier=File.TIER_HOT).update(
+        storage_tier=File.TIER_COLD,
+        cold_compressed=compress,
+        stored_size=stored_size,
+    )
+    if not updated:
+        os.remove(cold_path)
+        return False
+
+    file_obj.storage_tier = File.TIER_COLD
+    file_obj.stored_size = stored_size
+    os.remove(hot_path)
+    _add_stats(bytes_demoted=file_obj.file_size)
+    return True
+
+
+def promote_file(file_obj):
+    """把冷儲存的檔案搬回熱儲存，回傳是否成功"""
+    hot_path = file_obj.file.path
+    cold_path = file_obj.get_cold_path()
+
+    try:
+        _copy_atomic(cold_path, hot_path, decompress=file_obj.cold_compressed)
+    except FileNotFoundError:
+        # 可能已被其他請求回升
+        file_obj.refresh_from_db(fields=['storage_tier', 'cold_compressed', 'stored_size'])
+        return not file_obj.is_cold() and os.path.exists(hot_path)
+
+    # 靜態壓縮的檔案回到熱儲存後仍是壓縮格式
+    stored_size = os.path.getsize(hot_path) if file_obj.compression else None
+    updated = File.objects.filter(pk=file_obj.pk, storage_tier=File.TIER_COLD).update(
+        storage_tier=File.TIER_HOT,
+        cold_compressed=False,
+        stored_size=stored_size,
+    )
+    if updated:
+        if os.path.exists(cold_path):
+            os.remove(cold_path)
+        with _buffer_lock:
+            _pending_hits['bytes_promoted'] += file_obj.file_size
+
+    file_obj.storage_tier = File.TIER_HOT
+    file_obj.cold_compressed = False
+    file_obj.stored_size = stored_size
+    return True
+
+
+def ensure_hot(file_obj):
+    """讀取前呼叫：記錄存取並在需要時把檔案回升到熱儲存"""
+    if not file_obj.file:
+        return False
+
+    if not file_obj.is_cold() and not os.path.exists(file_obj.file.path):
+        # 讀到舊資料，檔案可能剛被降級
+        file_obj.refresh_from_db(fields=['storage_tier', 'cold_compressed', 'stored_size'])
+
+    if file_obj.is_cold():
+        record_access(file_obj, 'cold')
+        try:
+            return promote_file(file_obj)
+        except OSError as e:
+            print(f"回升檔案失敗 {file_obj.name}: {e}")
+            return False
+
+    record_access(file_obj, 'hot')
+    return True
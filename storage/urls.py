@@ -1,32 +1,42 @@
 from django.urls import path
+from django.conf import settings
 from storage import views
-from . import views
+from . import views, async_views
 
 app_name = 'storage'
 
+# ASGI 部署時下載類的 view 改用非同步串流版本
+download_views = async_views if settings.ASYNC_DOWNLOADS else views
+
 urlpatterns = [
 
     # API 路徑
     path('api/search-suggestions/', views.search_suggestions, name='search_suggestions'),
+    path('api/batch/', views.api_batch, name='api_batch'),
+    path('api/upload/precheck/', views.upload_precheck, name='upload_precheck'),
+    path('api/file/<int:pk>/neighbors/', views.file_neighbors, name='file_neighbors'),
+    path('api/gallery/', views.gallery_api, name='gallery_api'),
     
     # 首頁和主要功能
     path('', views.home, name='home'),
     path('register/', views.register, name='register'),
     # 檔案操作
     path('upload/', views.file_upload, name='file_upload'),
-    path('file/<int:pk>/download/', views.file_download, name='file_download'),
+    path('file/<int:pk>/download/', download_views.file_download, name='file_download'),
     path('file/<int:pk>/view/', views.file_view, name='file_view'),
     path('file/<int:pk>/edit/', views.file_edit, name='file_edit'),
     path('file/<int:pk>/delete/', views.file_delete, name='file_delete'),
     path('file/<int:pk>/info/', views.ajax_file_info, name='file_info'),
     path('file/<int:pk>/move/', views.file_move, name='file_move'),
-    path('file/<int:pk>/preview/', views.file_preview, name='file_preview'),
+    path('file/<int:pk>/preview/', download_views.file_preview, name='file_preview'),
+    path('file/<int:pk>/gallery/', views.media_gallery, name='media_gallery'),
+    path('signed/<int:user_id>/<int:pk>/<str:token>/', views.signed_file, name='signed_file'),
     # 資料夾操作
     path('create-folder/', views.folder_create, name='folder_create'),
     path('folder/<int:pk>/delete/', views.folder_delete, name='folder_delete'),
     # 分享功能
     path('file/<int:pk>/share/', views.create_share_link, name='create_share'),
-    path('share/<uuid:token>/', views.shared_file_download, name='shared_download'),
+    path('share/<uuid:token>/', download_views.shared_file_download, name='shared_download'),
     path('shares/', views.manage_shares, name='manage_shares'),
     path('share/<int:pk>/toggle/', views.toggle_share, name='toggle_share'),
     path('share/<int:pk>/delete/', views.delete_share, name='delete_share'),
@@ -52,6 +62,7 @@ urlpatterns = [
     path('trash/empty/', views.empty_trash, name='empty_trash'),
     path('batch-restore/', views.batch_restore, name='batch_restore'),
     path('batch-permanent-delete/', views.batch_permanent_delete, name='batch_permanent_delete'),
+    path('api/purge-tasks/<int:pk>/', views.purge_task_status, name='purge_task_status'),
     
     #檔案去重複
     path('duplicates/', views.duplicates, name='duplicates'),
@@ -0,0 +1,152 @@
+"""每日用量彙總
+
+rollup() 把每位使用者、每個類別當天的使用空間、檔案數、上傳、刪除與分享下載
+寫入 DailyUsage，同一天重複執行會覆蓋當天的資料，可以每晚執行一次或每小時
+增量更新。統計頁的趨勢圖與管理後台的容量預測都只讀 DailyUsage，
+不需要在請求中掃描 File。
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import DailyUsage, File, SharedLink
+
+
+def _day_range(date):
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rollup(date=None):
+    """彙總指定日期（預設今天）的用量，回傳寫入的列數"""
+    date = date or timezone.localdate()
+    start, end = _day_range(date)
+    rows = {}
+
+    def row(user_id, category):
+        return rows.setdefault((user_id, category), DailyUsage(date=date, user_id=user_id, category=category))
+
+    live = File.objects.filter(is_deleted=False).values('owner_id', 'category').annotate(
+        count=Count('id'), size=Sum('file_size')
+    )
+    for item in live:
+        usage = row(item['owner_id'], item['category'])
+        usage.file_count = item['count']
+        usage.total_bytes = item['size'] or 0
+
+    uploads = File.objects.filter(created_at__gte=start, created_at__lt=end).values('owner_id', 'category').annotate(
+        count=Count('id'), size=Sum('file_size')
+    )
+    for item in uploads:
+        usage = row(item['owner_id'], item['category'])
+        usage.uploads = item['count']
+        usage.upload_bytes = item['size'] or 0
+
+    deletes = File.objects.filter(
+        is_deleted=True, deleted_at__gte=start, deleted_at__lt=end
+    ).values('owner_id', 'category').annotate(count=Count('id'), size=Sum('file_size'))
+    for item in deletes:
+        usage = row(item['owner_id'], item['category'])
+        usage.deletes = item['count']
+        usage.delete_bytes = item['size'] or 0
+
+    # 分享下載只有累計次數，當天的次數 = 本次累計 - 前一次彙總的累計
+    previous_date = DailyUsage.objects.filter(date__lt=date).aggregate(latest=Max('date'))['latest']
+    previous = {}
+    if previous_date:
+        previous = {
+            (user_id, category): total
+            for user_id, category, total in DailyUsage.objects.filter(date=previous_date)
+            .values_list('user_id', 'category', 'share_downloads_total')
+        }
+    shares = SharedLink.objects.values('file__owner_id', 'file__category').annotate(total=Sum('download_count'))
+    for item in shares:
+        key = (item['file__owner_id'], item['file__category'])
+        usage = row(*key)
+        usage.share_downloads_total = item['total'] or 0
+        if previous_date:
+            usage.share_downloads = max(0, usage.share_downloads_total - previous.get(key, 0))
+
+    with transaction.atomic():
+        DailyUsage.objects.filter(date=date).delete()
+        DailyUsage.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def _slope(points):
+    """最小平方法求每天的變化量，points 為 [(第幾天, 數值)]"""
+    if len(points) < 2:
+        return 0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def user_trend(user, days=30):
+    """使用者最近幾天的每日用量（各類別加總）與每天平均成長量"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    trend = list(
+        DailyUsage.objects.filter(user=user, date__gte=since).values('date').annotate(
+            total_bytes=Sum('total_bytes'),
+            uploads=Sum('uploads'),
+            upload_bytes=Sum('upload_bytes'),
+            deletes=Sum('deletes'),
+            share_downloads=Sum('share_downloads'),
+        ).order_by('date')
+    )
+
+    peak = max((day['total_bytes'] for day in trend), default=0)
+    for day in trend:
+        day['height'] = int(day['total_bytes'] * 100 / peak) if peak else 0
+
+    growth = _slope([((day['date'] - since).days, day['total_bytes']) for day in trend])
+    return trend, growth
+
+
+def forecast(days=30, capacity=None, top=10):
+    """依最近幾天的總用量推估容量用完的時間，並列出成長最快的使用者"""
+    capacity = capacity or settings.TOTAL_SYSTEM_STORAGE
+    since = timezone.localdate() - timedelta(days=days - 1)
+    usage = DailyUsage.objects.filter(date__gte=since)
+
+    totals = list(usage.values('date').annotate(total=Sum('total_bytes')).order_by('date'))
+    growth = _slope([((day['date'] - since).days, day['total']) for day in totals])
+    current = totals[-1]['total'] if totals else 0
+
+    # 成長太慢（超過 100 年才會用完）視為無法預測
+    days_left = None
+    if growth > 0 and (capacity - current) / growth < 36500:
+        days_left = max(0, int((capacity - current) / growth))
+
+    per_user = {}
+    for user_id, username, date, total in usage.values('user_id', 'user__username', 'date').annotate(
+        total=Sum('total_bytes')
+    ).values_list('user_id', 'user__username', 'date', 'total'):
+        per_user.setdefault((user_id, username), []).append(((date - since).days, total))
+
+    growers = sorted(
+        (
+            {'username': username, 'growth': _slope(points), 'current': max(points)[1]}
+            for (_, username), points in per_user.items()
+        ),
+        key=lambda g: g['growth'],
+        reverse=True,
+    )[:top]
+
+    return {
+        'days': days,
+        'capacity': capacity,
+        'current': current,
+        'growth': growth,
+        'days_left': days_left,
+        'full_date': timezone.localdate() + timedelta(days=days_left) if days_left is not None else None,
+        'usage_percentage': min(100, current * 100 / capacity) if capacity else 0,
+        'growers': [g for g in growers if g['growth'] > 0],
+    }
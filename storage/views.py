@@ -2,22 +2,39 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login , update_session_auth_hash
 from django.contrib import messages
-from django.http import HttpResponse, Http404, JsonResponse ,FileResponse
+from django.http import HttpResponse, Http404, JsonResponse ,FileResponse, StreamingHttpResponse
 from django.db.models import Q,Sum,Count
+from django.core.paginator import Paginator
 import os
 import mimetypes
-from .models import File, Folder, SharedLink ,UserProfile
+from .models import File, Folder, SharedLink ,UserProfile, PurgeTask
+from . import bandwidth, compression, db_router, dedup, derivatives, instant_upload, gallery, purge, quota, ranges, search, shares, signed_urls, similarity, tiering, usage
+from .batch import BatchError, BatchRunner
 from .forms import FileUploadForm, FolderCreateForm, FileEditForm, SharedLinkForm, CustomUserCreationForm , UserEditForm, UserProfileForm, CustomPasswordChangeForm
 from django.contrib.auth import logout
-import re
 from django.urls import reverse
-from django.db import IntegrityError
-from django.contrib.auth.models import User
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.db import IntegrityError, transaction
+from django.conf import settings
 from django.utils import timezone
 import zipfile
+import json
+from urllib.parse import quote
 from io import BytesIO
 # Create your views here.
 
+# 瀏覽器播放音樂需要正確的 MIME 類型
+AUDIO_MIME_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.m4a': 'audio/mp4',
+    '.ogg': 'audio/ogg',
+    '.flac': 'audio/flac',
+    '.aac': 'audio/aac',
+    '.wma': 'audio/x-ms-wma'
+}
+
 def register(request):  #使用者註冊
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -31,20 +48,13 @@ def register(request):  #使用者註冊
     return render(request, 'registration/register.html', {'form': form})
 
 @login_required
+@db_router.replica_reads()
 def home(request): #主頁面
     folder_id = request.GET.get('folder')
     search_query = request.GET.get('search', '').strip()  # 新增搜尋參數
     current_folder = None
-    total_system_storage = 100 * 1024 * 1024 * 1024  # 100GB 系統總容量
-    total_users = User.objects.count()
-    user_quota = int((total_system_storage * 0.9) / total_users) if total_users > 0 else 0
-    # 用戶已使用空間
-    user_files = File.objects.filter(owner=request.user)
-    total_size = sum(f.file_size for f in user_files)
-
-    # 計算百分比
-    usage_percentage = (total_size / user_quota * 100) if user_quota > 0 else 0
-    usage_percentage = min(usage_percentage, 100)
+    # 已使用空間與上限都記在用戶資料，不需要加總檔案
+    user_usage = quota.usage(request.user)
 
     if folder_id:
         current_folder = get_object_or_404(Folder, pk=folder_id, owner=request.user)
@@ -65,13 +75,7 @@ def home(request): #主頁面
     
     # 如果有搜尋查詢，則進行全域搜尋
     if search_query:
-        files = File.objects.filter(
-            owner=request.user
-        ).filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(tags__icontains=search_query)
-        )
+        files = search.filter_files(File.objects.filter(owner=request.user), search_query)
         folders = Folder.objects.filter(
             owner=request.user
         ).filter(name__icontains=search_query)
@@ -83,26 +87,12 @@ def home(request): #主頁面
             else:
                 file.full_path = file.name
     
-    files = files.order_by('-created_at')
+    # 與 file_neighbors 的排序一致，媒體預覽的上一個/下一個由 API 查詢
+    files = files.order_by('-created_at', '-pk')
     
     # 取得所有資料夾供移動檔案使用
     all_folders = Folder.objects.filter(owner=request.user).order_by('name')
     
-    # 為媒體檔案（圖片、影片和音樂）添加導航資訊
-    media_files = [f for f in files if f.is_image() or f.is_video() or f.is_audio()]
-    for i, media_file in enumerate(media_files):
-        media_file.prev_media = media_files[i - 1] if i > 0 else None
-        media_file.next_media = media_files[i + 1] if i < len(media_files) - 1 else None
-
-
-
-    image_files = [f for f in files if f.is_image()]
-    for i, file in enumerate(files): 
-        if file.is_image():
-            file_index = image_files.index(file)
-            file.prev_image = image_files[file_index - 1] if file_index > 0 else None
-            file.next_image = image_files[file_index + 1] if file_index < len(image_files) - 1 else None
-    
     context = {
         'current_folder': current_folder,
         'folders': folders,
@@ -111,52 +101,99 @@ def home(request): #主頁面
         'search_query': search_query,
         'is_search_result': bool(search_query),
         # 添加這些新變數
-        'usage_percentage': usage_percentage,
-        'total_size': total_size,
-        'user_quota': user_quota,
-        'total_users': total_users,}
+        'usage_percentage': user_usage['percentage'],
+        'total_size': user_usage['used'],
+        'user_quota': user_usage['limit'],}
     
     return render(request, 'storage/home.html', context)
 
+@csrf_exempt
 @login_required
 def file_upload(request):
     if request.method == 'POST':
-        form = FileUploadForm(request.POST, request.FILES)
-        if form.is_valid():
-            file_obj = form.save(commit=False)
-            file_obj.owner = request.user
-            
-            folder_id = request.POST.get('folder_id')
-            if folder_id:
-                file_obj.folder = get_object_or_404(Folder, pk=folder_id, owner=request.user)
-            
-            if file_obj.file:
-                file_obj.file_type = mimetypes.guess_type(file_obj.file.name)[0] or 'unknown'
-            
-            # 配額檢查
-            total_users = User.objects.count()
-            user_quota = int((100 * 1024 * 1024 * 1024 * 0.9) / total_users) if total_users > 0 else 0
-            user_files = File.objects.filter(owner=request.user)
-            current_usage = sum(f.file_size for f in user_files)
-            new_file_size = file_obj.file.size
-
-            if current_usage + new_file_size > user_quota:
-                messages.error(request, f'儲存空間不足!')
-                return redirect('storage:home')
+        # 讀取上傳內容之前先以請求大小保留空間，同時上傳的請求不會一起超過配額。
+        # CSRF 檢查會讀取 request.POST（整個請求內容），因此改在保留之後才檢查
+        reservation = quota.reserve(request.user, request.META.get('CONTENT_LENGTH') or 0)
+        if reservation is None:
+            messages.error(request, f'儲存空間不足!')
+            return redirect('storage:home')
+        
+        try:
+            rejected = CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+            if rejected is not None:
+                return rejected
             
-            file_obj.save()
-
-            # 計算 hash（新增這段）
-            hash_value = file_obj.calculate_hash()
-            if hash_value:
-                file_obj.file_hash = hash_value
-                file_obj.save(update_fields=['file_hash'])
-            messages.success(request, f'檔案 {file_obj.name} 上傳成功!')
-        else:
-            messages.error(request, '檔案上傳失敗')
+            form = FileUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                file_obj = form.save(commit=False)
+                file_obj.owner = request.user
+                
+                folder_id = request.POST.get('folder_id')
+                if folder_id:
+                    file_obj.folder = get_object_or_404(Folder, pk=folder_id, owner=request.user)
+                
+                if file_obj.file:
+                    file_obj.file_type = mimetypes.guess_type(file_obj.file.name)[0] or 'unknown'
+                
+                # Content-Length 沒有或少報時，以實際大小再檢查一次
+                size = file_obj.file.size
+                if not quota.resize(reservation, size):
+                    messages.error(request, f'儲存空間不足!')
+                    return redirect('storage:home')
+                
+                file_obj.save()
+                # 以上傳的大小計入；儲存後的處理（例如快速播放）改變大小時會自行調整差額
+                quota.commit(reservation, size)
+
+                # 計算 hash（新增這段）
+                hash_value = file_obj.calculate_hash()
+                if hash_value:
+                    file_obj.file_hash = hash_value
+                    file_obj.save(update_fields=['file_hash'])
+                messages.success(request, f'檔案 {file_obj.name} 上傳成功!')
+            else:
+                messages.error(request, '檔案上傳失敗')
+        finally:
+            # 沒有 commit（表單錯誤、儲存失敗）時歸還保留的空間
+            quota.release(reservation)
     
     return redirect('storage:home')
 
+@login_required
+def upload_precheck(request): #秒傳：已有相同內容的檔案時直接建立，不需要上傳
+    if request.method != 'POST':
+        return JsonResponse({'error': '只接受 POST 請求'}, status=405)
+    
+    try:
+        payload = json.loads(request.body)
+        name = os.path.basename(str(payload['name'])).strip()[:255]
+        size = int(payload['size'])
+        sha256 = str(payload['sha256']).lower()
+        folder_id = int(str(payload['folder_id'])) if payload.get('folder_id') else None
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': '參數格式錯誤'}, status=400)
+    if not name or size < 0 or not instant_upload.SHA256_PATTERN.match(sha256):
+        return JsonResponse({'error': '參數格式錯誤'}, status=400)
+    
+    folder = None
+    if folder_id is not None:
+        folder = get_object_or_404(Folder, pk=folder_id, owner=request.user)
+    
+    source = instant_upload.find_source(request.user, sha256, size)
+    if source is None:
+        return JsonResponse({'exists': False})
+    
+    reservation = quota.reserve(request.user, size)
+    if reservation is None:
+        return JsonResponse({'error': '儲存空間不足'}, status=413)
+    try:
+        file_obj = instant_upload.create_from(source, request.user, name, folder)
+        quota.commit(reservation, size)
+    finally:
+        quota.release(reservation)
+    
+    return JsonResponse({'exists': True, 'file': {'id': file_obj.pk, 'name': file_obj.name}}, status=201)
+
 @login_required
 def folder_create(request): #資料夾建立
     if request.method == 'POST':
@@ -202,37 +239,85 @@ def folder_create(request): #資料夾建立
     else:
         return redirect('storage:home')
 
+def _read_chunks(fh, start, length):
+    """從 start 開始讀取 length 個位元組，逐塊送出"""
+    try:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(settings.DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
 @login_required
 def file_download(request, pk): #檔案下載
     file_obj = get_object_or_404(File, pk=pk, owner=request.user)
+    tiering.ensure_hot(file_obj)
     
     try:
         file_path = file_obj.file.path
         if os.path.exists(file_path):
-            with open(file_path, 'rb') as fh:
-                response = HttpResponse(fh.read(), content_type=mimetypes.guess_type(file_path)[0])
-                response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
-                return response
+            file_size = compression.logical_size(file_obj)
+            response = StreamingHttpResponse(
+                bandwidth.throttle(
+                    _read_chunks(compression.open_file(file_obj), 0, file_size),
+                    bandwidth.buckets(request.user.pk),
+                ),
+                content_type=mimetypes.guess_type(file_path)[0],
+            )
+            response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
+            response['Content-Length'] = str(file_size)
+            return response
     except:
         pass
     
     raise Http404("檔案不存在")
 
 @login_required
-def file_view(request, pk): #檔案預覽
+def file_view(request, pk): #檔案預覽（圖片送出螢幕尺寸的預覽圖，原圖請用下載）
     file_obj = get_object_or_404(File, pk=pk, owner=request.user)
     
     if file_obj.is_image():
+        tiering.ensure_hot(file_obj)
         try:
             file_path = file_obj.file.path
             if os.path.exists(file_path):
-                with open(file_path, 'rb') as fh:
+                try:
+                    response = _image_preview(request, file_obj)
+                except Exception:
+                    # 無法產生預覽圖時送出原檔
+                    response = None
+                if response is not None:
+                    return response
+                with compression.open_file(file_obj) as fh:
                     response = HttpResponse(fh.read(), content_type=mimetypes.guess_type(file_path)[0])
                     return response
         except:
             pass
     
-    return redirect('file_download', pk=pk)
+    return redirect('storage:file_download', pk=pk)
+
+def _image_preview(request, file_obj): #依 Accept 與 size 參數回傳快取的預覽圖；SVG、GIF 回傳 None
+    if file_obj.get_file_extension() in derivatives.PASSTHROUGH_EXTENSIONS:
+        return None
+    
+    image_format = derivatives.choose_format(request.META.get('HTTP_ACCEPT'))
+    size = derivatives.choose_size(request.GET.get('size'))
+    path = derivatives.get_preview(file_obj, size, image_format)
+    
+    etag, last_modified = ranges.validators(path)
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponse(status=304)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=derivatives.content_type(image_format))
+    response['ETag'] = etag
+    # 同一網址依 Accept 回傳不同格式，快取必須分開存
+    response['Vary'] = 'Accept'
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
 
 @login_required
 def file_edit(request, pk): #編輯檔案資訊
@@ -249,52 +334,71 @@ def file_edit(request, pk): #編輯檔案資訊
     
     return render(request, 'storage/file_edit.html', {'form': form, 'file': file_obj})
 
+def get_type_breakdown(files): #各副檔名與類別的檔案數和大小
+    # 一次 GROUP BY，不需要逐一讀取檔案
+    rows = files.values('category', 'extension').annotate(
+        count=Count('id'),
+        size=Sum('file_size'),
+    ).order_by('-size')
+
+    category_names = dict(File.CATEGORY_CHOICES)
+    file_types = {}
+    category_stats = {}
+    for row in rows:
+        file_types[row['extension']] = {'count': row['count'], 'size': row['size'] or 0}
+        stat = category_stats.setdefault(row['category'], {
+            'name': category_names.get(row['category'], row['category']),
+            'count': 0,
+            'size': 0,
+        })
+        stat['count'] += row['count']
+        stat['size'] += row['size'] or 0
+    return file_types, sorted(category_stats.values(), key=lambda c: c['size'], reverse=True)
+
 @login_required
+@db_router.replica_reads()
 def storage_stats(request): #儲存空間統計
     user_files = File.objects.filter(owner=request.user)
     
     # 計算統計資料
-    total_files = user_files.count()
-    total_size = sum(f.file_size for f in user_files)
+    totals = user_files.aggregate(count=Count('id'), size=Sum('file_size'))
+    total_files = totals['count']
+    total_size = totals['size'] or 0
     
-    # 動態計算儲存空間
-    from django.contrib.auth.models import User
-    total_system_storage = 100 * 1024 * 1024 * 1024
-    total_users = User.objects.count()
-    user_quota = int((total_system_storage * 0.9) / total_users) if total_users > 0 else 0
-    
-    # 計算使用百分比
-    if user_quota > 0:
-        usage_percentage = (total_size / user_quota) * 100
-        usage_percentage = min(usage_percentage, 100)
-    else:
-        usage_percentage = 0
+    # 儲存空間上限與使用百分比
+    user_usage = quota.usage(request.user)
     
     # 確保用戶有 profile
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     # 按檔案類型分類
-    file_types = {}
-    for file in user_files:
-        ext = file.get_file_extension()
-        if ext in file_types:
-            file_types[ext]['count'] += 1
-            file_types[ext]['size'] += file.file_size
-        else:
-            file_types[ext] = {'count': 1, 'size': file.file_size}
+    file_types, category_stats = get_type_breakdown(user_files)
+    
+    # 靜態壓縮節省的實體空間（file_size 仍是原始大小，配額照原始大小計算）
+    compressed = user_files.exclude(compression='').aggregate(
+        logical=Sum('file_size'),
+        physical=Sum('stored_size'),
+    )
+    compression_saved = (compressed['logical'] or 0) - (compressed['physical'] or 0)
     
     # 最近上傳的檔案
     recent_files = user_files.order_by('-created_at')[:10]
     
+    # 用量趨勢（來自每日彙總表）
+    usage_trend, usage_growth = usage.user_trend(request.user)
+    
     context = {
         'total_files': total_files,
         'total_size': total_size,
-        'user_quota': user_quota,
-        'usage_percentage': usage_percentage,
-        'total_users': total_users,
+        'user_quota': user_usage['limit'],
+        'usage_percentage': user_usage['percentage'],
         'file_types': file_types,
+        'category_stats': category_stats,
         'recent_files': recent_files,
+        'usage_trend': usage_trend,
+        'usage_growth': usage_growth,
         'profile': profile,  # 添加這行
+        'compression_saved': compression_saved,
     }
     
     return render(request, 'storage/stats.html', context)
@@ -308,6 +412,7 @@ def file_delete(request, pk): #檔案刪除
         file_obj.is_deleted = True
         file_obj.deleted_at = timezone.now()
         file_obj.save()
+        signed_urls.revoke_file([file_obj.pk])
         
         messages.success(request, f'檔案 {file_obj.name} 已移至回收站')
         return redirect('storage:home')
@@ -341,6 +446,7 @@ def folder_delete(request, pk): #資料夾刪除
                 mark_deleted_recursive(subfolder)
         
         mark_deleted_recursive(folder)
+        signed_urls.revoke_user(request.user)
         
         messages.success(request, f'資料夾 {folder.name} 及其內容已移至回收站')
         
@@ -382,10 +488,11 @@ def shared_file_download(request, token): #透過分享連結下載檔案
     share_link.save()
     
     file_obj = share_link.file
+    tiering.ensure_hot(file_obj)
     try:
         file_path = file_obj.file.path
         if os.path.exists(file_path):
-            with open(file_path, 'rb') as fh:
+            with compression.open_file(file_obj) as fh:
                 response = HttpResponse(fh.read(), content_type=mimetypes.guess_type(file_path)[0])
                 response['Content-Disposition'] = f'attachment; filename="{file_obj.name}"'
                 return response
@@ -429,61 +536,43 @@ def custom_logout(request): #自訂登出功能
     messages.success(request, '您已成功登出')
     return redirect('storage:home')
 
+def _ranged_response(request, file_obj, content_type, disposition, limits): #依 Range 標頭回傳完整檔案、單段或多段範圍
+    file_path = file_obj.file.path
+    file_size = compression.logical_size(file_obj)
+    status, headers, segments = ranges.plan(request, file_path, file_size, content_type)
+
+    if status == 200 and not file_obj.compression and not limits:
+        # 完整檔案交給 WSGI 伺服器的 file_wrapper（例如 gunicorn 會用 sendfile）
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            bandwidth.throttle(
+                ranges.iter_segments(compression.open_file(file_obj), segments, settings.DOWNLOAD_CHUNK_SIZE),
+                limits,
+            ),
+            status=status,
+            content_type=headers.pop('Content-Type', content_type),
+        )
+    for header, value in headers.items():
+        response[header] = value
+    response['Content-Disposition'] = f'{disposition}; filename="{file_obj.name}"'
+    return response
+
 @login_required
-def file_preview(request, pk): #檔案預覽（支援影片和音樂範圍請求）
+def file_preview(request, pk): #檔案預覽（支援所有檔案的範圍請求）
     file_obj = get_object_or_404(File, pk=pk, owner=request.user)    
+    tiering.ensure_hot(file_obj)
     try:
         file_path = file_obj.file.path
         
         if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            content_type = mimetypes.guess_type(file_path)[0]
+            content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
             
             # 強制設定音樂檔案的 MIME 類型
             if file_obj.is_audio():
-                ext = file_obj.get_file_extension()
-                mime_map = {
-                    '.mp3': 'audio/mpeg',
-                    '.wav': 'audio/wav',
-                    '.m4a': 'audio/mp4',
-                    '.ogg': 'audio/ogg',
-                    '.flac': 'audio/flac',
-                    '.aac': 'audio/aac',
-                    '.wma': 'audio/x-ms-wma'
-                }
-                content_type = mime_map.get(ext, 'audio/mpeg')
+                content_type = AUDIO_MIME_TYPES.get(file_obj.get_file_extension(), 'audio/mpeg')
             
-            # 處理範圍請求（影片和音樂播放控制需要）
-            range_header = request.META.get('HTTP_RANGE')
-            if range_header and (file_obj.is_video() or file_obj.is_audio()):
-                range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
-                if range_match:
-                    start = int(range_match.group(1))
-                    end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-                    
-                    with open(file_path, 'rb') as fh:
-                        fh.seek(start)
-                        data = fh.read(end - start + 1)
-                    
-                    response = HttpResponse(
-                        data, 
-                        status=206,
-                        content_type=content_type
-                    )
-                    response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
-                    response['Accept-Ranges'] = 'bytes'
-                    response['Content-Length'] = str(end - start + 1)
-                    response['Content-Disposition'] = f'inline; filename="{file_obj.name}"'
-                    return response
-            
-            # 一般請求
-            with open(file_path, 'rb') as fh:
-                response = HttpResponse(fh.read(), content_type=content_type)
-                response['Content-Disposition'] = f'inline; filename="{file_obj.name}"'
-                if file_obj.is_video() or file_obj.is_audio():
-                    response['Accept-Ranges'] = 'bytes'
-                response['Content-Length'] = str(file_size)
-                return response
+            return _ranged_response(request, file_obj, content_type, 'inline', bandwidth.buckets(request.user.pk))
                 
     except Exception as e:
         import traceback
@@ -491,66 +580,125 @@ def file_preview(request, pk): #檔案預覽（支援影片和音樂範圍請求
     
     return redirect('storage:file_download', pk=pk)
 
+def signed_file(request, user_id, pk, token): #以簽章網址提供檔案（不檢查 session、不查詢資料庫）
+    payload = signed_urls.verify(user_id, pk, token)
+    if payload is None:
+        return HttpResponse('連結無效或已過期', status=403)
+
+    # 由網址內容組出檔案物件，不需要查詢資料庫
+    file_obj = File(
+        pk=pk, owner_id=user_id, file=payload['p'], name=payload['n'],
+        compression=payload['c'], file_size=payload['s'],
+    )
+    if not os.path.exists(file_obj.file.path):
+        # 檔案在冷儲存（或已被刪除）時才查資料庫並回升
+        file_obj = File.objects.filter(pk=pk, owner_id=user_id, is_deleted=False).first()
+        if file_obj is None:
+            raise Http404("檔案不存在")
+        tiering.ensure_hot(file_obj)
+        if not os.path.exists(file_obj.file.path):
+            raise Http404("檔案不存在")
+
+    disposition = 'inline' if payload['o'] == 'preview' else 'attachment'
+    content_type = mimetypes.guess_type(file_obj.name)[0] or 'application/octet-stream'
+    if file_obj.is_audio():
+        content_type = AUDIO_MIME_TYPES.get(file_obj.get_file_extension(), 'audio/mpeg')
+
+    if payload['o'] == 'preview' and file_obj.is_image():
+        try:
+            response = _image_preview(request, file_obj)
+        except Exception:
+            # 無法產生預覽圖時送出原檔
+            response = None
+        if response is not None:
+            return response
+
+    limits = bandwidth.buckets(user_id, payload.get('l'), payload.get('r'))
+    if settings.SIGNED_URL_ACCEL_PREFIX and not file_obj.compression:
+        # 交給前端代理（nginx X-Accel-Redirect）直接送出檔案，速度上限改由 nginx 對單一連線限制
+        response = HttpResponse(content_type=content_type)
+        # nginx 會先解碼 URI；中文、空白、%、? 等字元必須編碼，否則標頭被 MIME 編碼或路徑被截斷
+        response['X-Accel-Redirect'] = settings.SIGNED_URL_ACCEL_PREFIX + quote(file_obj.file.name)
+        if limits:
+            response['X-Accel-Limit-Rate'] = str(int(min(rate for _, rate in limits)))
+        response['Content-Disposition'] = f'{disposition}; filename="{file_obj.name}"'
+        return response
+
+    response = _ranged_response(request, file_obj, content_type, disposition, limits)
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
 @login_required
 def media_gallery(request, pk): #媒體檔案畫廊檢視
-    file_obj = get_object_or_404(File, pk=pk, owner=request.user)
+    file_obj = get_object_or_404(File, pk=pk, owner=request.user, is_deleted=False)
+    if file_obj.category not in gallery.CATEGORIES:
+        return redirect('storage:file_preview', pk=pk)
     
-    # 取得同一資料夾內的所有圖片和影片檔案
-    media_files = File.objects.filter(
-        owner=request.user,
-        folder=file_obj.folder
-    ).filter(
-        Q(file_type__startswith='image/') | Q(file_type__startswith='video/')
-    ).order_by('name')
-    
-    # 找到當前檔案在列表中的位置
-    file_list = list(media_files)
-    try:
-        current_index = file_list.index(file_obj)
-    except ValueError:
-        current_index = 0
-    
-    # 取得上一個和下一個檔案
-    prev_file = file_list[current_index - 1] if current_index > 0 else None
-    next_file = file_list[current_index + 1] if current_index < len(file_list) - 1 else None
+    # 位置與總數都只做索引上的 COUNT，縮圖由 gallery_api 分頁載入
+    media_files = gallery.gallery_files(request.user, file_obj.folder_id)
     
     context = {
         'file': file_obj,
-        'media_files': media_files,
-        'current_index': current_index + 1,
-        'total_files': len(file_list),
-        'prev_file': prev_file,
-        'next_file': next_file,
+        'current': gallery.item(file_obj, gallery.position(media_files, file_obj)),
+        'total_files': media_files.count(),
+        'page_size': settings.GALLERY_PAGE_SIZE,
     }
     
     return render(request, 'storage/media_gallery.html', context)
 
+@login_required
+@db_router.replica_reads()
+def gallery_api(request): #畫廊分頁 API（以檔案為錨點往前或往後取一頁）
+    folder_id = request.GET.get('folder') or None
+    try:
+        limit = min(int(request.GET.get('limit', settings.GALLERY_PAGE_SIZE)), 200)
+        after = request.GET.get('after')
+        before = request.GET.get('before')
+        anchor_id = int(before or after) if (before or after) else None
+    except ValueError:
+        return JsonResponse({'error': '參數格式錯誤'}, status=400)
+    
+    media_files = gallery.gallery_files(request.user, folder_id)
+    anchor = None
+    if anchor_id is not None:
+        anchor = media_files.filter(pk=anchor_id).first()
+        if anchor is None:
+            raise Http404("檔案不存在")
+    
+    items, start, has_more = gallery.page(
+        media_files, anchor, 'before' if before else 'after', max(limit, 1)
+    )
+    return JsonResponse({
+        'items': [gallery.item(f, start + i) for i, f in enumerate(items)],
+        'has_more': has_more,
+        'total': media_files.count(),
+    })
+
 @login_required
 def user_profile(request): #顯示使用者個人資料（與統計頁面相同）
     # 取得使用者的所有檔案
     files = File.objects.filter(owner=request.user)
     
-    # 計算總檔案數
-    total_files = files.count()
-    
-    # 計算總使用空間
-    total_size = files.aggregate(Sum('file_size'))['file_size__sum'] or 0
+    # 計算總檔案數與總使用空間
+    totals = files.aggregate(count=Count('id'), size=Sum('file_size'))
+    total_files = totals['count']
+    total_size = totals['size'] or 0
     
     # 取得最近上傳的 5 個檔案
     recent_files = files.order_by('-created_at')[:5]
     
     # 統計各種檔案類型
-    file_types = {}
-    for file in files:
-        ext = file.get_file_extension()
-        if ext not in file_types:
-            file_types[ext] = {'count': 0, 'size': 0}
-        file_types[ext]['count'] += 1
-        file_types[ext]['size'] += file.file_size
+    file_types, category_stats = get_type_breakdown(files)
     
-    # 計算使用百分比（假設配額為 10GB）
-    user_quota = 10 * 1024 * 1024 * 1024  # 10GB
-    usage_percentage = (total_size / user_quota * 100) if user_quota > 0 else 0
+    # 靜態壓縮節省的實體空間
+    compressed = files.exclude(compression='').aggregate(
+        logical=Sum('file_size'),
+        physical=Sum('stored_size'),
+    )
+    compression_saved = (compressed['logical'] or 0) - (compressed['physical'] or 0)
+    
+    # 儲存空間上限與使用百分比
+    user_usage = quota.usage(request.user)
     
     # 取得所有資料夾（用於側邊欄）
     folders = Folder.objects.filter(owner=request.user, parent=None)
@@ -560,9 +708,11 @@ def user_profile(request): #顯示使用者個人資料（與統計頁面相同
         'total_size': total_size,
         'recent_files': recent_files,
         'file_types': file_types,
-        'user_quota': user_quota,
-        'usage_percentage': usage_percentage,
+        'category_stats': category_stats,
+        'user_quota': user_usage['limit'],
+        'usage_percentage': user_usage['percentage'],
         'folders': folders,
+        'compression_saved': compression_saved,
     }
     
     return render(request, 'storage/stats.html', context)
@@ -574,6 +724,7 @@ def change_password(request): #修改密碼
         if form.is_valid():
             user = form.save()
             update_session_auth_hash(request, user)  # 保持登入狀態
+            signed_urls.revoke_user(user)  # 之前發出的簽章網址全部失效
             messages.success(request, '密碼修改成功！')
             return redirect('storage:user_profile')
     else:
@@ -673,8 +824,10 @@ def create_share_link(request, pk): #建立檔案分享連結
     return render(request, 'storage/create_share.html', context)
 
 def shared_file_download(request, token): #透過分享連結下載檔案
-    # 查找分享連結
-    share_link = get_object_or_404(SharedLink, token=token)
+    # 查找分享連結（含檔案，短暫快取）
+    share_link = shares.get_share(token)
+    if share_link is None:
+        raise Http404("分享連結不存在")
     
     # 檢查是否可以下載
     if not share_link.can_download():
@@ -692,20 +845,28 @@ def shared_file_download(request, token): #透過分享連結下載檔案
     
     # 如果是 POST 請求，執行下載
     if request.method == 'POST':
-        # 增加下載次數
-        share_link.download_count += 1
-        share_link.save()
-        
-        # 檢查是否達到下載上限，自動停用
-        if share_link.max_downloads and share_link.download_count >= share_link.max_downloads:
-            share_link.is_active = False
-            share_link.save()
+        # 原子性地增加下載次數，同時檢查下載上限
+        if not shares.claim_download(share_link):
+            return render(request, 'storage/share_expired.html', {
+                'reason': '分享連結已失效'
+            })
         
         # 提供檔案下載
         file = share_link.file
-        response = FileResponse(file.file.open('rb'))
-        response['Content-Type'] = 'application/octet-stream'
+        if settings.SIGNED_URLS:
+            # 轉到簽章網址，實際傳送不再經過分享連結的查詢
+            return redirect(signed_urls.sign(file, 'download', share_link=share_link))
+        tiering.ensure_hot(file)
+        file_size = compression.logical_size(file)
+        response = StreamingHttpResponse(
+            bandwidth.throttle(
+                _read_chunks(compression.open_file(file), 0, file_size),
+                bandwidth.share_buckets(share_link),
+            ),
+            content_type='application/octet-stream',
+        )
         response['Content-Disposition'] = f'attachment; filename="{file.name}"'
+        response['Content-Length'] = str(file_size)
         return response
 
 @login_required
@@ -770,12 +931,13 @@ def batch_download_zip(request): #批量下載檔案（打包成 ZIP）
         
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
             for file_obj in files:
+                tiering.ensure_hot(file_obj)
                 try:
                     # 讀取檔案內容
                     file_path = file_obj.file.path
                     if os.path.exists(file_path):
                         # 添加到 ZIP，使用原始檔名
-                        zip_file.write(file_path, file_obj.name)
+                        compression.write_to_zip(zip_file, file_obj, file_obj.name)
                 except Exception as e:
                     print(f'無法添加檔案 {file_obj.name}: {e}')
                     continue
@@ -788,8 +950,13 @@ def batch_download_zip(request): #批量下載檔案（打包成 ZIP）
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         zip_filename = f'files_{timestamp}.zip'
         
-        response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
+        zip_size = zip_buffer.getbuffer().nbytes
+        response = StreamingHttpResponse(
+            bandwidth.throttle(_read_chunks(zip_buffer, 0, zip_size), bandwidth.buckets(request.user.pk)),
+            content_type='application/zip',
+        )
         response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+        response['Content-Length'] = str(zip_size)
         
         return response
     
@@ -812,6 +979,7 @@ def batch_delete(request): #批量刪除
             is_deleted=True,
             deleted_at=timezone.now()
         )
+        signed_urls.revoke_file(list(files.values_list('pk', flat=True)))
         
         messages.success(request, f'已將 {count} 個檔案移至回收站')
         return redirect('storage:home')
@@ -844,11 +1012,12 @@ def batch_download_folders(request): #批量下載資料夾（打包成 ZIP）
             # 添加資料夾內的檔案
             files = File.objects.filter(folder=folder, owner=request.user)
             for file_obj in files:
+                tiering.ensure_hot(file_obj)
                 try:
                     file_path = file_obj.file.path
                     if os.path.exists(file_path):
                         zip_path = os.path.join(folder_path, file_obj.name)
-                        zip_file.write(file_path, zip_path)
+                        compression.write_to_zip(zip_file, file_obj, zip_path)
                 except Exception as e:
                     print(f'無法添加檔案 {file_obj.name}: {e}')
                     continue
@@ -870,8 +1039,13 @@ def batch_download_folders(request): #批量下載資料夾（打包成 ZIP）
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         zip_filename = f'folders_{timestamp}.zip'
         
-        response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
+        zip_size = zip_buffer.getbuffer().nbytes
+        response = StreamingHttpResponse(
+            bandwidth.throttle(_read_chunks(zip_buffer, 0, zip_size), bandwidth.buckets(request.user.pk)),
+            content_type='application/zip',
+        )
         response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+        response['Content-Length'] = str(zip_size)
         
         return response
     
@@ -916,6 +1090,9 @@ def batch_delete_folders(request): #批量刪除資料夾
                 print(f'無法刪除資料夾 {folder.name}: {e}')
                 continue
         
+        if deleted_count:
+            signed_urls.revoke_user(request.user)
+        
         messages.success(request, f'已將 {deleted_count} 個資料夾及其內容移至回收站')
         return redirect('storage:home')
     
@@ -926,19 +1103,28 @@ def batch_delete_folders(request): #批量刪除資料夾
 @login_required
 def trash(request):
     """回收站"""
+    # 已交給清除工作的項目不再顯示
     files = File.objects.filter(
         owner=request.user, 
-        is_deleted=True
+        is_deleted=True,
+        purge_task__isnull=True
     ).order_by('-deleted_at')
     
+    # 進行中的清除工作，頁面會輪詢進度
+    purge_tasks = PurgeTask.objects.filter(
+        owner=request.user,
+        status__in=[PurgeTask.STATUS_PENDING, PurgeTask.STATUS_RUNNING]
+    ).order_by('created_at')
+    
     context = {
         'files': files,
+        'purge_tasks': purge_tasks,
     }
     return render(request, 'storage/trash.html', context)
 
 @login_required
 def restore_file(request, pk): #還原檔案
-    file_obj = get_object_or_404(File, pk=pk, owner=request.user, is_deleted=True)
+    file_obj = get_object_or_404(File, pk=pk, owner=request.user, is_deleted=True, purge_task__isnull=True)
     
     file_obj.is_deleted = False
     file_obj.deleted_at = None
@@ -949,7 +1135,7 @@ def restore_file(request, pk): #還原檔案
 
 @login_required
 def restore_folder(request, pk): #還原資料夾
-    folder = get_object_or_404(Folder, pk=pk, owner=request.user, is_deleted=True)
+    folder = get_object_or_404(Folder, pk=pk, owner=request.user, is_deleted=True, purge_task__isnull=True)
     
     # 還原資料夾及其所有內容
     def restore_recursive(folder):
@@ -1032,69 +1218,49 @@ def permanent_delete_folder(request, pk): #永久刪除資料夾
 @login_required
 def empty_trash(request): #清空回收站
     if request.method == 'POST':
-        # 刪除所有已刪除的檔案
-        deleted_files = File.objects.filter(owner=request.user, is_deleted=True)
-        count_files = deleted_files.count()
-        
-        for file in deleted_files:
-            if file.file and os.path.exists(file.file.path):
-                os.remove(file.file.path)
-            if file.thumbnail and os.path.exists(file.thumbnail.path):
-                os.remove(file.thumbnail.path)
-            file.delete()
-        
-        # 刪除所有已刪除的資料夾
-        deleted_folders = Folder.objects.filter(owner=request.user, is_deleted=True)
-        count_folders = deleted_folders.count()
-        deleted_folders.delete()
+        # 只標記給背景清除工作，實際刪除分批在背景進行
+        task = purge.create_task(
+            request.user,
+            File.objects.filter(owner=request.user, is_deleted=True),
+            Folder.objects.filter(owner=request.user, is_deleted=True),
+        )
+        purge.start_task(task)
         
-        messages.success(request, f'已清空回收站（{count_files} 個檔案，{count_folders} 個資料夾）')
+        messages.success(request, f'正在清空回收站（{task.total_files} 個檔案，{task.total_folders} 個資料夾）')
         return redirect('storage:trash')
     
     return render(request, 'storage/empty_trash_confirm.html')
 
 @login_required
+@db_router.replica_reads()
 def duplicates(request): #重複檔案頁面
-    # 找出有重複 hash 的檔案（只看當前用戶的）
-    duplicate_hashes = File.objects.filter(
-        owner=request.user,
-        is_deleted=False,
-        file_hash__isnull=False
-    ).exclude(
-        file_hash=''
-    ).values('file_hash').annotate(
-        count=Count('id')
-    ).filter(count__gt=1).values_list('file_hash', flat=True)
-    
-    # 整理重複檔案組
-    duplicate_groups = []
-    total_wasted_space = 0
-    
-    for hash_value in duplicate_hashes:
-        files = File.objects.filter(
-            owner=request.user,
-            file_hash=hash_value,
-            is_deleted=False
-        ).order_by('created_at')
-        
-        original = files.first()
-        duplicates = list(files[1:])
-        
-        wasted_space = sum(f.file_size for f in duplicates)
-        total_wasted_space += wasted_space
-        
-        duplicate_groups.append({
-            'hash': hash_value,
-            'original': original,
-            'duplicates': duplicates,
-            'wasted_space': wasted_space,
-        })
-    
+    files = File.objects.filter(owner=request.user, is_deleted=False)
+
+    # 每組的浪費空間一次算出，依浪費空間由大到小分頁
+    summary = list(dedup.duplicate_summary(files))
+    total_wasted_space = sum(row['wasted'] for row in summary)
+
+    paginator = Paginator(summary, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    # 目前這一頁的所有重複組只用一個查詢取出
+    page_hashes = [row['file_hash'] for row in page_obj]
+    duplicate_groups = list(dedup.iter_groups(
+        dedup.duplicate_files(files.filter(file_hash__in=page_hashes)).select_related('folder')
+    ))
+
+    # 相似圖片（重新壓縮、縮放、截圖）只在第一頁顯示，群組由背景指令事先算好
+    similar_groups = []
+    if page_obj.number == 1:
+        similar_groups = similarity.similar_image_groups(files)
+
     context = {
         'duplicate_groups': duplicate_groups,
         'total_wasted_space': total_wasted_space,
+        'page_obj': page_obj,
+        'similar_groups': similar_groups,
     }
-    
+
     return render(request, 'storage/duplicates.html', context)
 
 @login_required
@@ -1106,13 +1272,66 @@ def delete_duplicate(request, pk): #刪除重複檔案
         file_obj.is_deleted = True
         file_obj.deleted_at = timezone.now()
         file_obj.save()
+        signed_urls.revoke_file([file_obj.pk])
         
         messages.success(request, f'已刪除重複檔案: {file_obj.name}')
         return redirect('storage:duplicates')
     
     return redirect('storage:duplicates')
 
+# 媒體預覽可切換的類型
+NEIGHBOR_CATEGORIES = {
+    'media': [File.CATEGORY_IMAGE, File.CATEGORY_VIDEO, File.CATEGORY_AUDIO],
+    'image': [File.CATEGORY_IMAGE],
+    'video': [File.CATEGORY_VIDEO],
+    'audio': [File.CATEGORY_AUDIO],
+}
+
+def _media_item(file_obj): #媒體預覽需要的檔案資訊
+    return {
+        'id': file_obj.pk,
+        'name': file_obj.name,
+        'category': file_obj.category,
+        'file_type': file_obj.file_type,
+        'preview_url': file_obj.get_preview_url(),
+        'download_url': reverse('storage:file_download', args=[file_obj.pk]),
+        'gallery_url': (
+            reverse('storage:media_gallery', args=[file_obj.pk]) if file_obj.category in gallery.CATEGORIES else None
+        ),
+    }
+
 @login_required
+def file_neighbors(request, pk): #同一資料夾（搜尋時為搜尋結果）中前一個與下一個媒體檔案（排序與首頁相同）
+    file_obj = get_object_or_404(File, pk=pk, owner=request.user)
+    categories = NEIGHBOR_CATEGORIES.get(request.GET.get('type', 'media'))
+    if categories is None:
+        return JsonResponse({'error': '不支援的類型'}, status=400)
+
+    siblings = File.objects.filter(
+        owner=request.user,
+        is_deleted=False,
+        category__in=categories,
+    )
+    # 首頁搜尋結果跨資料夾，與首頁使用同一個搜尋條件
+    search_query = request.GET.get('search', '').strip()
+    if search_query:
+        siblings = search.filter_files(siblings, search_query)
+    else:
+        siblings = siblings.filter(folder_id=file_obj.folder_id)
+    # 首頁依 (-created_at, -pk) 排序，前一個是比目前新的最近一筆，下一個是比目前舊的最近一筆
+    newer = Q(created_at__gt=file_obj.created_at) | Q(created_at=file_obj.created_at, pk__gt=file_obj.pk)
+    older = Q(created_at__lt=file_obj.created_at) | Q(created_at=file_obj.created_at, pk__lt=file_obj.pk)
+    prev_file = siblings.filter(newer).order_by('created_at', 'pk').first()
+    next_file = siblings.filter(older).order_by('-created_at', '-pk').first()
+
+    return JsonResponse({
+        'file': _media_item(file_obj),
+        'prev': _media_item(prev_file) if prev_file else None,
+        'next': _media_item(next_file) if next_file else None,
+    })
+
+@login_required
+@db_router.replica_reads()
 def search_suggestions(request):
     query = request.GET.get('q', '').strip()
     search_type = request.GET.get('type', 'all')  # all, tag
@@ -1125,10 +1344,8 @@ def search_suggestions(request):
     #如果是標籤模式，只搜尋標籤
     if search_type == 'tag':
         # 收集所有標籤
-        tags_files = File.objects.filter(
-            owner=request.user,
-            is_deleted=False,
-            tags__icontains=query
+        tags_files = search.filter_files(
+            File.objects.filter(owner=request.user, is_deleted=False), query, ['tags']
         ).values_list('tags', flat=True)
         
         all_tags = set()
@@ -1141,10 +1358,8 @@ def search_suggestions(request):
         
         for tag in list(all_tags)[:10]:
             # 計算有多少檔案使用這個標籤
-            count = File.objects.filter(
-                owner=request.user,
-                is_deleted=False,
-                tags__icontains=tag
+            count = search.filter_files(
+                File.objects.filter(owner=request.user, is_deleted=False), tag, ['tags']
             ).count()
             
             suggestions.append({
@@ -1155,10 +1370,8 @@ def search_suggestions(request):
     
     # 一般模式，搜尋檔案名稱
     else:
-        files = File.objects.filter(
-            owner=request.user, 
-            is_deleted=False,
-            name__icontains=query
+        files = search.filter_files(
+            File.objects.filter(owner=request.user, is_deleted=False), query, ['name']
         ).order_by('-created_at')[:8]
         
         for file in files:
@@ -1170,6 +1383,30 @@ def search_suggestions(request):
     
     return JsonResponse({'suggestions': suggestions})
 
+@login_required
+def api_batch(request): #批次操作 API（移動、回收站、還原、標籤、重新命名）
+    if request.method != 'POST':
+        return JsonResponse({'error': '只接受 POST 請求'}, status=405)
+    
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'JSON 格式錯誤'}, status=400)
+    
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'error': 'operations 必須是非空陣列'}, status=400)
+    
+    runner = BatchRunner(request.user, max_items=settings.BATCH_API_MAX_ITEMS)
+    try:
+        # 整批在同一個交易中，格式錯誤時全部不生效
+        with transaction.atomic():
+            results = [runner.run(operation) for operation in operations]
+    except BatchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'results': results})
+
 @login_required
 def permanent_delete(request, pk): #永久刪除單個檔案
     file = get_object_or_404(File, pk=pk, owner=request.user, is_deleted=True)
@@ -1193,7 +1430,7 @@ def permanent_delete(request, pk): #永久刪除單個檔案
 def batch_restore(request): #批次還原
     if request.method == 'POST':
         file_ids = request.POST.getlist('file_ids')
-        files = File.objects.filter(pk__in=file_ids, owner=request.user, is_deleted=True)
+        files = File.objects.filter(pk__in=file_ids, owner=request.user, is_deleted=True, purge_task__isnull=True)
         count = files.count()
         
         files.update(is_deleted=False, deleted_at=None)
@@ -1206,14 +1443,25 @@ def batch_permanent_delete(request): #批次永久刪除
     if request.method == 'POST':
         file_ids = request.POST.getlist('file_ids')
         files = File.objects.filter(pk__in=file_ids, owner=request.user, is_deleted=True)
-        count = files.count()
         
-        for file in files:
-            if file.file and os.path.exists(file.file.path):
-                os.remove(file.file.path)
-            if file.thumbnail and os.path.exists(file.thumbnail.path):
-                os.remove(file.thumbnail.path)
-            file.delete()
+        task = purge.create_task(request.user, files)
+        purge.start_task(task)
         
-        messages.success(request, f'已永久刪除 {count} 個檔案')
-    return redirect('storage:trash')
\ No newline at end of file
+        messages.success(request, f'正在永久刪除 {task.total_files} 個檔案')
+    return redirect('storage:trash')
+
+@login_required
+def purge_task_status(request, pk): #清除工作進度
+    task = get_object_or_404(PurgeTask, pk=pk, owner=request.user)
+    
+    return JsonResponse({
+        'status': task.status,
+        'status_display': task.get_status_display(),
+        'progress': task.get_progress(),
+        'total_files': task.total_files,
+        'deleted_files': task.deleted_files,
+        'failed_files': task.failed_files,
+        'total_folders': task.total_folders,
+        'deleted_folders': task.deleted_folders,
+        'finished': task.is_finished(),
+    })
\ No newline at end of file